@@ -15,4 +15,104 @@ AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
 
 # App
 APP_ENV = os.getenv("APP_ENV", "local")
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+# Chance of logging a full (capped) payload per category, e.g. "tool_payload=0.1,*=0"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Background jobs (/session/{id}/runs)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Session store (memory | sqlite | redis); idle TTL + LRU cap
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+# Agent conversation history window (none | last_n | token_budget | summarize)
+HISTORY_MODE = os.getenv("HISTORY_MODE", "last_n")
+HISTORY_MAX_ITEMS = int(os.getenv("HISTORY_MAX_ITEMS", "12"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "4000"))
+
+# LLM pricing used for cost metrics (USD per 1M tokens). Per model as
+# "model=input/output,..." (a dated snapshot matches its model's prefix);
+# the OPENAI_PRICE_* pair covers models not listed
+OPENAI_MODEL_PRICES = os.getenv(
+    "OPENAI_MODEL_PRICES",
+    "gpt-5=1.25/10.00,gpt-5-mini=0.25/2.00,gpt-5-nano=0.05/0.40,gpt-4.1-mini=0.40/1.60,gpt-4o-mini=0.15/0.60",
+)
+OPENAI_PRICE_INPUT_PER_1M = float(os.getenv("OPENAI_PRICE_INPUT_PER_1M", "0.05"))
+OPENAI_PRICE_OUTPUT_PER_1M = float(os.getenv("OPENAI_PRICE_OUTPUT_PER_1M", "0.40"))
+
+# Local tracing: in-memory ring buffer (+ optional JSON-lines file)
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+TRACE_FILE = os.getenv("TRACE_FILE")  # e.g. "traces.jsonl"; unset = buffer only
+
+# Rule-based intake parser ahead of the orchestrator LLM
+INTAKE_FAST_PATH = os.getenv("INTAKE_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+# Concurrent /apply-line calls queued behind a running batch wait this much longer for more to batch
+INTAKE_COALESCE_MS = float(os.getenv("INTAKE_COALESCE_MS", "50"))
+
+# Search result cache (Amadeus tools) + speculative prefetch from intake state
+SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", "600"))
+SEARCH_CACHE_MAX = int(os.getenv("SEARCH_CACHE_MAX", "512"))
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "3"))
+
+# Blocking Amadeus tools run in a dedicated thread pool, capped per tool
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "16"))
+TOOL_CONCURRENCY_FLIGHTS = int(os.getenv("TOOL_CONCURRENCY_FLIGHTS", "4"))
+TOOL_CONCURRENCY_HOTELS = int(os.getenv("TOOL_CONCURRENCY_HOTELS", "4"))
+TOOL_CONCURRENCY_ACTIVITIES = int(os.getenv("TOOL_CONCURRENCY_ACTIVITIES", "4"))
+
+# Default /run pipeline mode: "agents" (all LLM stages) or "direct" (tool calls + planner/critic)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "agents")
+
+# Per-stage model routing (optional JSON overrides, re-read when the file changes)
+MODEL_ROUTING_FILE = os.getenv("MODEL_ROUTING_FILE")  # e.g. "model_routing.json"
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", OPENAI_MODEL)
+# Downgrade a stage to its fallback model when its latency reaches this share of its budget
+MODEL_DOWNGRADE_RATIO = float(os.getenv("MODEL_DOWNGRADE_RATIO", "0.8"))
+MODEL_DOWNGRADE_COOLDOWN_S = float(os.getenv("MODEL_DOWNGRADE_COOLDOWN_S", "60"))
+
+# Request deadlines (X-Deadline-Ms header or ?deadline_ms=); unset = no deadline
+REQUEST_DEADLINE_MAX_S = float(os.getenv("REQUEST_DEADLINE_MAX_S", "300"))
+TOOL_MAX_RETRIES = int(os.getenv("TOOL_MAX_RETRIES", "1"))
+SEARCH_CACHE_STALE_S = float(os.getenv("SEARCH_CACHE_STALE_S", "1800"))  # stale results kept as a fallback
+
+# POST /plans:batch: max specs per request, pipelines running at once across all batches
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# /show, /run and /runs/{id} bodies at least this large are br/gzip-compressed when accepted
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+# /run results cached by canonical state hash
+RUN_CACHE_TTL_S = float(os.getenv("RUN_CACHE_TTL_S", "300"))
+RUN_CACHE_MAX = int(os.getenv("RUN_CACHE_MAX", "256"))
+
+# Sessions whose per-stage outputs are kept for incremental re-planning
+STAGE_MEMO_SESSIONS = int(os.getenv("STAGE_MEMO_SESSIONS", "512"))
+
+# Cold start: build the agents in the background after startup (else on first use);
+# backend/tests/test_import_time.py fails when importing the app takes longer than the budget
+AGENTS_PRELOAD = os.getenv("AGENTS_PRELOAD", "true").lower() in ("1", "true", "yes")
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+# Async OpenAI client (backend/llm/openai_client.py): connection pool, per-attempt timeout, retries
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_S = float(os.getenv("OPENAI_RETRY_BASE_S", "0.5"))
+OPENAI_RETRY_MAX_S = float(os.getenv("OPENAI_RETRY_MAX_S", "8"))
+
+# Re-asks for an agent stage whose reply does not match its output model (then it falls back)
+STAGE_REASK_MAX = int(os.getenv("STAGE_REASK_MAX", "1"))
@@ -1,12 +1,19 @@
 from agents import function_tool
-from datetime import date
 from typing import Dict, Any
-from backend.tools.flights_api import search_flights
-from backend.tools.hotels_api import search_hotels
-from backend.tools.events_api import search_activities
+from backend.tools.async_tools import new_call, search_activities_async, search_flights_async, search_hotels_async
+from backend.utils.deadline import DeadlineExceeded
+from backend.utils.logger import get_logger, log_payload
+from backend.utils.tracing import span
+
+logger = get_logger("backend.llm.agent_tools")
+
+# Tools are async: the blocking Amadeus calls run in the tool thread pool
+# (backend.tools.async_tools), so a search never stalls the event loop.
+# Out of time, a tool returns an empty result flagged "timed_out" so the agent
+# can finish instead of the request hanging.
 
 @function_tool
-def tool_search_flights(
+async def tool_search_flights(
     origin: str,
     destination: str,
     depart_date: str,
@@ -17,22 +24,32 @@ def tool_search_flights(
     max_results: int = 12,
 ) -> Dict[str, Any]:
     """Amadeus-backed flight search (wrapped for Agents SDK)."""
-    offers = search_flights(
-        origin_code=origin,
-        dest_code=destination,
-        depart=date.fromisoformat(depart_date),
-        ret=date.fromisoformat(return_date) if return_date else None,
-        adults=int(adults),
-        currency=currency,
-        non_stop=non_stop,
-        max_results=int(max_results),
-    ) or []
-    print("Search flights payload ****", offers)
+    with span("tool.search_flights", origin=origin, destination=destination) as sp:
+        call = new_call("search_flights", {"origin": origin, "destination": destination}, sp.correlation_id)
+        try:
+            offers = await search_flights_async(
+                origin=origin,
+                destination=destination,
+                depart_date=depart_date,
+                return_date=return_date,
+                adults=adults,
+                currency=currency,
+                non_stop=non_stop,
+                max_results=max_results,
+                call=call,
+            )
+        except DeadlineExceeded:
+            sp.set(timed_out=True, retries=call.retry_count)
+            return {"source": "amadeus", "currency": currency, "count": 0, "offers": [], "timed_out": True,
+                    "correlation_id": call.correlation_id}
+        sp.set(count=len(offers), retries=call.retry_count)
+    log_payload(logger, "tool_payload", "search_flights results", offers, tool="search_flights")
     # keep payload small
-    return {"source": "amadeus", "currency": currency, "count": len(offers), "offers": offers[:3]}
+    return {"source": "amadeus", "currency": currency, "count": len(offers), "offers": offers[:3],
+            "correlation_id": call.correlation_id}
 
 @function_tool
-def tool_search_hotels(
+async def tool_search_hotels(
     city: str,
     check_in: str,
     check_out: str,
@@ -41,28 +58,44 @@ def tool_search_hotels(
     refundable_only: bool = False,
     max_results: int = 10,
 ) -> Dict[str, Any]:
-    res = search_hotels(
-        city=city,
-        check_in=date.fromisoformat(check_in),
-        check_out=date.fromisoformat(check_out),
-        guests=int(guests),
-        currency=currency,
-        refundable_only=bool(refundable_only),
-        max_results=int(max_results),
-    ) or []
-    print("Search Hotels payload ****", res)
-    return {"hotels": res[:3]}
+    with span("tool.search_hotels", city=city) as sp:
+        call = new_call("search_hotels", {"city": city}, sp.correlation_id)
+        try:
+            res = await search_hotels_async(
+                city=city,
+                check_in=check_in,
+                check_out=check_out,
+                guests=guests,
+                currency=currency,
+                refundable_only=refundable_only,
+                max_results=max_results,
+                call=call,
+            )
+        except DeadlineExceeded:
+            sp.set(timed_out=True, retries=call.retry_count)
+            return {"hotels": [], "timed_out": True, "correlation_id": call.correlation_id}
+        sp.set(count=len(res), retries=call.retry_count)
+    log_payload(logger, "tool_payload", "search_hotels results", res, tool="search_hotels")
+    return {"hotels": res[:3], "correlation_id": call.correlation_id}
 
 @function_tool
-def tool_search_activities(
+async def tool_search_activities(
     city_code: str,
     for_date: str,
     max_results: int = 6,
 ) -> Dict[str, Any]:
-    acts = search_activities(
-        city_code=city_code,
-        for_date=date.fromisoformat(for_date),
-        max_results=int(max_results),
-    ) or []
-    print("Search Activities payload ****", acts)
-    return {"activities": acts[:5]}
+    with span("tool.search_activities", city_code=city_code) as sp:
+        call = new_call("search_activities", {"city_code": city_code}, sp.correlation_id)
+        try:
+            acts = await search_activities_async(
+                city_code=city_code,
+                for_date=for_date,
+                max_results=max_results,
+                call=call,
+            )
+        except DeadlineExceeded:
+            sp.set(timed_out=True, retries=call.retry_count)
+            return {"activities": [], "timed_out": True, "correlation_id": call.correlation_id}
+        sp.set(count=len(acts), retries=call.retry_count)
+    log_payload(logger, "tool_payload", "search_activities results", acts, tool="search_activities")
+    return {"activities": acts[:5], "correlation_id": call.correlation_id}
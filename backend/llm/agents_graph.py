@@ -1,59 +1,57 @@
-from agents import Agent
+from __future__ import annotations
+from functools import lru_cache
 from pathlib import Path
-# from backend.llm.agent_tools import tool_search_flights, tool_search_hotels, tool_search_activities
-from backend.config.settings import OPENAI_MODEL
-from backend.llm.agent_tools import (
-    tool_search_flights,
-    tool_search_hotels,
-    tool_search_activities,
-)
+from typing import TYPE_CHECKING, Dict, Tuple
 
-PROMPT_DIR = Path(__file__).parents[2] / "docs" / "prompts"
+from backend.llm.model_routing import ROUTER
+
+if TYPE_CHECKING:
+    from agents import Agent
 
+PROMPT_DIR = Path(__file__).parents[2] / "docs" / "prompts"
 
-orchestrator = Agent(
-    name="Orchestrator",
-    instructions=(PROMPT_DIR / "orchestrator.md").read_text(),
-    model=OPENAI_MODEL,
+# stage -> (agent name, prompt file, backend.llm.agent_tools tools)
+AGENT_SPECS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
     # No tools here; it only decides next step + collects inputs
-)
-
-planner = Agent(
-    name="Planner",
-    instructions=(PROMPT_DIR / "planner.md").read_text(),
-    model=OPENAI_MODEL,
-    tools=[],  # ← no tools; keeps it deterministic
-)
-
-flights = Agent(
-    name="Flights",
-    instructions=(PROMPT_DIR / "flights.md").read_text(),
-    model=OPENAI_MODEL,
-    tools=[tool_search_flights],
-)
-
-lodging = Agent(
-    name="Lodging",
-    instructions=(PROMPT_DIR / "lodging.md").read_text(),
-    model=OPENAI_MODEL,
-    tools=[tool_search_hotels],
-)
-
-activities = Agent(
-    name="Activities",
-    instructions=(PROMPT_DIR / "activities.md").read_text(),
-    model=OPENAI_MODEL,
-    tools=[tool_search_activities],
-)
-
-budget = Agent(
-    name="Budget",
-    instructions=(PROMPT_DIR / "budget.md").read_text(),
-    model=OPENAI_MODEL,
-)
-
-critic = Agent(
-    name="Critic",
-    instructions=(PROMPT_DIR / "critics.md").read_text(),
-    model=OPENAI_MODEL,
-)
+    "orchestrator": ("Orchestrator", "orchestrator.md", ()),
+    "planner": ("Planner", "planner.md", ()),  # ← no tools; keeps it deterministic
+    "flights": ("Flights", "flights.md", ("tool_search_flights",)),
+    "lodging": ("Lodging", "lodging.md", ("tool_search_hotels",)),
+    "activities": ("Activities", "activities.md", ("tool_search_activities",)),
+    "budget": ("Budget", "budget.md", ()),
+    "critic": ("Critic", "critics.md", ()),
+}
+
+
+@lru_cache(maxsize=None)
+def get_agent(stage: str) -> "Agent":
+    """
+    The stage's agent, built on first use and cached. The Agents SDK, the
+    tool modules and the prompt file are only loaded then, which keeps them
+    out of the app's import (cold start).
+    """
+    from agents import Agent
+    from backend.llm import agent_tools
+    from backend.llm.output_schema import StageOutputSchema
+
+    name, prompt, tools = AGENT_SPECS[stage]
+    return Agent(
+        name=name,
+        instructions=(PROMPT_DIR / prompt).read_text(),
+        **ROUTER.configured(stage),
+        tools=[getattr(agent_tools, t) for t in tools],
+        output_type=StageOutputSchema(stage),  # backend.schemas.agent_schema.STAGE_OUTPUTS
+    )
+
+
+def preload_agents() -> None:
+    """Build every agent now (e.g. in the background after startup)."""
+    for stage in AGENT_SPECS:
+        get_agent(stage)
+
+
+def __getattr__(name: str) -> "Agent":
+    # `from backend.llm.agents_graph import planner` still works; it builds the agent then
+    if name in AGENT_SPECS:
+        return get_agent(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,312 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+# Airport + metro city codes we accept without asking the model. A 3-letter
+# token outside this list is left for the LLM rather than guessed.
+IATA_CODES = frozenset("""
+ATL AUS BOS BWI CLT DCA DEN DFW DTW EWR FLL HNL IAD IAH JFK LAS LAX LGA MCO MDW MIA MSP
+ORD PDX PHL PHX SAN SEA SFO SJC SLC TPA OAK BNA MSY
+YYZ YVR YUL YYC MEX NLU TLC CUN GDL MTY SJD PVR BOG LIM SCL EZE GRU GIG PTY SJO HAV
+LHR LGW STN LCY CDG ORY BVA FCO CIA MXP LIN BGY VCE FLR NAP BLQ PSA MAD BCN AGP PMI LIS OPO
+AMS BRU FRA MUC BER DUS HAM ZRH GVA VIE PRG BUD WAW CPH ARN OSL HEL DUB EDI MAN ATH IST
+DXB DOH AUH CAI CMN JNB CPT NBO TLV
+HND NRT KIX ICN GMP PEK PKX PVG SHA HKG TPE SIN KUL BKK DMK CGK MNL DEL BOM SYD MEL AKL
+NYC WAS CHI ROM PAR LON MIL TYO SEL BJS SHA REK STO BUE RIO SAO YTO YMQ OSA
+""".split())
+
+# Human city names -> code used in state (mirrors the orchestrator prompt)
+CITY_CODES: Dict[str, str] = {
+    "san francisco": "SFO", "los angeles": "LAX", "new york": "JFK", "nyc": "JFK",
+    "mexico city": "MEX", "cdmx": "MEX", "cancun": "CUN", "chicago": "ORD", "boston": "BOS",
+    "miami": "MIA", "seattle": "SEA", "washington": "IAD", "toronto": "YYZ",
+    "rome": "FCO", "milan": "MXP", "venice": "VCE", "florence": "FLR", "naples": "NAP",
+    "paris": "CDG", "london": "LHR", "madrid": "MAD", "barcelona": "BCN", "lisbon": "LIS",
+    "amsterdam": "AMS", "berlin": "BER", "munich": "MUC", "frankfurt": "FRA", "zurich": "ZRH",
+    "vienna": "VIE", "prague": "PRG", "dublin": "DUB", "athens": "ATH", "istanbul": "IST",
+    "dubai": "DXB", "tokyo": "HND", "osaka": "KIX", "seoul": "ICN", "singapore": "SIN",
+    "hong kong": "HKG", "bangkok": "BKK", "sydney": "SYD",
+}
+
+# Keys the orchestrator returns at the top level of its JSON
+PATCH_KEYS = ("need_more_info", "questions", "state", "next_step")
+
+REQUIRED_FIELDS = [
+    "origin", "destination", "start_date", "end_date", "adults", "currency",
+    "max_results_flights", "max_results_hotels", "preview_hotels",
+    "activities_enabled", "critic_enabled",
+]
+
+QUESTIONS = {
+    "origin": "What airport will you depart from? (3-letter IATA code)",
+    "destination": "Where are you going? (city or 3-letter IATA code)",
+    "start_date": "What are your start and end travel dates?",
+    "end_date": "What are your start and end travel dates?",
+    "adults": "How many adults will travel?",
+    "currency": "What is your preferred currency or budget?",
+    "max_results_flights": "How many flight options would you like to see?",
+    "max_results_hotels": "How many hotel options would you like to see?",
+    "preview_hotels": "How many hotel options would you like to see?",
+    "activities_enabled": "Should we plan activities?",
+    "critic_enabled": "Should we run a final review of the plan?",
+}
+
+_MONTHS = {
+    m: i + 1 for i, names in enumerate([
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+        ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+        ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december"),
+    ]) for m in names
+}
+_MON = r"(?P<{}>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY = r"(?P<{}>\d{{1,2}})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s*(?P<{}>\d{{4}}))?"
+_SEP = r"\s*(?:-|to|until|through|thru)\s*"
+
+_DATE_PATTERNS = [
+    # 2025-06-03 to 2025-06-10
+    re.compile(r"(?P<s>\d{4}-\d{2}-\d{2})" + _SEP + r"(?P<e>\d{4}-\d{2}-\d{2})"),
+    # June 3-10, 2025 / Jun 3 - Jul 2 2025 / Dec 28 to Jan 3
+    re.compile(_MON.format("m1") + r"\s*" + _DAY.format("d1") + _YEAR.format("y1") + _SEP
+               + r"(?:" + _MON.format("m2") + r"\s*)?" + _DAY.format("d2") + _YEAR.format("y2"),
+               re.IGNORECASE),
+    # 3-10 June 2025 / 3 June - 10 June
+    re.compile(_DAY.format("d1") + r"(?:\s+" + _MON.format("m1") + r")?" + _SEP + _DAY.format("d2")
+               + r"\s+" + _MON.format("m2") + _YEAR.format("y2"), re.IGNORECASE),
+    # 6/3-6/10 or 6/3/2025 - 6/10/2025 (US order)
+    re.compile(r"(?P<m1>\d{1,2})/(?P<d1>\d{1,2})(?:/(?P<y1>\d{4}))?" + _SEP
+               + r"(?P<m2>\d{1,2})/(?P<d2>\d{1,2})(?:/(?P<y2>\d{4}))?"),
+]
+
+_TRAVELERS = re.compile(
+    r"\b(?P<n>\d{1,2})\s*(?:adults?|people|persons?|pax|travell?ers?|guests?)\b", re.IGNORECASE
+)
+_SOLO = re.compile(r"\b(?:solo|just me|by myself)\b", re.IGNORECASE)
+# "$3000", "3k usd" (explicitly USD) or a bare "budget is 3000" (currency unknown).
+# An amount followed by another currency is left to the model.
+_OTHER_CURRENCY = (r"(?!\s*(?:eur|euros?|€|gbp|pounds?|£|jpy|yen|¥|mxn|pesos?|cad|aud|chf|francs?"
+                   r"|inr|rupees?|cny|yuan|krw|won)\b)")
+_BUDGET = re.compile(
+    r"(?:\$\s*(?P<a>\d[\d,]*(?:\.\d+)?)\s*(?P<ak>k)?\b(?:\s*(?:usd|dollars))?"
+    r"|\b(?P<b>\d[\d,]*(?:\.\d+)?)\s*(?P<bk>k)?\s*(?:usd|dollars)\b"
+    r"|\bbudget\s*(?:of|is|:)?\s*(?P<c>\d[\d,]*(?:\.\d+)?)\s*(?P<ck>k)?\b" + _OTHER_CURRENCY + r")",
+    re.IGNORECASE,
+)
+# "not", "no need for", "doesn't have to be" ... right before a preference flips it
+_NEGATED = re.compile(r"\b(?:not|no need for|don'?t need|doesn'?t need|needn'?t|(?:do|does)n'?t have to be)\s*$",
+                      re.IGNORECASE)
+_NONSTOP_YES = re.compile(r"\b(?:non[- ]?stop|direct flights?|no layovers?)\b", re.IGNORECASE)
+_NONSTOP_NO = re.compile(
+    r"\b(?:layovers? (?:are |is )?(?:ok|fine)|connections? (?:are |is )?(?:ok|fine)|any stops)\b",
+    re.IGNORECASE,
+)
+_COUNTS = re.compile(r"\b(?P<n>\d{1,2})\s+(?P<what>flights?|hotels?)\b", re.IGNORECASE)
+_TOGGLE_ON = re.compile(
+    r"\b(?:enable|include|with|plan)\s+(?P<a>activities|critic)(?:\s+and\s+(?P<b>activities|critic))?\b",
+    re.IGNORECASE,
+)
+_TOGGLE_OFF = re.compile(
+    r"\b(?:no|skip|without|disable)\s+(?P<a>activities|critic)(?:\s+(?:or|and)\s+(?P<b>activities|critic))?\b",
+    re.IGNORECASE,
+)
+_CODE = re.compile(r"\b[A-Z]{3}\b")
+_NOT_BEFORE = re.compile(r"(?:\bnot|\bexcept|\binstead of|\brather than|\bbut not)$")
+_FROM_BEFORE = re.compile(r"\bfrom$")
+_TO_BEFORE = re.compile(r"(?:\bto|->|→|-)$")
+_CITY = re.compile(r"\b(?:" + "|".join(re.escape(c) for c in sorted(CITY_CODES, key=len, reverse=True))
+                   + r")\b", re.IGNORECASE)
+
+# Words that carry no information once the fields above are extracted
+_FILLER = frozenset("""
+a an the and or from to for of on in at with by via trip travel traveling travelling fly flying flight
+flights go going want would like please i we me my our us round roundtrip return returning depart
+departing leaving between budget total around about approx max maximum up usd dollars adults adult
+people person persons travelers traveler guests guest pax nonstop non stop direct only prefer
+preferred preferably hotel hotels enable include skip no without disable activities critic is are
+ok fine it be but
+""".split())
+
+
+@dataclass
+class ParseResult:
+    fields: Dict[str, Any] = field(default_factory=dict)
+    residual: str = ""          # text the rules could not account for ("" = fully parsed)
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.fields) and not self.residual
+
+
+def _resolve_year(month: int, day: int, year: Optional[str], today: date) -> Optional[date]:
+    try:
+        if year:
+            return date(int(year), month, day)
+        d = date(today.year, month, day)
+        return d if d >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def _parse_dates(text: str, today: date) -> Tuple[Optional[Tuple[date, date]], Optional[Tuple[int, int]]]:
+    for i, pat in enumerate(_DATE_PATTERNS):
+        m = pat.search(text)
+        if not m:
+            continue
+        g = m.groupdict()
+        if i == 0:
+            try:
+                start, end = date.fromisoformat(g["s"]), date.fromisoformat(g["e"])
+            except ValueError:
+                continue
+        else:
+            def _mon(v: Optional[str]) -> Optional[int]:
+                if v is None:
+                    return None
+                return int(v) if v.isdigit() else _MONTHS[v.lower().rstrip(".")]
+            m1, m2 = _mon(g.get("m1")), _mon(g.get("m2"))
+            m1, m2 = m1 or m2, m2 or m1
+            if m1 is None or m2 is None:
+                continue
+            year = g.get("y1") or g.get("y2")
+            start = _resolve_year(m1, int(g["d1"]), year, today)
+            if start is None:
+                continue
+            end = _resolve_year(m2, int(g["d2"]), g.get("y2") or str(start.year), today)
+            if end is not None and end < start and not g.get("y2"):
+                end = _resolve_year(m2, int(g["d2"]), str(start.year + 1), today)
+        if start and end and end >= start:
+            return (start, end), m.span()
+    return None, None
+
+
+def _parse_places(text: str) -> Tuple[Dict[str, str], List[Tuple[int, int]]]:
+    found: List[Tuple[int, int, str]] = []
+    for m in _CITY.finditer(text):
+        found.append((m.start(), m.end(), CITY_CODES[m.group(0).lower()]))
+    taken = [(s, e) for s, e, _ in found]
+    for m in _CODE.finditer(text):
+        if m.group(0) in IATA_CODES and not any(s <= m.start() < e for s, e in taken):
+            found.append((m.start(), m.end(), m.group(0)))
+    found.sort()
+
+    out: Dict[str, str] = {}
+    spans: List[Tuple[int, int]] = []
+    unkeyed: List[Tuple[int, int, str]] = []
+    for s, e, code in found:
+        before = text[:s].rstrip().lower()
+        if _NOT_BEFORE.search(before.rstrip(",")):
+            continue  # "to ROM, not LAX": excluded place, left for the model
+        if _FROM_BEFORE.search(before):
+            key = "origin"
+        elif _TO_BEFORE.search(before):
+            key = "destination"
+        else:
+            unkeyed.append((s, e, code))
+            continue
+        if key in out:
+            continue  # "to LAX to ROM": a second place for the field is left for the model
+        out[key] = code
+        spans.append((s, e))
+    # "SFO to ROM": a single unkeyed place before the destination is the origin.
+    # Anything else ambiguous stays in the residual for the model.
+    dest_at = next((s for s, _, code in found if out.get("destination") == code), None)
+    if len(unkeyed) == 1 and "origin" not in out and dest_at is not None and unkeyed[0][0] < dest_at:
+        s, e, code = unkeyed[0]
+        out["origin"] = code
+        spans.append((s, e))
+    return out, spans
+
+
+def parse_line(line: str, today: Optional[date] = None) -> ParseResult:
+    """
+    Deterministically extract intake fields from one line. Only confident
+    matches are returned; whatever is left over goes in `residual`.
+    """
+    today = today or date.today()
+    text = line.replace("–", "-").replace("—", "-")
+    fields: Dict[str, Any] = {}
+    spans: List[Tuple[int, int]] = []
+
+    dates, dspan = _parse_dates(text, today)
+    if dates:
+        fields["start_date"], fields["end_date"] = dates[0].isoformat(), dates[1].isoformat()
+        spans.append(dspan)
+
+    masked = text
+    for s, e in spans:
+        masked = masked[:s] + " " * (e - s) + masked[e:]
+
+    places, pspans = _parse_places(masked)
+    fields.update(places)
+    spans.extend(pspans)
+
+    m = _TRAVELERS.search(masked)
+    if m and int(m.group("n")) >= 1:
+        fields["adults"] = int(m.group("n"))
+        spans.append(m.span())
+    elif _SOLO.search(masked):
+        fields["adults"] = 1
+        spans.append(_SOLO.search(masked).span())
+
+    m = _BUDGET.search(masked)
+    if m:
+        raw = m.group("a") or m.group("b") or m.group("c")
+        k = m.group("ak") or m.group("bk") or m.group("ck")
+        amount = float(raw.replace(",", "")) * (1000 if k else 1)
+        if amount > 0:
+            fields["budget_usd"] = int(amount) if amount.is_integer() else amount
+            if m.group("a") or m.group("b"):  # "$" / "usd" / "dollars" in the text
+                fields["currency"] = "USD"
+            spans.append(m.span())
+
+    m = _NONSTOP_YES.search(masked)
+    if m:
+        neg = _NEGATED.search(masked[:m.start()])
+        fields["non_stop"] = neg is None
+        spans.append((neg.start() if neg else m.start(), m.end()))
+    elif _NONSTOP_NO.search(masked):
+        fields["non_stop"] = False
+        spans.append(_NONSTOP_NO.search(masked).span())
+
+    for m in _COUNTS.finditer(masked):
+        n = int(m.group("n"))
+        if m.group("what").lower().startswith("flight"):
+            fields["max_results_flights"] = n
+        else:
+            fields["max_results_hotels"] = fields["preview_hotels"] = n
+        spans.append(m.span())
+
+    for pat, value in ((_TOGGLE_OFF, False), (_TOGGLE_ON, True)):
+        for m in pat.finditer(masked):
+            for what in filter(None, (m.group("a"), m.group("b"))):
+                fields.setdefault(f"{what.lower()}_enabled", value)
+            spans.append(m.span())
+
+    for s, e in spans:
+        masked = masked[:s] + " " * (e - s) + masked[e:]
+    leftover = [w for w in re.findall(r"[A-Za-z]+", masked) if w.lower() not in _FILLER]
+    residual = " ".join(leftover) if leftover else ""
+    # numbers we did not consume are a sign we misread something (or e.g. a
+    # "budget is 3000 euros" left to the model): send the words around them too
+    if re.search(r"\d", masked):
+        residual = " ".join(re.findall(r"[^\W_][\w.,'$€£¥-]*", masked))
+    return ParseResult(fields=fields, residual=residual)
+
+
+def build_patch(state: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Orchestrator-shaped patch ({need_more_info, questions, state, next_step}) from fields."""
+    merged = {**(state.get("state") or {}), **fields}
+    missing = [f for f in REQUIRED_FIELDS if f not in merged and f not in state]
+    questions: List[str] = []
+    for f in missing:
+        q = QUESTIONS[f]
+        if q not in questions:
+            questions.append(q)
+    return {
+        "need_more_info": bool(missing),
+        "questions": questions,
+        "state": merged,
+        "next_step": "stop" if missing else "plan",
+    }
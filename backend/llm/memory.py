@@ -0,0 +1,141 @@
+from __future__ import annotations
+import json
+import uuid
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from backend.config.settings import HISTORY_MAX_ITEMS, HISTORY_MAX_TOKENS, HISTORY_MODE
+
+if TYPE_CHECKING:
+    from agents import SQLiteSession
+
+HISTORY_MODES = {"none", "last_n", "token_budget", "summarize"}
+
+# Chars kept per item when folding older turns into a summary
+_SUMMARY_SNIPPET = 160
+
+
+@dataclass
+class HistoryPolicy:
+    """
+    How much agent conversation history is replayed into each LLM call.
+      none          -> no history (every call stands alone)
+      last_n        -> the last `max_items` items
+      token_budget  -> newest items that fit in ~`max_tokens`
+      summarize     -> keep `max_items`; older items are folded into one summary item
+    """
+    mode: str = HISTORY_MODE
+    max_items: int = HISTORY_MAX_ITEMS
+    max_tokens: int = HISTORY_MAX_TOKENS
+
+    def __post_init__(self):
+        if self.mode not in HISTORY_MODES:
+            raise ValueError(f"history mode must be one of {sorted(HISTORY_MODES)}")
+        if self.max_items < 1:
+            raise ValueError("max_items must be >= 1")
+        if self.max_tokens < 1:
+            raise ValueError("max_tokens must be >= 1")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "HistoryPolicy":
+        return cls(**{k: v for k, v in (d or {}).items() if k in cls.__dataclass_fields__})
+
+
+def _estimate_tokens(item: Dict[str, Any]) -> int:
+    # ~4 chars per token is close enough for windowing decisions
+    return max(1, len(json.dumps(item, ensure_ascii=False, default=str)) // 4)
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+    return str(item.get("output") or item.get("arguments") or "")
+
+
+def _align_start(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop leading tool outputs whose call fell outside the window (the API rejects them)."""
+    for i, item in enumerate(items):
+        if not str(item.get("type", "")).endswith("_output"):
+            return items[i:]
+    return []
+
+
+class WindowedSession:
+    """
+    Agents SDK Session that stores everything in an underlying SQLiteSession but
+    only replays a window of it, per HistoryPolicy.
+    """
+
+    def __init__(self, inner: SQLiteSession, policy: Optional[HistoryPolicy] = None):
+        self.inner = inner
+        self.session_id = inner.session_id
+        self.policy = policy or HistoryPolicy()
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        mode = self.policy.mode
+        if mode == "none":
+            return []
+        items = await self.inner.get_items()
+        if mode in ("last_n", "summarize"):
+            head = items[:1] if mode == "summarize" and items and items[0].get("role") == "system" else []
+            tail = _align_start(items[len(head):][-self.policy.max_items:])
+            items = head + tail
+        elif mode == "token_budget":
+            budget, start = self.policy.max_tokens, len(items)
+            while start > 0 and budget - _estimate_tokens(items[start - 1]) >= 0:
+                start -= 1
+                budget -= _estimate_tokens(items[start])
+            items = _align_start(items[start:])
+        return items[-limit:] if limit else items
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        await self.inner.add_items(items)
+        if self.policy.mode == "summarize":
+            await self._fold()
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        return await self.inner.pop_item()
+
+    async def clear_session(self) -> None:
+        await self.inner.clear_session()
+
+    async def _fold(self) -> None:
+        """Summarize-and-truncate: replace everything before the window with one item."""
+        items = await self.inner.get_items()
+        keep = _align_start(items[-self.policy.max_items:])
+        older = items[: len(items) - len(keep)]
+        if not older or (len(older) == 1 and older[0].get("role") == "system"):
+            return
+        lines = []
+        for it in older:
+            text = " ".join(_item_text(it).split())
+            if text:
+                who = it.get("role") or it.get("type") or "item"
+                lines.append(f"- {who}: {text[:_SUMMARY_SNIPPET]}")
+        summary = {
+            "role": "system",
+            "content": "Summary of earlier conversation (truncated):\n" + "\n".join(lines),
+        }
+        await self.inner.clear_session()
+        await self.inner.add_items([summary] + keep)
+
+
+def windowed_session(session_id: str, policy: Optional[HistoryPolicy] = None,
+                     inner: Optional[Any] = None) -> WindowedSession:
+    """Windowed view of `inner` (any Agents SDK session), by default a new in-memory SQLiteSession."""
+    if inner is None:
+        from agents import SQLiteSession
+
+        inner = SQLiteSession(session_id)
+    return WindowedSession(inner, policy)
+
+
+def ephemeral_session(prefix: str = "run", policy: Optional[HistoryPolicy] = None) -> WindowedSession:
+    """Fresh in-memory session for a single run; discarded when the run ends."""
+    return windowed_session(f"{prefix}-{uuid.uuid4().hex}", policy)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, fields, replace
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from backend.config.settings import (
+    MODEL_DOWNGRADE_COOLDOWN_S, MODEL_DOWNGRADE_RATIO, MODEL_ROUTING_FILE, OPENAI_FAST_MODEL, OPENAI_MODEL,
+)
+from backend.utils.deadline import DeadlineExceeded, timeout_for
+from backend.utils.logger import get_logger
+from backend.utils.metrics import MODEL_DOWNGRADES
+
+if TYPE_CHECKING:
+    from agents import ModelSettings
+
+logger = get_logger("backend.llm.model_routing")
+
+
+# Model families that take a reasoning effort (and reject temperature);
+# "-chat" variants (e.g. gpt-5-chat-latest) are not reasoning models
+_REASONING_PREFIXES = ("o1", "o3", "o4", "gpt-5")
+
+
+def is_reasoning_model(model: Optional[str]) -> bool:
+    name = (model or "").lower().rsplit("/", 1)[-1]
+    return name.startswith(_REASONING_PREFIXES) and "chat" not in name
+
+
+@dataclass
+class StageProfile:
+    """
+    Model + settings for one agent stage. None leaves the SDK/model default.
+    The reasoning effort is only sent to reasoning models and the temperature
+    only to the others, so a profile stays valid when its model is swapped.
+    """
+    model: str = OPENAI_MODEL
+    reasoning_effort: Optional[str] = None      # minimal | low | medium | high (reasoning models)
+    max_output_tokens: Optional[int] = None
+    temperature: Optional[float] = None          # not accepted by reasoning models
+    latency_budget_s: Optional[float] = None     # None = never downgrade
+    fallback_model: Optional[str] = OPENAI_FAST_MODEL
+    fallback_reasoning_effort: Optional[str] = "minimal"
+
+    def model_settings(self, *, downgraded: bool = False) -> ModelSettings:
+        # the SDK is imported on first use, not with the app
+        from agents import ModelSettings
+        from openai.types.shared import Reasoning
+
+        downgraded = downgraded and bool(self.fallback_model)
+        model = self.fallback_model if downgraded else self.model
+        effort = self.fallback_reasoning_effort if downgraded else self.reasoning_effort
+        reasoning = is_reasoning_model(model)
+        kwargs: Dict[str, Any] = {}
+        if effort and reasoning:
+            if effort == "minimal" and not model.lower().rsplit("/", 1)[-1].startswith("gpt-5"):
+                effort = "low"  # o-series models have no minimal effort
+            kwargs["reasoning"] = Reasoning(effort=effort)
+        if self.max_output_tokens:
+            kwargs["max_tokens"] = self.max_output_tokens
+        if self.temperature is not None and not reasoning:
+            kwargs["temperature"] = self.temperature
+        return ModelSettings(**kwargs)
+
+    @classmethod
+    def from_dict(cls, base: "StageProfile", d: Dict[str, Any]) -> "StageProfile":
+        known = {f.name for f in fields(cls)}
+        return replace(base, **{k: v for k, v in d.items() if k in known})
+
+
+# Extraction-style stages stay cheap and fast; the critic gets more reasoning.
+# Efforts apply to reasoning models only. Reasoning tokens count against
+# max_output_tokens, so the critic's cap leaves room for medium effort.
+DEFAULT_PROFILES: Dict[str, StageProfile] = {
+    "orchestrator": StageProfile(reasoning_effort="minimal", max_output_tokens=800, latency_budget_s=6),
+    "planner": StageProfile(reasoning_effort="minimal", max_output_tokens=600, latency_budget_s=6),
+    "flights": StageProfile(reasoning_effort="low", max_output_tokens=2500, latency_budget_s=25),
+    "lodging": StageProfile(reasoning_effort="low", max_output_tokens=2500, latency_budget_s=25),
+    "activities": StageProfile(reasoning_effort="low", max_output_tokens=2000, latency_budget_s=25),
+    "budget": StageProfile(reasoning_effort="minimal", max_output_tokens=600, latency_budget_s=6),
+    "critic": StageProfile(reasoning_effort="medium", max_output_tokens=6000, latency_budget_s=30),
+}
+
+
+class ModelRouter:
+    """
+    Resolves the model and settings for each stage. Profiles come from
+    DEFAULT_PROFILES overlaid by an optional JSON file ({"<stage>": {...},
+    "*": {...}}), re-read when its mtime changes or on reload().
+
+    When a run on the primary model takes longer than `ratio` x the stage's
+    latency budget, the stage is routed to its fallback model (with minimal
+    reasoning) for `cooldown_s`, then the primary is tried again.
+    """
+
+    def __init__(self, path: Optional[str] = MODEL_ROUTING_FILE, *, ratio: float = MODEL_DOWNGRADE_RATIO,
+                 cooldown_s: float = MODEL_DOWNGRADE_COOLDOWN_S, check_interval_s: float = 2.0):
+        self.path = path
+        self.ratio = ratio
+        self.cooldown_s = cooldown_s
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, StageProfile] = dict(DEFAULT_PROFILES)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._downgraded_until: Dict[str, float] = {}
+        self.reload()
+
+    # ---- config ----
+
+    def reload(self) -> Dict[str, Dict[str, Any]]:
+        """Re-read the routing file (if any) and return the effective profiles."""
+        profiles = dict(DEFAULT_PROFILES)
+        mtime = None
+        if self.path and os.path.exists(self.path):
+            mtime = os.path.getmtime(self.path)
+            try:
+                with open(self.path, encoding="utf-8") as fh:
+                    raw = json.load(fh)
+            except (OSError, ValueError) as e:
+                logger.error("model routing file %s unreadable, keeping previous config: %s", self.path, e)
+                return self.describe()
+            base = raw.get("*") or {}
+            for stage in set(profiles) | {k for k in raw if k != "*"}:
+                merged = {**base, **(raw.get(stage) or {})}
+                profiles[stage] = StageProfile.from_dict(profiles.get(stage, StageProfile()), merged)
+        with self._lock:
+            self._profiles = profiles
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+        logger.info("model routing loaded (%s)", self.path or "defaults")
+        return self.describe()
+
+    def _maybe_reload(self) -> None:
+        if not self.path or time.monotonic() - self._checked_at < self.check_interval_s:
+            return
+        self._checked_at = time.monotonic()
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime != self._mtime:
+            self.reload()
+
+    def profile(self, stage: str) -> StageProfile:
+        self._maybe_reload()
+        return self._profiles.get(stage) or StageProfile()
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            stage: {**asdict(p), "downgraded": self._downgraded_until.get(stage, 0.0) > now}
+            for stage, p in sorted(self._profiles.items())
+        }
+
+    # ---- routing ----
+
+    def configured(self, stage: str) -> Dict[str, Any]:
+        """Agent(...) kwargs for the stage's primary model (used when building agents)."""
+        p = self.profile(stage)
+        return {"model": p.model, "model_settings": p.model_settings()}
+
+    def route(self, stage: str) -> Tuple[str, ModelSettings, bool]:
+        """(model, model settings, downgraded) for the next run of `stage`."""
+        p = self.profile(stage)
+        downgraded = bool(p.fallback_model) and self._downgraded_until.get(stage, 0.0) > time.monotonic()
+        model = p.fallback_model if downgraded else p.model
+        return model, p.model_settings(downgraded=downgraded), downgraded
+
+    def observe(self, stage: str, seconds: float, downgraded: bool) -> None:
+        p = self.profile(stage)
+        same = p.fallback_model == p.model and p.fallback_reasoning_effort == p.reasoning_effort
+        if downgraded or not p.latency_budget_s or not p.fallback_model or same:
+            return
+        if seconds >= self.ratio * p.latency_budget_s:
+            with self._lock:
+                self._downgraded_until[stage] = time.monotonic() + self.cooldown_s
+            MODEL_DOWNGRADES.inc(stage=stage)
+            logger.warning("stage %s took %.1fs (budget %.1fs); using %s for %.0fs",
+                           stage, seconds, p.latency_budget_s, p.fallback_model, self.cooldown_s)
+
+
+ROUTER = ModelRouter()
+
+
+def routed_agent(agent: Any, stage: str, router: ModelRouter = ROUTER) -> Tuple[Any, bool]:
+    """A copy of `agent` with the stage's current model and settings."""
+    model, settings, downgraded = router.route(stage)
+    return agent.clone(model=model, model_settings=settings), downgraded
+
+
+async def run_routed(agent: Any, stage: str, *, router: ModelRouter = ROUTER, **run_kwargs: Any) -> Any:
+    """
+    Runner.run with per-stage routing; the run's latency feeds the downgrade check.
+    The run is bounded by the active deadline (DeadlineExceeded when it runs out).
+    """
+    from agents import Runner
+
+    routed, downgraded = routed_agent(agent, stage, router)
+    budget = timeout_for(None)
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.wait_for(Runner.run(routed, **run_kwargs), budget)
+    except asyncio.TimeoutError as e:
+        raise DeadlineExceeded(f"{stage} ran out of time after {time.perf_counter() - t0:.1f}s") from e
+    finally:
+        # failures count too: a run that times out is the slowest kind
+        router.observe(stage, time.perf_counter() - t0, downgraded)
@@ -1,64 +1,309 @@
 from __future__ import annotations
+import asyncio
+import json
 import logging
-from typing import Any
-from openai import OpenAI
-from backend.config.settings import OPENAI_API_KEY, OPENAI_MODEL
+import random
+import weakref
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from backend.config.settings import (
+    OPENAI_API_KEY, OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE, OPENAI_MAX_RETRIES, OPENAI_MODEL,
+    OPENAI_RETRY_BASE_S, OPENAI_RETRY_MAX_S, OPENAI_TIMEOUT_S,
+)
+from backend.utils.deadline import DeadlineExceeded, remaining, timeout_for
+from backend.utils.metrics import OPENAI_RETRIES
 
 # --- Logger setup ---
 logger = logging.getLogger("backend.llm.openai_client")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-def respond(
-    system: str,
-    user: str,
-    *,
-    tools: list | None = None,
-    tool_choice: str | None = None,
-    json_schema: dict | None = None,
-    stream: bool = False,
-) -> Any:
+@lru_cache(maxsize=None)
+def get_client() -> Any:
+    """Shared synchronous client (the openai package is imported on first use)."""
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+# httpx connection pools belong to one event loop; keep a client per running loop
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> Any:
     """
-    Minimal wrapper for OpenAI Responses API.
-    Supports optional tool calling & JSON schema outputs.
+    Shared AsyncOpenAI client for the running loop, with a bounded connection
+    pool (OPENAI_MAX_CONNECTIONS / OPENAI_MAX_KEEPALIVE). SDK retries are off;
+    respond_async retries with jitter within the request deadline instead.
+    """
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                max_keepalive_connections=OPENAI_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_S, connect=10.0),
+        )
+        client = _ASYNC_CLIENTS[loop] = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http, max_retries=0)
+    return client
+
+
+def __getattr__(name: str) -> Any:
+    # `openai_client.client` (the old module-level client) still works
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def text_format(json_schema: Dict[str, Any]) -> Dict[str, Any]:
     """
+    Responses API `text` argument for structured output. Accepts the Chat
+    Completions shape ({"name", "schema", "strict"}) or a bare JSON schema.
+    """
+    if "schema" in json_schema:
+        name, schema, strict = json_schema.get("name"), json_schema["schema"], json_schema.get("strict", True)
+    else:
+        name, schema, strict = json_schema.get("title"), json_schema, True
+    return {"format": {"type": "json_schema", "name": name or "output", "schema": schema, "strict": strict}}
+
 
-    kwargs = dict(
-        model=OPENAI_MODEL,
+def _request(system: str, user: str, *, tools: list | None, tool_choice: str | None,
+             json_schema: dict | None, model: str | None) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = dict(
+        model=model or OPENAI_MODEL,
         input=[
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
     )
-
     # Add optional tools / structured output
     if tools:
         kwargs["tools"] = tools
         if tool_choice:
             kwargs["tool_choice"] = tool_choice
-
-    # New SDK expects "format" inside "response" args or special JSON mode
     if json_schema:
-        # Safe fallback – use 'response_format' only if supported
-        kwargs["response_format"] = {
-            "type": "json_schema",
-            "json_schema": json_schema,
-        }
+        kwargs["text"] = text_format(json_schema)
+    return kwargs
+
 
+def respond(
+    system: str,
+    user: str,
+    *,
+    tools: list | None = None,
+    tool_choice: str | None = None,
+    json_schema: dict | None = None,
+    stream: bool = False,
+) -> Any:
+    """
+    Minimal wrapper for OpenAI Responses API.
+    Supports optional tool calling & JSON schema outputs.
+    Blocking: from async code use respond_async / stream_json.
+    """
+    kwargs = _request(system, user, tools=tools, tool_choice=tool_choice, json_schema=json_schema, model=None)
     # Optional streaming
     if stream:
         kwargs["stream"] = True
-
     try:
-        resp = client.responses.create(**kwargs)
-        return resp
-    except TypeError as e:
-        # Compatibility fallback for SDKs that renamed argument
-        logger.warning("Falling back due to SDK change: %s", str(e))
-        kwargs.pop("response_format", None)
-        resp = client.responses.create(**kwargs)
-        return resp
+        return get_client().responses.create(**kwargs)
     except Exception as e:
         logger.error(f"OpenAI call failed: {e}", exc_info=True)
         raise RuntimeError("OpenAI call failed") from e
 
+
+# ---- Async -------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def transient_errors() -> Tuple[Type[BaseException], ...]:
+    """Worth another attempt: timeouts, connection drops, 429 and 5xx."""
+    import openai
+
+    return (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+            openai.RateLimitError, openai.InternalServerError)
+
+
+def _backoff(attempt: int, error: BaseException) -> float:
+    """Full-jitter exponential backoff; a server's Retry-After wins when it is longer."""
+    delay = random.uniform(0, min(OPENAI_RETRY_MAX_S, OPENAI_RETRY_BASE_S * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        delay = max(delay, min(OPENAI_RETRY_MAX_S, float(headers.get("retry-after", 0))))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+async def _retry_wait(attempt: int, error: BaseException, what: str) -> bool:
+    """Sleep before another attempt; False when out of retries or deadline."""
+    if attempt >= OPENAI_MAX_RETRIES:
+        return False
+    delay = _backoff(attempt, error)
+    left = remaining()
+    if left is not None and left <= delay:
+        return False
+    OPENAI_RETRIES.inc(error=error.__class__.__name__)
+    logger.warning("%s attempt %d failed (%s); retrying in %.2fs", what, attempt + 1, error.__class__.__name__, delay)
+    await asyncio.sleep(delay)
+    return True
+
+
+async def respond_async(
+    system: str,
+    user: str,
+    *,
+    tools: list | None = None,
+    tool_choice: str | None = None,
+    json_schema: dict | None = None,
+    model: str | None = None,
+) -> Any:
+    """
+    Async respond() on the shared pooled client. Transient failures are
+    retried (OPENAI_MAX_RETRIES, jittered backoff); each attempt is bounded
+    by the request deadline (DeadlineExceeded when it runs out).
+    """
+    kwargs = _request(system, user, tools=tools, tool_choice=tool_choice, json_schema=json_schema, model=model)
+    client = get_async_client()
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.wait_for(client.responses.create(**kwargs), timeout_for(OPENAI_TIMEOUT_S))
+        except DeadlineExceeded:
+            raise
+        except transient_errors() as e:
+            if await _retry_wait(attempt, e, "OpenAI call"):
+                attempt += 1
+                continue
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceeded(f"OpenAI call timed out after {attempt + 1} attempt(s)") from e
+            logger.error("OpenAI call failed after %d attempt(s): %s", attempt + 1, e)
+            raise RuntimeError("OpenAI call failed") from e
+        except Exception as e:
+            logger.error(f"OpenAI call failed: {e}", exc_info=True)
+            raise RuntimeError("OpenAI call failed") from e
+
+
+class JsonItemStream:
+    """
+    Incremental JSON scanner for streamed model output. feed() returns
+    (key, item) for every element of a top-level array, or of an array
+    directly under the top-level object (key = that field), as soon as the
+    element is complete; the whole document comes last as (None, document).
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._last_str: Optional[str] = None
+        self._key: Optional[str] = None
+        self._item: Optional[int] = None
+
+    def _item_level(self) -> bool:
+        return self._stack == ["{", "["] or self._stack == ["["]
+
+    def _emit(self, out: List[Tuple[Optional[str], Any]], end: int) -> None:
+        raw = self.text[self._item:end].strip()
+        self._item = None
+        out.append((self._key if self._stack[0] == "{" else None, json.loads(raw)))
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], Any]]:
+        out: List[Tuple[Optional[str], Any]] = []
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._stack == ["{"]:
+                        self._last_str = json.loads(text[self._str_start:i + 1])
+                continue
+            if self._start is None:
+                if c in "{[":
+                    self._start = i  # anything before the document (e.g. a code fence) is skipped
+                else:
+                    continue
+            if c in " \t\r\n":
+                continue
+            if c in "}]":
+                if c == "]" and self._item_level() and self._item is not None:
+                    self._emit(out, i)  # last scalar element
+                self._stack.pop()
+                if self._item_level() and self._item is not None:
+                    self._emit(out, i + 1)  # container element closed
+                if not self._stack:
+                    self.done = True
+                    out.append((None, json.loads(text[self._start:i + 1])))
+                continue
+            if c == ",":
+                if self._item_level() and self._item is not None:
+                    self._emit(out, i)
+                continue
+            if c == ":":
+                if self._stack == ["{"]:
+                    self._key = self._last_str
+                continue
+            if self._item_level() and self._item is None:
+                self._item = i
+            if c in "{[":
+                self._stack.append(c)
+            elif c == '"':
+                self._in_str = True
+                self._str_start = i
+        self._pos = len(text)
+        return out
+
+
+async def stream_json(
+    system: str,
+    user: str,
+    *,
+    json_schema: dict,
+    model: str | None = None,
+) -> AsyncIterator[Tuple[Optional[str], Any]]:
+    """
+    Streamed structured output: yields (field, item) for each list element as
+    soon as the model has finished writing it (see JsonItemStream), then
+    (None, document). A transient failure before anything was yielded is
+    retried like respond_async; after that it is raised.
+    """
+    kwargs = _request(system, user, tools=None, tool_choice=None, json_schema=json_schema, model=model)
+    client = get_async_client()
+    attempt = 0
+    while True:
+        parser = JsonItemStream()
+        yielded = False
+        try:
+            stream = await asyncio.wait_for(client.responses.create(stream=True, **kwargs),
+                                            timeout_for(OPENAI_TIMEOUT_S))
+            async for event in stream:
+                kind = getattr(event, "type", "")
+                if kind == "response.output_text.delta":
+                    for item in parser.feed(event.delta):
+                        yielded = True
+                        yield item
+                elif kind in ("error", "response.failed"):
+                    raise RuntimeError(f"OpenAI stream failed: {getattr(event, 'message', None) or kind}")
+            if not parser.done:
+                raise ValueError(f"OpenAI stream ended mid-document ({len(parser.text)} chars)")
+            return
+        except DeadlineExceeded:
+            raise
+        except transient_errors() as e:
+            if not yielded and await _retry_wait(attempt, e, "OpenAI stream"):
+                attempt += 1
+                continue
+            raise
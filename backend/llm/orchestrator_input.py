@@ -1,74 +1,296 @@
 import json
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 
-from agents import Runner, SQLiteSession
-from backend.llm.agents_graph import orchestrator as orchestrator_agent
+from backend.config.settings import INTAKE_FAST_PATH
+from backend.llm.agents_graph import get_agent
+from backend.llm.intake_parser import PATCH_KEYS, REQUIRED_FIELDS, build_patch, parse_line
+from backend.llm.memory import HistoryPolicy, windowed_session
+from backend.llm.model_routing import run_routed
+from backend.llm.state_patch import VersionConflict, VersionedState, applicable_ops, dict_to_ops, split_path
+from backend.schemas.agent_schema import StageOutputError, validate_output
+from backend.utils.logger import get_logger
+from backend.utils.metrics import INTAKE_PARSES, record_usage, track_stage
+from backend.utils.tracing import span
 
+logger = get_logger("backend.llm.orchestrator_input")
 
 
 def _safe_to_dict(obj: Any) -> dict:
-    """Best-effort conversion to dict from LLM returns (string JSON or dict)."""
-    if isinstance(obj, dict):
-        # Some agents return {"text": "<json>"}
-        if "text" in obj and isinstance(obj["text"], str):
-            try:
-                return json.loads(obj["text"])
-            except json.JSONDecodeError:
-                return {}
-        return obj
-    if isinstance(obj, str):
-        try:
-            return json.loads(obj)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+    """Orchestrator reply as a dict (repaired if near-valid); {} when it does not fit OrchestratorOutput."""
+    try:
+        return validate_output("orchestrator", obj)
+    except StageOutputError as e:
+        logger.warning("orchestrator output invalid: %s", e.errors)
+        return {}
+
+
+def intake_fields(state: dict) -> dict:
+    """
+    Effective trip fields of an intake state: top-level keys overlaid by the
+    orchestrator's nested "state" object (which is where its patches land).
+    """
+    flat = {k: v for k, v in state.items() if k not in PATCH_KEYS}
+    nested = state.get("state")
+    if isinstance(nested, dict):
+        flat.update(nested)
+    return flat
+
+
+# Message keywords -> state fields the model may need to see verbatim
+_FIELD_HINTS = {
+    ("from", "depart", "leaving", "origin", "home"): ("origin",),
+    ("to ", "going", "visit", "destination", "city"): ("destination",),
+    ("date", "day", "week", "month", "when", "jan", "feb", "mar", "apr", "may", "jun", "jul",
+     "aug", "sep", "oct", "nov", "dec", "later", "earlier"): ("start_date", "end_date"),
+    ("adult", "people", "person", "traveler", "traveller", "kid", "child", "guest"): ("adults",),
+    ("budget", "$", "usd", "cost", "cheap", "price", "spend", "currency", "eur"): (
+        "budget_usd", "currency", "fx_rates"),
+    ("stop", "direct", "layover", "connection"): ("non_stop",),
+    ("flight",): ("max_results_flights", "non_stop"),
+    ("hotel", "stay", "lodging"): ("max_results_hotels", "preview_hotels"),
+    ("activit", "tour", "museum"): ("activities_enabled",),
+    ("critic", "review"): ("critic_enabled",),
+}
+
+
+def _relevant_fields(line: str, fields: Dict[str, Any]) -> List[str]:
+    text = f" {line.lower()} "
+    keys = set(fields)
+    for words, names in _FIELD_HINTS.items():
+        if any(w in text for w in words):
+            keys.update(names)
+    return sorted(keys)
+
+
+def _field_keys(ops: List[dict]) -> set:
+    """Trip fields an op list writes: /state/<key>/... or a top-level /<key>."""
+    keys = set()
+    for op in ops:
+        for path in (op.get("path"), op.get("from") if op.get("op") == "move" else None):
+            parts = split_path(path) if isinstance(path, str) else []
+            if parts[:1] == ["state"]:
+                parts = parts[1:]
+            if parts:
+                keys.add(parts[0])
+    return keys
+
 
 class OrchestratorInputs:
     """
-    Maintains a state dict entirely produced/modified by the orchestrator.
+    Maintains a versioned state dict entirely produced/modified by the orchestrator.
     You can feed NL lines (or JSON-ish lines) and it will call the orchestrator
-    to return a JSON patch, then merge it into the state.
+    to return a JSON patch (JSON-Patch ops, or the legacy full-state shape),
+    then commit it against the version the patch was computed from.
     """
 
-    def __init__(self, session_id: Optional[str] = None, seed: Optional[dict] = None):
-        self.session = SQLiteSession(session_id or "trip_input_session")
-        self.state: dict = dict(seed or {})  # no defaults; seed is optional
+    # One retry when a concurrent change lands on the same paths mid-call
+    MAX_CONFLICT_RETRIES = 1
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        seed: Optional[dict] = None,
+        history: Optional[HistoryPolicy] = None,
+        version: int = 0,
+        conversation: Optional[Any] = None,
+        log: Optional[List[Any]] = None,
+    ):
+        self.session_id = session_id or "trip_input_session"
+        self.history = history or HistoryPolicy()
+        # `conversation`: Agents SDK session holding the orchestrator's turns (a
+        # session store passes a persistent one); default is in-memory
+        self.session = windowed_session(self.session_id, self.history, inner=conversation)
+        self._vs = VersionedState(seed or {}, version=version, log=log)  # no defaults; seed is optional
+        # Version last read from / written to a SessionStore (None = not stored yet)
+        self.stored_version: Optional[int] = None
+
+    @property
+    def state(self) -> dict:
+        return self._vs.doc
+
+    @property
+    def version(self) -> int:
+        return self._vs.version
 
     def _as_prompt(
         self,
         user_message: Optional[str] = None,
         state: Optional[dict] = None,
         payload: Optional[dict] = None,
+        digest: Optional[dict] = None,
+        relevant: Optional[dict] = None,
     ) -> str:
         parts = []
         if user_message is not None:
             parts.append(f"User message:\n{user_message}")
         if state is not None:
             parts.append("Current state JSON:\n" + json.dumps(state, ensure_ascii=False))
+        if digest is not None:
+            parts.append("State digest JSON:\n" + json.dumps(digest, ensure_ascii=False))
+        if relevant is not None:
+            parts.append("Relevant fields JSON:\n" + json.dumps(relevant, ensure_ascii=False))
         if payload is not None:
             parts.append("Payload JSON:\n" + json.dumps(payload, ensure_ascii=False))
         parts.append("Return ONLY valid JSON per your output schema. No prose.")
         return "\n\n".join(parts)
 
-    async def apply_line(self, line: str) -> dict:
+    def _digest(self, fields: Dict[str, Any]) -> dict:
+        """Compact view of the state: which fields are known/missing, not their values."""
+        known = intake_fields(self.state)
+        known.update(fields)
+        return {
+            "version": self.version,
+            "known": sorted(known),
+            "missing": [f for f in REQUIRED_FIELDS if f not in known],
+        }
+
+    def _patch_to_ops(self, patch: dict) -> List[dict]:
         """
-        Send one line of NL (or quick JSON) to the orchestrator.
-        Orchestrator returns a JSON payload/patch per its schema.
-        The result is merged into the current state.
+        Orchestrator output -> JSON-Patch ops against the state document.
+        `patch` ops are relative to the trip fields (the nested "state");
+        a legacy full "state" object becomes one add per key (never erasing).
+        Ops that would not apply to the current state (e.g. removing a key
+        that is not there) are dropped and logged instead of failing the line.
         """
-        prompt = self._as_prompt(user_message=line, state=self.state)
-        res = await Runner.run(orchestrator_agent, input=prompt, session=self.session)
+        ops: List[dict] = []
+        meta = {k: patch[k] for k in ("need_more_info", "questions", "next_step") if k in patch}
+        ops.extend(dict_to_ops(meta))
+        nested = patch.get("state")
+        delta = patch.get("patch")
+        if isinstance(delta, list):
+            for op in delta:
+                if not (isinstance(op, dict) and isinstance(op.get("path"), str)
+                        and op["path"].startswith("/")):
+                    logger.warning("session %s: dropped orchestrator op %r", self.session_id, op)
+                    continue
+                op = {**op, "path": "/state" + op["path"]}
+                if isinstance(op.get("from"), str):
+                    op["from"] = "/state" + op["from"]
+                ops.append(op)
+        if isinstance(nested, dict):
+            ops.extend(dict_to_ops(nested, "/state"))
+        extra = {k: v for k, v in patch.items() if k not in PATCH_KEYS and k != "patch"}
+        ops.extend(dict_to_ops(extra))
+        ops, dropped = applicable_ops(self.state, ops)
+        if dropped:
+            logger.warning("session %s: dropped %d orchestrator op(s): %s",
+                           self.session_id, len(dropped), "; ".join(dropped))
+        return ops
+
+    async def _ask_model(self, line: str, fields: Dict[str, Any], message: str) -> dict:
+        known = intake_fields(self.state)
+        known.update(fields)
+        relevant = {k: known[k] for k in _relevant_fields(line, fields) if k in known}
+        prompt = self._as_prompt(
+            user_message=message,
+            digest=self._digest(fields),
+            relevant=relevant,
+        )
+        with span("agent.orchestrator", stage="orchestrator"), track_stage("orchestrator"):
+            res = await run_routed(get_agent("orchestrator"), "orchestrator", input=prompt, session=self.session)
+        record_usage("orchestrator", res)
         final = getattr(res, "final_output", getattr(res, "text", "{}"))
         patch = _safe_to_dict(final)
-        if not isinstance(patch, dict):
-            patch = {}
-        self.state.update(patch)
+        return patch if isinstance(patch, dict) else {}
+
+    async def apply_line(self, line: str) -> dict:
+        """
+        Apply one line of NL (or quick JSON).
+        A rule-based parser runs first; if it accounts for the whole line the
+        patch is built without the model. Otherwise only the unparsed remainder
+        is sent to the orchestrator together with a compact state digest and
+        the fields relevant to the message (not the full state).
+        The resulting ops are committed against the version they were computed from.
+        """
+        return await self.apply_lines([line])
+
+    async def apply_lines(self, lines: List[str]) -> dict:
+        """
+        Apply several lines (e.g. a replayed transcript) as one update.
+        Each line goes through the rule parser; fields are merged in order so
+        later lines win. Whatever the rules could not parse is sent to the
+        orchestrator as a single numbered message -> at most one model call.
+        """
+        lines = [stripped for stripped in (line.strip() for line in lines) if stripped]
+        if not lines:
+            return dict(self.state)
+        fields: Dict[str, Any] = {}
+        leftovers: List[str] = []
+        for line in lines:
+            parsed = parse_line(line) if INTAKE_FAST_PATH else None
+            if parsed is None or not parsed.fields:
+                INTAKE_PARSES.inc(path="llm")
+                leftovers.append(line)
+                continue
+            fields.update(parsed.fields)
+            if parsed.complete:
+                INTAKE_PARSES.inc(path="rules")
+            else:
+                INTAKE_PARSES.inc(path="mixed")
+                leftovers.append(parsed.residual)
+        if len(leftovers) == 1:
+            message = leftovers[0]
+        else:
+            message = "\n".join(f"{i}. {text}" for i, text in enumerate(leftovers, 1))
+
+        for attempt in range(self.MAX_CONFLICT_RETRIES + 1):
+            base = self.version
+            if not leftovers:
+                # questions/next_step reflect the merged state; only new fields are written
+                ops = self._patch_to_ops({**build_patch(self.state, fields), "state": fields})
+            else:
+                patch = await self._ask_model(" ".join(lines), fields, message)
+                model_ops = self._patch_to_ops(patch)
+                # The model saw the rule fields and the text the rules could not
+                # read, so what it sets wins; rule fields only fill the rest
+                taken = _field_keys(model_ops)
+                ops = dict_to_ops({k: v for k, v in fields.items() if k not in taken}, "/state") + model_ops
+            try:
+                self._vs.commit(ops, base_version=base)
+                break
+            except VersionConflict:
+                if attempt >= self.MAX_CONFLICT_RETRIES:
+                    raise
         return dict(self.state)
 
-    def set(self, key: str, value: Any) -> dict:
-        """Manual override without calling the model."""
-        self.state[key] = value
+    def patch(self, ops: List[dict], base_version: Optional[int] = None) -> dict:
+        """Apply JSON-Patch ops directly (paths against the full state document)."""
+        self._vs.commit(ops, base_version=base_version)
         return dict(self.state)
 
+    def set(self, key: str, value: Any, base_version: Optional[int] = None) -> dict:
+        """
+        Manual override without calling the model. Keys already tracked in the
+        orchestrator's nested "state" are updated there so they take effect.
+        """
+        nested = self.state.get("state")
+        path = "/state" if isinstance(nested, dict) and key in nested else ""
+        return self.patch(dict_to_ops({key: value}, path), base_version=base_version)
+
     def show(self) -> dict:
-        return dict(self.state)
\ No newline at end of file
+        return dict(self.state)
+
+    def snapshot(self) -> str:
+        """Compact JSON snapshot used by persistent session stores."""
+        return json.dumps(
+            {
+                "session_id": self.session_id,
+                "state": self.state,
+                "version": self.version,
+                "log": self._vs.log,  # touched paths per version, for rebasing after a reload
+                "history": self.history.to_dict(),
+            },
+            ensure_ascii=False, separators=(",", ":"), default=str,
+        )
+
+    @classmethod
+    def from_snapshot(cls, raw: str | bytes, conversation: Optional[Any] = None) -> "OrchestratorInputs":
+        data = json.loads(raw)
+        return cls(
+            session_id=data.get("session_id"),
+            seed=data.get("state") or {},
+            history=HistoryPolicy.from_dict(data.get("history")),
+            version=int(data.get("version") or 0),
+            conversation=conversation,
+            log=data.get("log"),
+        )
@@ -0,0 +1,36 @@
+from __future__ import annotations
+from typing import Any
+
+from agents import AgentOutputSchema
+from agents.exceptions import ModelBehaviorError
+
+from backend.schemas.agent_schema import STAGE_OUTPUTS, InvalidOutput, StageOutputError, parse_output
+from backend.utils.metrics import OUTPUT_REPAIRS
+
+
+class StageOutputSchema(AgentOutputSchema):
+    """
+    output_type for an agent stage: its model from STAGE_OUTPUTS, with a
+    tolerant fallback. Near-valid JSON is repaired (backend.utils.json_repair);
+    a reply that still does not fit comes back as InvalidOutput instead of
+    raising, so the pipeline can re-ask just that stage.
+
+    The schema is sent non-strict: the models keep provider payloads as
+    free-form objects, which strict mode rejects.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(STAGE_OUTPUTS[stage], strict_json_schema=False)
+        self.stage = stage
+
+    def validate_json(self, json_str: str) -> Any:
+        try:
+            return super().validate_json(json_str)
+        except ModelBehaviorError:
+            pass
+        try:
+            out = parse_output(self.stage, json_str)
+        except StageOutputError as e:
+            return InvalidOutput(raw=e.raw, errors=e.errors)
+        OUTPUT_REPAIRS.inc(stage=self.stage, result="repaired")
+        return out
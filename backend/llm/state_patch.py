@@ -0,0 +1,237 @@
+from __future__ import annotations
+import copy
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+class PatchError(ValueError):
+    """An operation could not be applied (bad op, bad path, missing target)."""
+
+
+class VersionConflict(RuntimeError):
+    """A patch based on an older version touches paths changed since then."""
+
+    def __init__(self, base_version: int, current_version: int, paths: List[str]):
+        super().__init__(
+            f"state changed since version {base_version} (now {current_version}); "
+            f"conflicting paths: {', '.join(paths)}"
+        )
+        self.base_version = base_version
+        self.current_version = current_version
+        self.paths = paths
+
+
+# ---- JSON Pointer / JSON Patch (RFC 6901 / 6902 subset) -------------------------
+
+def split_path(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"path must start with '/': {path!r}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def join_path(parts: Iterable[str]) -> str:
+    return "".join("/" + str(p).replace("~", "~0").replace("/", "~1") for p in parts)
+
+
+def _index(container: list, token: str, *, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit():
+        raise PatchError(f"invalid list index {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"list index {i} out of range")
+    return i
+
+
+def _parent(doc: Any, parts: List[str], *, create: bool) -> Any:
+    node = doc
+    for token in parts[:-1]:
+        if isinstance(node, dict):
+            if token not in node:
+                if not create:
+                    raise PatchError(f"missing key {token!r}")
+                node[token] = {}
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, allow_end=False)]
+        else:
+            raise PatchError(f"cannot descend into {type(node).__name__} at {token!r}")
+    return node
+
+
+def _get(doc: Any, path: str) -> Any:
+    node = doc
+    for token in split_path(path):
+        if isinstance(node, dict):
+            if token not in node:
+                raise PatchError(f"missing key {token!r}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, allow_end=False)]
+        else:
+            raise PatchError(f"cannot descend into {type(node).__name__} at {token!r}")
+    return node
+
+
+def _add(doc: Any, parts: List[str], value: Any) -> None:
+    parent = _parent(doc, parts, create=True)
+    token = parts[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, token, allow_end=True), value)
+    else:
+        raise PatchError(f"cannot add into {type(parent).__name__}")
+
+
+def _remove(doc: Any, parts: List[str]) -> Any:
+    parent = _parent(doc, parts, create=False)
+    token = parts[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"missing key {token!r}")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, token, allow_end=False))
+    raise PatchError(f"cannot remove from {type(parent).__name__}")
+
+
+def _apply_op(out: Any, op: Dict[str, Any]) -> None:
+    """Apply one op to `out` in place."""
+    kind = op.get("op")
+    path = op.get("path")
+    if not isinstance(path, str):
+        raise PatchError(f"op without path: {op!r}")
+    parts = split_path(path)
+    if not parts:
+        raise PatchError("whole-document ops are not supported")
+    if kind in ("add", "replace"):
+        if "value" not in op:
+            raise PatchError(f"{kind} without value: {path}")
+        if kind == "replace" and isinstance(_parent(out, parts, create=True), list):
+            _remove(out, parts)
+        _add(out, parts, copy.deepcopy(op["value"]))
+    elif kind == "remove":
+        _remove(out, parts)
+    elif kind in ("move", "copy"):
+        src = op.get("from")
+        if not isinstance(src, str):
+            raise PatchError(f"{kind} without from: {path}")
+        value = _remove(out, split_path(src)) if kind == "move" else copy.deepcopy(_get(out, src))
+        _add(out, parts, value)
+    elif kind == "test":
+        if _get(out, path) != op.get("value"):
+            raise PatchError(f"test failed at {path}")
+    else:
+        raise PatchError(f"unsupported op {kind!r}")
+
+
+def apply_ops(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply add/remove/replace/move/copy/test ops and return a new document.
+    Intermediate objects are created for `add`/`replace` on nested keys, so
+    "/state/fx_rates/EUR" works on a state without fx_rates yet.
+    """
+    out = copy.deepcopy(doc)
+    for op in ops:
+        _apply_op(out, op)
+    return out
+
+
+def applicable_ops(doc: Dict[str, Any], ops: List[Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Split ops (e.g. model output) into those that apply cleanly in order
+    against `doc` and error messages for the ones that do not.
+    The document is copied once; only a failed op forces a rebuild (it may
+    have half-applied, e.g. a move whose target was invalid).
+    """
+    out = copy.deepcopy(doc)
+    kept: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    for op in ops:
+        try:
+            if not isinstance(op, dict):
+                raise PatchError(f"not an op: {op!r}")
+            _apply_op(out, op)
+        except PatchError as e:
+            errors.append(f"{op!r}: {e}")
+            if isinstance(op, dict):
+                out = apply_ops(doc, kept)
+        else:
+            kept.append(op)
+    return kept, errors
+
+
+def touched_paths(ops: List[Dict[str, Any]]) -> List[str]:
+    paths: List[str] = []
+    for op in ops:
+        if op.get("op") == "test":
+            continue
+        paths.append(op["path"])
+        if op.get("op") == "move" and isinstance(op.get("from"), str):
+            paths.append(op["from"])
+    return paths
+
+
+_EVERYTHING = "*"  # marker: history no longer covers the base version
+
+
+def _overlaps(a: str, b: str) -> bool:
+    if _EVERYTHING in (a, b):
+        return True
+    pa, pb = split_path(a), split_path(b)
+    n = min(len(pa), len(pb))
+    return pa[:n] == pb[:n]
+
+
+def dict_to_ops(values: Dict[str, Any], prefix: str = "") -> List[Dict[str, Any]]:
+    """One `add` per key (add replaces existing keys), under an optional pointer prefix."""
+    return [{"op": "add", "path": prefix + join_path([k]), "value": v} for k, v in values.items()]
+
+
+# ---- Versioned state --------------------------------------------------------------
+
+class VersionedState:
+    """
+    A dict document with a monotonically increasing version. Each commit
+    remembers which paths it touched, so a patch computed against an older
+    version is merged when it touches different paths and rejected with
+    VersionConflict when it overlaps a newer change (or names a version that
+    does not exist yet). The log can be saved with the document (`log`) so
+    rebasing keeps working after a reload.
+    """
+
+    def __init__(self, doc: Optional[Dict[str, Any]] = None, version: int = 0, log_size: int = 64,
+                 log: Optional[Iterable[Tuple[int, List[str]]]] = None):
+        self.doc: Dict[str, Any] = dict(doc or {})
+        self.version = version
+        self._log: Deque[Tuple[int, List[str]]] = deque(
+            ((int(v), list(paths)) for v, paths in (log or ()) if int(v) <= version), maxlen=log_size)
+
+    @property
+    def log(self) -> List[Tuple[int, List[str]]]:
+        return [(v, list(paths)) for v, paths in self._log]
+
+    def changed_since(self, base_version: int) -> List[str]:
+        if base_version < self.version and (not self._log or self._log[0][0] > base_version + 1):
+            return [_EVERYTHING]
+        return [p for v, paths in self._log if v > base_version for p in paths]
+
+    def commit(self, ops: List[Dict[str, Any]], base_version: Optional[int] = None) -> int:
+        if not ops:
+            return self.version
+        if base_version is not None and base_version > self.version:
+            raise VersionConflict(base_version, self.version, [_EVERYTHING])
+        if base_version is not None and base_version != self.version:
+            newer = self.changed_since(base_version)
+            mine = touched_paths(ops)
+            clashes = sorted({p for p in mine for q in newer if _overlaps(p, q)})
+            if clashes:
+                raise VersionConflict(base_version, self.version, clashes)
+        self.doc = apply_ops(self.doc, ops)
+        self.version += 1
+        self._log.append((self.version, touched_paths(ops)))
+        return self.version
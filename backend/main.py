@@ -1,16 +1,51 @@
 # backend/api.py
-import json
-from typing import Any, Dict, Optional
-from fastapi import FastAPI, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
-from agents import Runner, SQLiteSession
-from backend.llm.agents_graph import orchestrator, planner, flights, lodging, activities, budget, critic
+from backend.config.settings import (
+    AGENTS_PRELOAD, HISTORY_MAX_ITEMS, HISTORY_MAX_TOKENS, HISTORY_MODE, PIPELINE_MODE, REQUEST_DEADLINE_MAX_S,
+)
+from backend.llm.agents_graph import preload_agents
+from backend.llm.memory import HistoryPolicy
 from backend.llm.orchestrator_input import OrchestratorInputs
-from backend.utils.utils import as_dict, as_prompt
+from backend.llm.state_patch import PatchError, VersionConflict
+from backend.orchestrator.intake_queue import IntakeBatcher, SessionNotFound
+from backend.orchestrator.jobs import get_job_queue
+from backend.orchestrator.pipeline import run_pipeline as _run_pipeline
+from backend.orchestrator.prefetch import Prefetcher
+from backend.orchestrator.replan import StageMemo, affected_stages
+from backend.orchestrator.run_cache import IdempotencyConflict, RunCache, state_hash
+from backend.orchestrator.session_store import SessionStore, make_session_store
+from backend.routers import monitor, runs, trips
+from backend.utils.deadline import DeadlineExceeded, within
+from backend.utils.encoding import negotiated
+from backend.utils.metrics import HTTP_LATENCY, format_server_timing, start_server_timing
+from backend.utils.tracing import span
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs = get_job_queue()
+    await jobs.start()
+    if AGENTS_PRELOAD:
+        # Serve right away; the Agents SDK and agents load off the loop in the background
+        asyncio.get_running_loop().run_in_executor(None, preload_agents)
+    try:
+        yield
+    finally:
+        await jobs.stop()
 
-app = FastAPI(title="Trip Orchestrator API", version="1.0.0")
+
+app = FastAPI(title="Trip Orchestrator API", version="1.0.0", lifespan=lifespan)
+app.include_router(runs.router)
+app.include_router(monitor.router)
+app.include_router(trips.router)
 
 # Adjust this for your frontend origin(s)
 app.add_middleware(
@@ -21,23 +56,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def deadline(request: Request, call_next):
+    """
+    Request deadline from `X-Deadline-Ms` (or `?deadline_ms=`), in milliseconds
+    from now. It bounds every agent run, tool call and Amadeus request below.
+    """
+    raw = request.headers.get("x-deadline-ms") or request.query_params.get("deadline_ms")
+    if not raw:
+        return await call_next(request)
+    try:
+        seconds = float(raw) / 1000.0
+    except ValueError:
+        return JSONResponse({"detail": f"invalid deadline: {raw!r}"}, status_code=400)
+    with within(min(max(0.0, seconds), REQUEST_DEADLINE_MAX_S)):
+        return await call_next(request)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return JSONResponse({"detail": str(exc) or "deadline exceeded"}, status_code=504)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Per-request stage/Amadeus timings as a Server-Timing header + latency histogram."""
+    timings = start_server_timing()
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - t0
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_LATENCY.observe(total, method=request.method, route=route)
+    response.headers["Server-Timing"] = format_server_timing(timings, total)
+    return response
+
+@app.middleware("http")
+async def tracing(request: Request, call_next):
+    """Root span per API request; the trace id is echoed in X-Trace-Id."""
+    with span(f"http {request.method}", trace_id=request.headers.get("x-trace-id"),
+              path=request.url.path) as sp:
+        response = await call_next(request)
+        route = getattr(request.scope.get("route"), "path", None)
+        if route:
+            sp.name = f"http {request.method} {route}"
+        sp.set(status_code=response.status_code)
+    response.headers["X-Trace-Id"] = sp.trace_id
+    return response
+
 # -----------------------
-# Simple in-memory session store
+# Session store (bounded; memory / sqlite / redis per SESSION_STORE)
 # -----------------------
-_SESSIONS: Dict[str, OrchestratorInputs] = {}
+_SESSIONS: SessionStore = make_session_store()
+# Serializes intake per session and coalesces near-simultaneous lines into one batch
+_INTAKE = IntakeBatcher()
+# Starts tool searches in the background once intake has origin/destination/dates
+_PREFETCH = Prefetcher()
+# Completed /run results by canonical state hash (+ in-flight dedupe, Idempotency-Key)
+_RUNS = RunCache()
+# Per-session stage outputs for incremental re-planning
+_MEMO = StageMemo()
 
 # -----------------------
 # Pydantic models
 # -----------------------
+class HistoryBody(BaseModel):
+    mode: Literal["none", "last_n", "token_budget", "summarize"] = HISTORY_MODE
+    max_items: int = Field(HISTORY_MAX_ITEMS, ge=1, description="Items kept for last_n/summarize")
+    max_tokens: int = Field(HISTORY_MAX_TOKENS, ge=1, description="Token window for token_budget")
+
 class CreateSessionBody(BaseModel):
     session_id: str = Field(..., description="Client-provided session id (e.g., UUID)")
+    history: Optional[HistoryBody] = Field(None, description="Conversation history policy")
 
 class ApplyLineBody(BaseModel):
     line: str = Field(..., description="Natural language line to feed the orchestrator")
 
+class ApplyLinesBody(BaseModel):
+    lines: List[str] = Field(..., min_length=1, description="Lines applied in order with one orchestrator call")
+
 class SetKeyBody(BaseModel):
     key: str
     value: Any  # value can be string/number/bool/object/array
+    base_version: Optional[int] = Field(None, description="Reject if the key changed since this version")
+
+class PatchBody(BaseModel):
+    ops: List[Dict[str, Any]] = Field(..., description="JSON-Patch ops against the state document")
+    base_version: Optional[int] = Field(None, description="State version the ops were computed from")
 
 class SeedBody(BaseModel):
     nl: Optional[str] = Field(None, description="Optional one-shot NL seed")
@@ -49,9 +151,30 @@ class RunResult(BaseModel):
 # Helpers
 # -----------------------
 def _require_session(session_id: str) -> OrchestratorInputs:
-    if session_id not in _SESSIONS:
+    orch = _SESSIONS.get(session_id)
+    if orch is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
+    return orch
+
+async def _apply_lines(session_id: str, lines: List[str]) -> Dict[str, Any]:
+    _require_session(session_id)
+    try:
+        out = await _INTAKE.submit(
+            session_id, lines,
+            load=lambda: _SESSIONS.get(session_id),
+            save=lambda orch: _SESSIONS.put(session_id, orch),
+        )
+    except SessionNotFound:
         raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
-    return _SESSIONS[session_id]
+    except (VersionConflict, PatchError) as e:
+        raise _commit_error(e)
+    _PREFETCH.on_state(session_id, out["state"])
+    return out
+
+def _commit_error(e: Exception) -> HTTPException:
+    if isinstance(e, VersionConflict):
+        return HTTPException(status_code=409, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
 
 # -----------------------
 # Endpoints
@@ -59,13 +182,11 @@ def _require_session(session_id: str) -> OrchestratorInputs:
 @app.post("/session", response_model=dict)
 async def create_session(body: CreateSessionBody):
     """
-    Create a new orchestrator session (stateless across process restarts).
+    Create a new orchestrator session. Reusing an id resets it to a fresh state.
     """
-    if body.session_id in _SESSIONS:
-        # Reset it to a fresh OrchestratorInputs if client reuses id intentionally
-        _SESSIONS[body.session_id] = OrchestratorInputs(session_id=body.session_id)
-    else:
-        _SESSIONS[body.session_id] = OrchestratorInputs(session_id=body.session_id)
+    history = HistoryPolicy(**body.history.model_dump()) if body.history else None
+    _PREFETCH.forget(body.session_id)
+    _SESSIONS.create(body.session_id, history)
     return {"ok": True, "session_id": body.session_id}
 
 @app.post("/session/{session_id}/seed", response_model=dict)
@@ -73,21 +194,30 @@ async def seed_session(session_id: str, body: SeedBody):
     """
     Optionally seed with a single NL line to create initial dict.
     """
-    orch = _require_session(session_id)
     if body.nl:
-        state = await orch.apply_line(body.nl)
-    else:
-        state = orch.show()
-    return {"ok": True, "state": state}
+        out = await _apply_lines(session_id, [body.nl])
+        return {"ok": True, "state": out["state"], "version": out["version"]}
+    orch = _require_session(session_id)
+    return {"ok": True, "state": orch.show(), "version": orch.version}
 
 @app.post("/session/{session_id}/apply-line", response_model=dict)
 async def apply_line(session_id: str, body: ApplyLineBody):
     """
     Apply a natural-language line to the orchestrator and return updated state.
+    Concurrent calls on the same session are queued; lines that arrive while
+    another call is in flight share the next orchestrator call.
     """
-    orch = _require_session(session_id)
-    state = await orch.apply_line(body.line)
-    return {"ok": True, "state": state}
+    out = await _apply_lines(session_id, [body.line])
+    return {"ok": True, "state": out["state"], "version": out["version"]}
+
+@app.post("/session/{session_id}/apply-lines", response_model=dict)
+async def apply_lines(session_id: str, body: ApplyLinesBody):
+    """
+    Apply several lines (e.g. a replayed chat transcript) in order with a
+    single orchestrator call and return the updated state.
+    """
+    out = await _apply_lines(session_id, body.lines)
+    return {"ok": True, "state": out["state"], "version": out["version"], "batched": out["batched"]}
 
 @app.post("/session/{session_id}/set", response_model=dict)
 async def set_key(session_id: str, body: SetKeyBody):
@@ -95,90 +225,123 @@ async def set_key(session_id: str, body: SetKeyBody):
     Set a key to a JSON value (no string parsing needed on client).
     """
     orch = _require_session(session_id)
-    orch.set(body.key, body.value)
-    return {"ok": True, "state": orch.show()}
+    try:
+        orch.set(body.key, body.value, base_version=body.base_version)
+        _SESSIONS.put(session_id, orch)
+    except (VersionConflict, PatchError) as e:
+        raise _commit_error(e)
+    _PREFETCH.on_state(session_id, orch.state)
+    return {"ok": True, "state": orch.show(), "version": orch.version,
+            "replans": sorted(affected_stages([body.key]))}
+
+@app.post("/session/{session_id}/patch", response_model=dict)
+async def patch_state(session_id: str, body: PatchBody):
+    """
+    Apply JSON-Patch ops (add/remove/replace/move/copy/test; nested keys and
+    list indices supported). With `base_version`, ops are merged if they touch
+    paths unchanged since that version and rejected with 409 otherwise.
+    """
+    orch = _require_session(session_id)
+    try:
+        orch.patch(body.ops, base_version=body.base_version)
+        _SESSIONS.put(session_id, orch)
+    except (VersionConflict, PatchError) as e:
+        raise _commit_error(e)
+    _PREFETCH.on_state(session_id, orch.state)
+    return {"ok": True, "state": orch.show(), "version": orch.version}
+
+_FIELDS_QUERY = Query(None, description="Comma-separated dotted paths to return, e.g. state.origin,version")
 
 @app.get("/session/{session_id}/show", response_model=dict)
-async def show_state(session_id: str):
+async def show_state(request: Request, session_id: str, fields: Optional[str] = _FIELDS_QUERY):
     """
     Return the current orchestrated TEST_INPUT dict.
+    Carries a strong ETag; a matching If-None-Match gets 304 without a body.
     """
     orch = _require_session(session_id)
     state = orch.show()
     if not isinstance(state, dict) or not state:
         raise HTTPException(status_code=400, detail="Orchestrator did not produce a valid non-empty dict.")
-    return {"ok": True, "state": state}
+    return negotiated(request, {"ok": True, "state": state, "version": orch.version}, fields=fields, etag=True)
+
+PipelineMode = Literal["agents", "direct"]
+_MODE_QUERY = Query(PIPELINE_MODE, description="agents = LLM agent per stage; direct = tool calls + planner/critic")
+_CRITIC_QUERY = Query(None, description="true = always run the critic agent; false = no critic; "
+                      "default: rule checks, critic agent only if they flag something")
+_REFRESH_QUERY = Query(False, description="Run again even if a result for this state is cached")
 
 @app.post("/session/{session_id}/run", response_model=RunResult)
-async def run_pipeline(session_id: str):
+async def run_pipeline(request: Request, session_id: str, mode: PipelineMode = _MODE_QUERY,
+                       critic: Optional[bool] = _CRITIC_QUERY, fields: Optional[str] = _FIELDS_QUERY,
+                       refresh: bool = _REFRESH_QUERY):
     """
     Execute full pipeline:
       planner -> flights -> lodging -> activities -> budget -> critic
-    Returns merged result with the key fields expected by the UI.
+    `?mode=direct` fills flights/lodging/activities with concurrent tool calls
+    and computes the budget, skipping those LLM turns.
+    Returns merged result with the key fields expected by the UI
+    (`?fields=result.budget,result.critic` for a sparse response).
+    Results are cached for RUN_CACHE_TTL_S under a hash of the canonical
+    state + options; a duplicate run waits on the one in flight. An
+    `Idempotency-Key` header replays its first run (422 if reused for a
+    different state). X-Run-Cache reports hit / joined / miss.
+    Stages whose inputs did not change since this session's last run are
+    reused (see "reused"), so e.g. a budget change only re-caps the budget.
     """
     orch = _require_session(session_id)
     TEST_INPUT = orch.show()
     if not isinstance(TEST_INPUT, dict) or not TEST_INPUT:
         raise HTTPException(status_code=400, detail="Orchestrator did not produce a valid non-empty dict.")
-    
-    # 1) Planner
-    session = SQLiteSession("smoke_pipeline")
-    # 1) Planner
-    p_res = await Runner.run(planner, input=as_prompt(TEST_INPUT), session=session)
-    p = as_dict(p_res)
-    print("PLANNER ***************************" , p)
-    assert "trip" in p and "primary_city" in p, "Planner failed"
-    merged = {**TEST_INPUT, **p}
-
-    # 2) Flights
-    f_res = await Runner.run(flights, input=as_prompt(merged), session=session)
-    f = as_dict(f_res)
-    print("FLIGHT ***************************" , f)
-    assert "flight_options" in f, "Flights failed"
-    merged = {**merged, **f}
-
-    # 3) Lodging
-    l_res = await Runner.run(lodging, input=as_prompt(merged), session=session)
-    l = as_dict(l_res)
-    print("HOTELS ***************************" , l)
-    assert "lodging_options" in l, "Lodging failed"
-    merged = {**merged, **l}
-
-    # 4) Activities
-    a_res = await Runner.run(activities, input=as_prompt(merged), session=session)
-    a = as_dict(a_res)
-    print("ACTIVITIES ***************************" , a)
-    assert ("activities" in a) or ("plan" in a), "Activities failed"
-    merged = {**merged, **a}
-
-    # 5) Budget
-    b_res = await Runner.run(budget, input=as_prompt(merged), session=session)
-    b = as_dict(b_res)
-    print("Budget ***************************" , b)
-    assert "budget" in b, "Budget failed"
-    merged = {**merged, **b}
-
-    # 6) Critic
-    c_res = await Runner.run(critic, input=as_prompt(merged), session=session)
-    c = as_dict(c_res)
-    print("Critics ***************************" , c)
-    assert "critic" in c, "Critic failed"
-    merged = {**merged, **c}
-
-    print(json.dumps(
-        {k: merged[k] for k in ["trip","flight_options","lodging_options","activities","plan","budget","critic"] if k in merged},
-        indent=2, ensure_ascii=False
-    ))
-
-    payload = {
-        k: merged[k] 
-        for k in ["trip","flight_options","lodging_options","activities","plan","budget","critic"] 
-        if k in merged
-    }
-
-    return RunResult(result=payload)
+
+    idem = request.headers.get("idempotency-key")
+    try:
+        key = _RUNS.bind(f"{session_id}:{idem}" if idem else None,
+                         state_hash(TEST_INPUT, mode=mode, critic=critic))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if refresh:
+        _RUNS.invalidate(key)
+    payload, how = await _RUNS.run(key, lambda: _run_pipeline(
+        TEST_INPUT, history=orch.history, mode=mode, critic=critic, memo=_MEMO.for_session(session_id)))
+    response = negotiated(request, RunResult(result=payload).model_dump(), fields=fields)
+    response.headers["X-Run-Cache"] = how
+    return response
+
+PipelineStage = Literal["planner", "flights", "lodging", "activities", "budget", "critic"]
+
+@app.post("/session/{session_id}/run/{stage}", response_model=RunResult)
+async def run_stage(request: Request, session_id: str, stage: PipelineStage, mode: PipelineMode = _MODE_QUERY,
+                    critic: Optional[bool] = _CRITIC_QUERY, fields: Optional[str] = _FIELDS_QUERY):
+    """
+    Run one stage (plus any upstream stage whose memoized output is stale)
+    against the current state, e.g. `/run/lodging` after a hotel preference
+    change. Stages downstream of it are left alone.
+    """
+    orch = _require_session(session_id)
+    state = orch.show()
+    if not isinstance(state, dict) or not state:
+        raise HTTPException(status_code=400, detail="Orchestrator did not produce a valid non-empty dict.")
+    payload = await _run_pipeline(state, history=orch.history, mode=mode, critic=critic,
+                                  memo=_MEMO.for_session(session_id), only=stage)
+    return negotiated(request, RunResult(result=payload).model_dump(), fields=fields)
+
+@app.post("/session/{session_id}/runs", response_model=dict, status_code=202)
+async def submit_run(session_id: str, mode: PipelineMode = _MODE_QUERY,
+                     critic: Optional[bool] = _CRITIC_QUERY):
+    """
+    Queue the full pipeline for background execution and return a job id at once.
+    Poll `GET /runs/{job_id}` (optionally with `?wait=`) for status and partial results.
+    """
+    orch = _require_session(session_id)
+    state = orch.show()
+    if not isinstance(state, dict) or not state:
+        raise HTTPException(status_code=400, detail="Orchestrator did not produce a valid non-empty dict.")
+    job_id = await get_job_queue().submit(session_id, state, {"mode": mode, "critic": critic})
+    return {"ok": True, "job_id": job_id, "status": "queued"}
 
 @app.delete("/session/{session_id}", response_model=dict)
 async def delete_session(session_id: str):
-    _SESSIONS.pop(session_id, None)
+    _SESSIONS.delete(session_id)
+    _PREFETCH.forget(session_id)
+    _MEMO.forget(session_id)
     return {"ok": True}
\ No newline at end of file
@@ -1,17 +1,26 @@
 from __future__ import annotations
 from typing import Any, Dict
 import json
-from agents import Runner, SQLiteSession
-from backend.llm.agents_graph import orchestrator, planner, flights, lodging, activities, budget, critic
+from backend.llm.agents_graph import get_agent
+from backend.llm.memory import HistoryPolicy, ephemeral_session, windowed_session
+from backend.llm.model_routing import run_routed
+from backend.orchestrator.critic_checks import critic_from_findings, run_checks
+from backend.orchestrator.direct import flights_stage
+from backend.schemas.agent_schema import StageOutputError, validate_output
+from backend.utils.metrics import record_usage, track_stage
+from backend.utils.tracing import span
 
 import logging
-logger = logging.getLogger("orchestrator")
+from backend.utils.logger import get_logger, log_payload
+logger = get_logger("orchestrator")
 logging.basicConfig(level=logging.INFO)
 
 class Orchestrator:
     """High-level coordination using OpenAI Agents SDK +existing tools."""
-    def __init__(self, session_id: str | None = None):
-        self.session = SQLiteSession(session_id or "trip_session")
+    def __init__(self, session_id: str | None = None, history: HistoryPolicy | None = None):
+        self.history = history or HistoryPolicy()
+        # Intake chat keeps a windowed conversation; plan_trip runs get their own session
+        self.session = windowed_session(session_id or "trip_session", self.history)
 
     def _as_prompt(self, user_message: str | None = None, state: dict | None = None, payload: dict | None = None) -> str:
         """Safely build a single string input for the agent run."""
@@ -25,59 +34,61 @@ class Orchestrator:
         parts.append("Return ONLY valid JSON per your output schema. No prose.")
         return "\n\n".join(parts)
 
-    async def _run_agent(self, agent, input: Any) -> dict:
+    async def _run_agent(self, agent, input: Any, session=None) -> dict:
         # Normalize any dict payload to a string prompt
         if isinstance(input, dict):
             prompt = self._as_prompt(payload=input)
         else:
             prompt = str(input)
 
-        result = await Runner.run(agent, input=prompt, session=self.session)
-        return result.final_output if isinstance(result.final_output, dict) else {"text": result.final_output}
+        stage = agent.name.lower()
+        with span(f"agent.{stage}", stage=stage), track_stage(stage):
+            result = await run_routed(agent, stage, input=prompt, session=session or self.session)
+        record_usage(stage, result)
+        try:
+            return validate_output(stage, result.final_output)
+        except StageOutputError as e:
+            logger.warning("[ORCH] %s output invalid: %s", stage, e.errors)
+            return {}
 
     async def chat(self, user_message: str, state: dict | None = None) -> Dict[str, Any]:
         """Intake/triage: ask for missing info or move to planning."""
         prompt = self._as_prompt(user_message=user_message, state=state or {})
-        out = await Runner.run(orchestrator, input=prompt, session=self.session)
+        with span("agent.orchestrator", stage="orchestrator"), track_stage("orchestrator"):
+            out = await run_routed(get_agent("orchestrator"), "orchestrator", input=prompt, session=self.session)
+        record_usage("orchestrator", out)
         
-        print("DEBUG final_output:", out.final_output) 
+        log_payload(logger, "stage_output", "orchestrator final_output", out.final_output,
+                    level=logging.DEBUG, stage="orchestrator")
         
-        data = out.final_output if isinstance(out.final_output, dict) else {}
+        try:
+            data = validate_output("orchestrator", out.final_output)
+        except StageOutputError:
+            data = {}
         return {
             "need_more_info": bool(data.get("need_more_info", False)),
             "questions": data.get("questions", []),
-            "state": data.get("state", {}),
+            "state": data.get("state") or {},
             "next_step": data.get("next_step", "plan"),
         }
 
     async def plan_trip(self, payload: dict) -> Dict[str, Any]:
         """Fixed sequence (simple & reliable)."""
         logger.info("[ORCH] /plan payload keys=%s", list(payload.keys()))
+        run_session = ephemeral_session("plan", self.history)
         # 1) Planner
-        p = await self._run_agent(planner, payload)
+        p = await self._run_agent(get_agent("planner"), payload, run_session)
         logger.info("[ORCH] Planner out keys=%s", list(p.keys()))
         # 2) Flights
         f_in = {**payload, **p}
 
         logger.info("[ORCH] Flights in keys=%s", list(f_in.keys()))
 
-        f = await self._run_agent(flights, f_in)
+        f = await self._run_agent(get_agent("flights"), f_in, run_session)
 
         if not isinstance(f, dict) or "flight_options" not in f:
-            # Deterministic fallback
-            from backend.tools.flights_api import search_flights as _search_flights
-            f = {
-                "flight_options": _search_flights(
-                    origin=f_in.get("origin"),
-                    destination=f_in.get("destination"),
-                    depart_date=f_in.get("start_date"),
-                    return_date=f_in.get("end_date"),
-                    adults=int(f_in.get("adults", 1)),
-                    currency="USD",
-                    non_stop=bool(f_in.get("non_stop") or False),
-                    max_results=int(f_in.get("max_results_flights", 12)),
-                ) or {}
-            }
+            # Deterministic fallback: same direct search + ranking as the "direct" pipeline mode
+            f = await flights_stage(f_in)
 
         logger.info("[ORCH] Flights out keys=%s; sample=%s",
                     list((f or {}).keys()),
@@ -87,20 +98,24 @@ class Orchestrator:
         # 3) Lodging
         l_in = {**payload, **p, **f}
         logger.info("[ORCH] Lodging in keys=%s", list(l_in.keys()))
-        l = await self._run_agent(lodging, l_in)
-        logger.info("[ORCH] Activities out keys=%s", list((a or {}).keys()))
-        
+        l = await self._run_agent(get_agent("lodging"), l_in, run_session)
+
         # 4) Activities
         a_in = {**payload, **p, **f, **l}
-        a = await self._run_agent(activities, a_in)
+        a = await self._run_agent(get_agent("activities"), a_in, run_session)
+        logger.info("[ORCH] Activities out keys=%s", list((a or {}).keys()))
 
         # 5) Budget
         b_in = {**payload, **p, **f, **l, **a}
-        b = await self._run_agent(budget, b_in)
+        b = await self._run_agent(get_agent("budget"), b_in, run_session)
 
-        # 6) Critic
+        # 6) Critic (only when the rule checks flag something)
         c_in = {**payload, **p, **f, **l, **a, **b}
-        c = await self._run_agent(critic, c_in)
+        findings = run_checks(c_in)
+        if findings:
+            c = await self._run_agent(get_agent("critic"), {**c_in, "critic_checks": findings}, run_session)
+        else:
+            c = critic_from_findings(findings, c_in)
 
         # Merge final result
         merged = {**p, **f, **l, **a, **b, **c}
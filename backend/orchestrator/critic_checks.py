@@ -0,0 +1,150 @@
+from __future__ import annotations
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.orchestrator.direct import trip_params
+
+# A finding is {"check", "issue", "mitigation"}; issue/mitigation map onto critic.risks.
+Finding = Dict[str, str]
+
+
+def _date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _finding(check: str, issue: str, mitigation: str) -> Finding:
+    return {"check": check, "issue": issue, "mitigation": mitigation}
+
+
+def _activities(merged: Dict[str, Any]) -> List[Any]:
+    acts = merged.get("activities")
+    if isinstance(acts, list) and acts:
+        return acts
+    plan = merged.get("plan")
+    if isinstance(plan, dict):
+        if isinstance(plan.get("days"), list):
+            return [a for day in plan["days"] if isinstance(day, dict)
+                    for a in (day.get("items") or day.get("activities") or [])]
+        # docs/prompts/activities.md: {"YYYY-MM-DD": [items]}
+        return [a for items in plan.values() if isinstance(items, list) for a in items]
+    return plan if isinstance(plan, list) else []
+
+
+# ---- Checks ------------------------------------------------------------------------
+
+def check_dates(merged: Dict[str, Any], today: Optional[date] = None) -> List[Finding]:
+    p = trip_params(merged)
+    start, end = _date(p["start_date"]), _date(p["end_date"])
+    today = today or date.today()
+    if start is None:
+        return [_finding("dates", "Trip has no valid start date", "Confirm the travel dates")]
+    out: List[Finding] = []
+    if start < today:
+        out.append(_finding("dates", f"Start date {start} is in the past", "Move the trip to a future date"))
+    if end is not None and end <= start:
+        out.append(_finding("dates", f"End date {end} is not after start date {start}", "Fix the return date"))
+    for o in ((merged.get("flight_options") or {}).get("offers") or [])[:1]:
+        segs = o.get("segments") or []
+        first = _date(segs[0].get("depart_iso")) if segs else None
+        if first is not None and first != start:
+            out.append(_finding("dates", f"Top flight departs {first}, trip starts {start}",
+                                "Align flight and trip dates"))
+        last = _date(segs[-1].get("depart_iso")) if len(segs) > 1 else None
+        if end is not None and last is not None and last > end:
+            out.append(_finding("dates", f"Top flight returns {last}, after trip end {end}",
+                                "Pick a return flight on the end date"))
+    return out
+
+
+def check_budget(merged: Dict[str, Any]) -> List[Finding]:
+    b = merged.get("budget")
+    if not isinstance(b, dict):
+        return [_finding("budget", "Budget was not computed", "Re-run the budget stage")]
+    status, delta = b.get("status"), _price(b.get("delta_usd")) or 0.0
+    if status == "unknown":
+        rates = ", ".join(b.get("missing_fx") or []) or "some prices"
+        return [_finding("budget", f"Budget could not be checked: no exchange rate for {rates}",
+                         "Provide fx_rates for these currencies or search in USD")]
+    if status == "over" or (status == "near" and delta < 0):
+        return [_finding("budget", f"Plan is ${abs(delta):,.2f} over the ${_price(b.get('cap_usd')) or 0:,.2f} cap",
+                         "Choose cheaper lodging or flights, or raise the budget")]
+    return []
+
+
+def check_categories(merged: Dict[str, Any]) -> List[Finding]:
+    p = trip_params(merged)
+    out: List[Finding] = []
+    if not (merged.get("flight_options") or {}).get("offers"):
+        out.append(_finding("categories", "No flight options found", "Try nearby airports or flexible dates"))
+    if not merged.get("lodging_options"):
+        out.append(_finding("categories", "No lodging options found", "Widen the hotel search area or dates"))
+    if p["activities_enabled"] and not _activities(merged):
+        out.append(_finding("categories", "No activities found", "Search activities for nearby dates"))
+    return out
+
+
+def check_refundability(merged: Dict[str, Any], today: Optional[date] = None) -> List[Finding]:
+    hotels = [h for h in merged.get("lodging_options") or [] if isinstance(h, dict)]
+    if not hotels:
+        return []
+    today = today or date.today()
+    priced = [h for h in hotels if _price(h.get("total")) is not None]
+    out: List[Finding] = []
+    if all(h.get("refundable") is False for h in hotels):
+        out.append(_finding("refundability", "None of the lodging options is refundable",
+                            "Search with refundable_only or accept the cancellation risk"))
+    elif priced and min(priced, key=lambda h: _price(h["total"])).get("refundable") is False:
+        out.append(_finding("refundability", "The cheapest lodging option is non-refundable",
+                            "Compare with the cheapest refundable option"))
+    expired = [h for h in hotels if h.get("refundable") and (_date(h.get("cancel_deadline")) or today) < today]
+    if expired:
+        out.append(_finding("refundability", f"{len(expired)} lodging option(s) are past their free-cancellation deadline",
+                            "Treat them as non-refundable"))
+    return out
+
+
+CHECKS: List[Callable[[Dict[str, Any]], List[Finding]]] = [
+    check_dates, check_budget, check_categories, check_refundability,
+]
+
+
+def run_checks(merged: Dict[str, Any]) -> List[Finding]:
+    """All rule-based findings for an assembled plan (empty = nothing for the critic to look at)."""
+    return [f for check in CHECKS for f in check(merged)]
+
+
+# ---- Deterministic critic --------------------------------------------------------------
+
+def critic_from_findings(findings: List[Finding], merged: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Critic agent's output shape (docs/prompts/critics.md) built from rule findings."""
+    if not findings:
+        summary = "Dates consistent, budget within cap, all categories present"
+        if any(isinstance(h, dict) and h.get("refundable") for h in (merged or {}).get("lodging_options") or []):
+            summary += ", refundable lodging available"
+        return {"critic": {
+            "summary": summary + ".",
+            "risks": [],
+            "next_actions": [],
+            "confidence": "high",
+        }}
+    checks = sorted({f["check"] for f in findings})
+    return {"critic": {
+        "summary": f"{len(findings)} issue(s) found by rule checks ({', '.join(checks)}).",
+        "risks": [{"issue": f["issue"], "mitigation": f["mitigation"]} for f in findings],
+        "next_actions": list(dict.fromkeys(f["mitigation"] for f in findings)),
+        "confidence": "medium",
+    }}
+
+
+def rules_critic(merged: Dict[str, Any]) -> Dict[str, Any]:
+    return critic_from_findings(run_checks(merged), merged)
@@ -0,0 +1,352 @@
+from __future__ import annotations
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from backend.llm.orchestrator_input import intake_fields
+from backend.tools.async_tools import search_activities_async, search_flights_async, search_hotels_async
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.orchestrator.direct")
+
+# Result sizes used by the agents' prompts (docs/prompts/*.md)
+MAX_FLIGHT_OFFERS = 6
+MAX_HOTELS = 20
+MAX_ACTIVITIES = 20
+NEAR_BUDGET_PCT = 0.05
+
+_ISO_DURATION = re.compile(r"^P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?")
+
+
+# ---- Inputs --------------------------------------------------------------------
+
+def trip_params(merged: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Search parameters from the planner output, falling back to the intake
+    fields for anything the planner left out.
+    """
+    fields = intake_fields(merged)
+    trip = merged.get("trip") if isinstance(merged.get("trip"), dict) else {}
+
+    def pick(key: str, default: Any = None) -> Any:
+        value = trip.get(key)
+        if value in (None, ""):
+            value = merged.get(key, fields.get(key))
+        return default if value in (None, "") else value
+
+    return {
+        "origin": pick("origin"),
+        "destination": pick("destination"),
+        "start_date": pick("start_date"),
+        "end_date": pick("end_date"),
+        "adults": _count(pick("adults"), 1),
+        "currency": str(pick("currency", "USD")).upper(),
+        "non_stop": pick("non_stop"),
+        "max_results_flights": _count(pick("max_results_flights"), 12),
+        "max_results_hotels": _count(pick("max_results_hotels"), MAX_HOTELS),
+        "refundable_only": pick("refundable_only", False) is True,
+        "activities_enabled": pick("activities_enabled", True) is not False,
+        "budget_usd": pick("budget_usd", 0.0),
+        "fx_rates": pick("fx_rates", {}) or {},
+    }
+
+
+def _minutes(iso_duration: Optional[str]) -> Optional[int]:
+    m = _ISO_DURATION.match(iso_duration or "")
+    if not m or not any(m.groups()):
+        return None
+    days, hours, mins = (int(g) if g else 0 for g in m.groups())
+    return days * 1440 + hours * 60 + mins
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _count(value: Any, default: int) -> int:
+    """A positive count from model or user input ("2", 2.0); the default for anything else."""
+    try:
+        n = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return n if n >= 1 else default
+
+
+def to_usd(amount: Optional[float], currency: Optional[str], fx_rates: Dict[str, Any]) -> Optional[float]:
+    """
+    USD value of an amount; fx_rates maps currency -> USD per unit (e.g. {"EUR": 1.08}).
+    None when the amount is missing or there is no rate for its currency.
+    """
+    if amount is None:
+        return None
+    cur = (currency or "USD").upper()
+    if cur == "USD":
+        return float(amount)
+    rate = _price(fx_rates.get(cur))
+    return float(amount) * rate if rate else None
+
+
+def usd_totals(items: Iterable[Dict[str, Any]], key: str, fx_rates: Dict[str, Any],
+               missing_fx: Set[str]) -> List[float]:
+    """USD values of the priced items; currencies without a rate are added to `missing_fx`."""
+    out: List[float] = []
+    for item in items:
+        amount = _price(item.get(key))
+        if amount is None:
+            continue
+        usd = to_usd(amount, item.get("currency"), fx_rates)
+        if usd is None:
+            missing_fx.add(str(item.get("currency")).upper())
+        else:
+            out.append(usd)
+    return out
+
+
+# ---- Normalization + ranking -----------------------------------------------------
+
+def _segments(raw: Dict[str, Any]) -> List[Dict[str, Any]]:
+    cabins: Dict[str, str] = {}
+    for tp in (raw.get("travelerPricings") or [])[:1]:
+        for fd in tp.get("fareDetailsBySegment") or []:
+            if fd.get("segmentId"):
+                cabins[fd["segmentId"]] = fd.get("cabin")
+    out: List[Dict[str, Any]] = []
+    for it in raw.get("itineraries") or []:
+        for s in it.get("segments") or []:
+            dep, arr = s.get("departure") or {}, s.get("arrival") or {}
+            out.append({
+                "carrier": s.get("carrierCode"),
+                "flight_number": s.get("number"),
+                "origin": dep.get("iataCode"),
+                "destination": arr.get("iataCode"),
+                "depart_iso": (dep.get("at") or "")[:16] or None,
+                "arrive_iso": (arr.get("at") or "")[:16] or None,
+                "duration_minutes": _minutes(s.get("duration")),
+                "stops": s.get("numberOfStops", 0),
+                "cabin": cabins.get(s.get("id")),
+                "baggage_note": None,
+            })
+    return out
+
+
+def rank_flights(offers: List[Dict[str, Any]], currency: str, limit: int = MAX_FLIGHT_OFFERS) -> Dict[str, Any]:
+    """flight_options in the Flights agent's shape; cheapest first, then shortest."""
+    def key(o: Dict[str, Any]):
+        total = _price(o.get("total"))
+        travel = sum(_minutes(d) or 0 for d in (o.get("durations") or []))
+        return (total is None, total or 0.0, travel)
+
+    ranked = sorted(offers, key=key)[:limit]
+    return {
+        "source": "amadeus",
+        "currency": currency,
+        "count": len(offers),
+        "offers": [{
+            "id": o.get("id"),
+            "currency": o.get("currency") or currency,
+            "total": o.get("total"),
+            "carriers": o.get("carriers") or [],
+            "itinerary_count": o.get("itinerary_count"),
+            "durations": o.get("durations") or [],
+            "segments": _segments(o.get("raw") or {}),
+            "raw_offer_id": o.get("id"),
+        } for o in ranked],
+    }
+
+
+def rank_hotels(hotels: List[Dict[str, Any]], city: Optional[str], limit: int = MAX_HOTELS) -> List[Dict[str, Any]]:
+    """lodging_options in the Lodging agent's shape; cheapest total first, rating breaks ties."""
+    def key(h: Dict[str, Any]):
+        total = _price(h.get("total"))
+        return (total is None, total or 0.0, -(_price(h.get("rating")) or 0.0))
+
+    out: List[Dict[str, Any]] = []
+    for h in sorted(hotels, key=key)[:limit]:
+        geo = h.get("geo") or {}
+        lat, lng = geo.get("latitude", geo.get("lat")), geo.get("longitude", geo.get("lng"))
+        out.append({
+            "hotelId": h.get("hotelId"),
+            "amadeus_hotel_id": h.get("hotelId"),
+            "name": h.get("name"),
+            "city": h.get("city") or city,
+            "country": h.get("country"),
+            "rating": h.get("rating"),
+            "room_type": h.get("room_type"),
+            "refundable": h.get("refundable"),
+            "refund_policy": h.get("refund_policy"),
+            "cancel_deadline": (h.get("cancel_deadline") or "")[:10] or None,
+            "board": h.get("board"),
+            "currency": h.get("currency"),
+            "avg_per_night": h.get("avg_per_night"),
+            "total": h.get("total"),
+            "raw_offer_id": h.get("raw_offer_id"),
+            "iataCity": city,
+            "geo": {"lat": lat, "lng": lng} if lat is not None and lng is not None else None,
+        })
+    return out
+
+
+def normalize_activities(acts: List[Dict[str, Any]], limit: int = MAX_ACTIVITIES) -> List[Dict[str, Any]]:
+    """activities in the Activities agent's flat-list shape, de-duplicated by title."""
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    for a in acts:
+        title = (a.get("title") or "").strip()
+        if not title or title.lower() in seen:
+            continue
+        seen.add(title.lower())
+        duration = None
+        try:
+            start = datetime.fromisoformat(a["start_iso"].replace("Z", "+00:00"))
+            end = datetime.fromisoformat(a["end_iso"].replace("Z", "+00:00"))
+            duration = int((end - start).total_seconds() // 60)
+        except (KeyError, AttributeError, ValueError):
+            pass
+        out.append({
+            "title": title,
+            "category": a.get("category"),
+            "start_time": (a.get("start_iso") or "").replace("Z", "")[:19] or None,
+            "duration_minutes": duration,
+            "price": a.get("price_usd"),
+            "currency": "USD" if a.get("price_usd") is not None else None,
+            "location": a.get("city"),
+            "refundable": a.get("refundable"),
+            "raw_offer_id": a.get("provider_ref"),
+        })
+        if len(out) >= limit:
+            break
+    return out
+
+
+def compute_budget(cap_usd: Any, flight_options: Dict[str, Any], lodging_options: List[Dict[str, Any]],
+                   activities: List[Dict[str, Any]], fx_rates: Dict[str, Any],
+                   missing_fx: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Budget agent's output, computed: cheapest flight + cheapest hotel + all activities.
+    A price in a currency without an fx rate cannot be compared with the cap, so the
+    status is then "unknown" (delta 0.0) and the currencies are listed in "missing_fx".
+    """
+    missing = set(missing_fx)
+    flights = usd_totals((flight_options or {}).get("offers") or [], "total", fx_rates, missing)
+    hotels = usd_totals(lodging_options or [], "total", fx_rates, missing)
+    acts = sum(usd_totals(activities or [], "price", fx_rates, missing), 0.0)
+    breakdown = {
+        "flights_usd": round(min(flights), 2) if flights else 0.0,
+        "lodging_usd": round(min(hotels), 2) if hotels else 0.0,
+        "activities_usd": round(acts, 2),
+    }
+    total = round(sum(breakdown.values()), 2)
+    cap = _price(cap_usd) or 0.0
+    delta = round(cap - total, 2) if cap > 0 and not missing else 0.0
+    if missing:
+        status = "unknown"
+    elif cap <= 0 or (delta > 0 and abs(delta) > cap * NEAR_BUDGET_PCT):
+        status = "under"
+    elif abs(delta) <= cap * NEAR_BUDGET_PCT:
+        status = "near"
+    else:
+        status = "over"
+    out = {"cap_usd": cap, "total_usd": total, "status": status, "delta_usd": delta, "breakdown": breakdown}
+    if missing:
+        out["missing_fx"] = sorted(missing)
+    return out
+
+
+def rebudget(budget: Dict[str, Any], cap_usd: Any) -> Dict[str, Any]:
+    """The same plan's budget against another cap (breakdown kept, status/delta recomputed)."""
+    budget = budget or {}
+    bd = budget.get("breakdown") or {}
+    return compute_budget(
+        cap_usd,
+        {"offers": [{"total": bd.get("flights_usd", 0.0), "currency": "USD"}]},
+        [{"total": bd.get("lodging_usd", 0.0), "currency": "USD"}],
+        [{"price": bd.get("activities_usd", 0.0), "currency": "USD"}],
+        {}, budget.get("missing_fx") or (),
+    )
+
+
+# ---- Stages ----------------------------------------------------------------------
+
+async def _safe(name: str, coro) -> List[Dict[str, Any]]:
+    try:
+        return await coro
+    except Exception as e:
+        # a failed search degrades to an empty category instead of failing the run
+        logger.warning("direct %s search failed: %s", name, e)
+        return []
+
+
+async def flights_stage(merged: Dict[str, Any]) -> Dict[str, Any]:
+    p = trip_params(merged)
+    if not (p["origin"] and p["destination"] and p["start_date"]):
+        return {"flight_options": rank_flights([], p["currency"])}
+    offers = await _safe("flights", search_flights_async(
+        origin=p["origin"], destination=p["destination"], depart_date=p["start_date"],
+        return_date=p["end_date"], adults=p["adults"], currency=p["currency"],
+        non_stop=p["non_stop"], max_results=p["max_results_flights"],
+    ))
+    return {"flight_options": rank_flights(offers, p["currency"])}
+
+
+async def lodging_stage(merged: Dict[str, Any]) -> Dict[str, Any]:
+    p = trip_params(merged)
+    if not (p["destination"] and p["start_date"] and p["end_date"]):
+        return {"lodging_options": []}
+    hotels = await _safe("hotels", search_hotels_async(
+        city=p["destination"], check_in=p["start_date"], check_out=p["end_date"],
+        guests=p["adults"], currency=p["currency"], refundable_only=p["refundable_only"],
+        max_results=p["max_results_hotels"],
+    ))
+    return {"lodging_options": rank_hotels(hotels, p["destination"], p["max_results_hotels"])}
+
+
+async def activities_stage(merged: Dict[str, Any]) -> Dict[str, Any]:
+    p = trip_params(merged)
+    if not (p["activities_enabled"] and p["destination"] and p["start_date"]):
+        return {"activities": []}
+    acts = await _safe("activities", search_activities_async(
+        city_code=p["destination"], for_date=p["start_date"], max_results=MAX_ACTIVITIES,
+    ))
+    return {"activities": normalize_activities(acts)}
+
+
+def planner_fallback(merged: Dict[str, Any]) -> Dict[str, Any]:
+    """Planner output built from the intake fields (planner defaults for the knobs)."""
+    p = trip_params(merged)
+    fields = intake_fields(merged)
+    return {
+        "trip": {
+            "id": f"trip_{uuid.uuid4().hex[:8]}",
+            "origin": p["origin"],
+            "destination": p["destination"],
+            "start_date": p["start_date"],
+            "end_date": p["end_date"],
+        },
+        "primary_city": p["destination"],
+        "adults": p["adults"],
+        "currency": p["currency"],
+        "non_stop": p["non_stop"],
+        "max_results_flights": p["max_results_flights"],
+        "max_results_hotels": p["max_results_hotels"],
+        "preview_hotels": int(fields.get("preview_hotels") or 3),
+        "activities_enabled": p["activities_enabled"],
+        "critic_enabled": fields.get("critic_enabled", True) is not False,
+    }
+
+
+def budget_stage(merged: Dict[str, Any]) -> Dict[str, Any]:
+    p = trip_params(merged)
+    return {"budget": compute_budget(p["budget_usd"], merged.get("flight_options") or {},
+                                     merged.get("lodging_options") or [], merged.get("activities") or [],
+                                     p["fx_rates"])}
+
+
+DIRECT_STAGES = [
+    ("flights", flights_stage),
+    ("lodging", lodging_stage),
+    ("activities", activities_stage),
+]
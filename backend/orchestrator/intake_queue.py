@@ -0,0 +1,107 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config.settings import INTAKE_COALESCE_MS
+from backend.llm.orchestrator_input import OrchestratorInputs
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.orchestrator.intake_queue")
+
+Loader = Callable[[], Optional[OrchestratorInputs]]
+Saver = Callable[[OrchestratorInputs], None]
+
+
+class SessionNotFound(KeyError):
+    """The session disappeared (deleted/evicted) before its batch ran."""
+
+
+class IntakeBatcher:
+    """
+    Per-session intake queue. A single drain task per session applies batches
+    back to back, so updates to a session never interleave. A request on an
+    idle session is applied at once; requests that arrive while a batch is in
+    flight are collected (for up to `window_s` more once it ends) and applied
+    as one `apply_lines` batch (one orchestrator call). If a merged batch
+    fails, its requests are re-applied one by one so only the request that
+    raised gets the error.
+    """
+
+    def __init__(self, window_s: float = INTAKE_COALESCE_MS / 1000.0):
+        self.window_s = max(0.0, window_s)
+        self._pending: Dict[str, List[Tuple[List[str], asyncio.Future]]] = {}
+        self._drains: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, session_id: str, lines: List[str], load: Loader, save: Saver) -> Dict[str, Any]:
+        """
+        Queue `lines` for the session and wait for the batch that contains them.
+        Returns {"state", "version", "batched"}; raises SessionNotFound or
+        whatever apply_lines raised for these lines (e.g. VersionConflict).
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(session_id, []).append((list(lines), fut))
+        if session_id not in self._drains:
+            self._drains[session_id] = asyncio.create_task(self._drain(session_id, load, save))
+        return await fut
+
+    async def _drain(self, session_id: str, load: Loader, save: Saver) -> None:
+        try:
+            busy = False
+            while True:
+                if busy and self.window_s:
+                    # requests queued up behind the last batch: let the rest of the burst join them
+                    await asyncio.sleep(self.window_s)
+                batch = self._pending.pop(session_id, None)
+                if not batch:
+                    return
+                await self._apply(session_id, batch, load, save)
+                busy = session_id in self._pending
+        finally:
+            self._drains.pop(session_id, None)
+
+    @staticmethod
+    async def _apply_lines(session_id: str, lines: List[str], load: Loader, save: Saver) -> Dict[str, Any]:
+        orch = load()
+        if orch is None:
+            raise SessionNotFound(session_id)
+        state = await orch.apply_lines(lines)
+        save(orch)
+        return {"state": state, "version": orch.version, "batched": len(lines)}
+
+    async def _apply(self, session_id: str, batch: List[Tuple[List[str], asyncio.Future]],
+                     load: Loader, save: Saver) -> None:
+        try:
+            if len(batch) > 1:
+                lines = [line for chunk, _ in batch for line in chunk]
+                try:
+                    result = await self._apply_lines(session_id, lines, load, save)
+                except SessionNotFound:
+                    raise
+                except Exception as e:
+                    logger.warning("session %s: coalesced batch of %d requests failed (%s); applying them one by one",
+                                   session_id, len(batch), e)
+                else:
+                    logger.info("session %s: coalesced %d requests (%d lines)", session_id, len(batch), len(lines))
+                    for _, fut in batch:
+                        if not fut.done():
+                            fut.set_result(result)
+                    return
+            for chunk, fut in batch:
+                try:
+                    result = await self._apply_lines(session_id, chunk, load, save)
+                except SessionNotFound:
+                    raise
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(result)
+        except asyncio.CancelledError:
+            for _, fut in batch:
+                fut.cancel()
+            raise
+        except SessionNotFound as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
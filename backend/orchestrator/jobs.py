@@ -0,0 +1,337 @@
+from __future__ import annotations
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from backend.config.settings import JOBS_DB_PATH, JOB_LEASE_S, JOB_MAX_ATTEMPTS, JOB_WORKERS
+from backend.utils.logger import get_logger
+from backend.utils.tracing import span
+
+logger = get_logger("backend.orchestrator.jobs")
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+TERMINAL = {JobStatus.SUCCEEDED.value, JobStatus.FAILED.value}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    session_id  TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    input       TEXT NOT NULL,
+    options     TEXT NOT NULL DEFAULT '{}',
+    partial     TEXT NOT NULL DEFAULT '{}',
+    result      TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job queue. Jobs carry a snapshot of the session state so a
+    worker can run them without the originating session. A RUNNING job holds a
+    lease; if its worker dies the lease expires and the job is claimed again.
+    Each claim gets its own lease owner token; stage records, renewals and
+    the final result are only written while that token still holds the lease.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, *, lease_s: float = JOB_LEASE_S,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "options" not in columns:  # databases created before run options existed
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT NOT NULL DEFAULT '{}'")
+        if "lease_owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "session_id": row["session_id"],
+            "status": row["status"],
+            "input": json.loads(row["input"]),
+            "options": json.loads(row["options"] or "{}"),
+            "partial": json.loads(row["partial"] or "{}"),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "lease_owner": row["lease_owner"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def enqueue(self, session_id: str, state: dict, options: Optional[Dict[str, Any]] = None) -> str:
+        """`options` are passed to the runner as keyword arguments (e.g. mode, critic)."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, session_id, status, input, options, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, session_id, JobStatus.QUEUED.value,
+                 json.dumps(state, ensure_ascii=False, default=str),
+                 json.dumps(options or {}), now, now),
+            )
+        return job_id
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the oldest queued (or lease-expired) job to RUNNING.
+        Jobs out of attempts on the way are marked FAILED and skipped.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = cur.execute(
+                        "SELECT * FROM jobs WHERE status = ? "
+                        "OR (status = ? AND lease_until < ?) "
+                        "ORDER BY created_at LIMIT 1",
+                        (JobStatus.QUEUED.value, JobStatus.RUNNING.value, now),
+                    ).fetchone()
+                    if row is None:
+                        cur.execute("COMMIT")
+                        return None
+                    if row["attempts"] < self.max_attempts:
+                        break
+                    cur.execute(
+                        "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                        (JobStatus.FAILED.value, "max attempts exceeded", now, row["id"]),
+                    )
+                cur.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, "
+                    "lease_owner = ?, updated_at = ? WHERE id = ?",
+                    (JobStatus.RUNNING.value, now + self.lease_s, uuid.uuid4().hex, now, row["id"]),
+                )
+                row = cur.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return self._row_to_job(row)
+
+    _HELD = " WHERE id = ? AND status = 'running' AND lease_owner = ?"
+
+    def record_stage(self, job_id: str, owner: str, stage: str, output: Dict[str, Any]) -> bool:
+        """Store one stage output as a partial result and renew the lease (False if the lease was lost)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT partial FROM jobs" + self._HELD, (job_id, owner)).fetchone()
+            if row is None:
+                return False
+            partial = json.loads(row["partial"] or "{}")
+            partial[stage] = output
+            self._conn.execute(
+                "UPDATE jobs SET partial = ?, lease_until = ?, updated_at = ?" + self._HELD,
+                (json.dumps(partial, ensure_ascii=False, default=str),
+                 now + self.lease_s, now, job_id, owner),
+            )
+        return True
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False once the job finished or another worker took it over."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?" + self._HELD, (time.time() + self.lease_s, job_id, owner),
+            )
+        return cur.rowcount > 0
+
+    def finish(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        """Store the result; False (nothing written) if `owner` no longer holds the lease."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ?" + self._HELD,
+                (JobStatus.SUCCEEDED.value,
+                 json.dumps(result, ensure_ascii=False, default=str), time.time(), job_id, owner),
+            )
+        return cur.rowcount > 0
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        """Mark the job failed; False (nothing written) if `owner` no longer holds the lease."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?" + self._HELD,
+                (JobStatus.FAILED.value, error, time.time(), job_id, owner),
+            )
+        return cur.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+PipelineRunner = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """
+    Bounded asyncio worker pool over a JobStore. HTTP handlers only enqueue;
+    at most `workers` pipelines run concurrently per process. Store calls
+    (blocking SQLite, up to busy_timeout) run in threads, off the event loop,
+    and a running job's lease is renewed every third of JOB_LEASE_S.
+    """
+
+    def __init__(self, store: JobStore, runner: PipelineRunner, *, workers: int = JOB_WORKERS,
+                 poll_interval_s: float = 1.0):
+        self.store = store
+        self.runner = runner
+        self.workers = max(1, int(workers))
+        self.poll_interval_s = poll_interval_s
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # job id -> events of the long-polls waiting on it in this process
+        self._updates: Dict[str, Set[asyncio.Event]] = {}
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, session_id: str, state: dict, options: Optional[Dict[str, Any]] = None) -> str:
+        job_id = await asyncio.to_thread(self.store.enqueue, session_id, state, options)
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def _notify(self, job_id: str) -> None:
+        for ev in self._updates.get(job_id, ()):
+            ev.set()
+
+    async def wait(self, job_id: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: return as soon as the job changes (new stage, finished, failed)
+        or when `timeout_s` elapses. Falls back to polling the store so updates
+        made by workers in other processes are seen too.
+        """
+        job = await self.get(job_id)
+        if job is None or job["status"] in TERMINAL or timeout_s <= 0:
+            return job
+        seen = job["updated_at"]
+        deadline = time.monotonic() + timeout_s
+        ev = asyncio.Event()
+        waiters = self._updates.setdefault(job_id, set())
+        waiters.add(ev)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(ev.wait(), timeout=min(remaining, self.poll_interval_s))
+                except asyncio.TimeoutError:
+                    pass
+                ev.clear()
+                job = await self.get(job_id)
+                if job is None or job["status"] in TERMINAL or job["updated_at"] != seen:
+                    return job
+        finally:
+            waiters.discard(ev)
+            if not waiters and self._updates.get(job_id) is waiters:
+                del self._updates[job_id]
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim_next)
+                if job is not None:
+                    await self._run(job)
+                    continue
+            except Exception as e:
+                # e.g. the jobs database is locked or unavailable: keep the worker alive
+                logger.error("job worker %d: %s", idx, e, exc_info=True)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id, owner = job["job_id"], job["lease_owner"]
+
+        async def _on_stage(stage: str, output: Dict[str, Any]) -> None:
+            await asyncio.to_thread(self.store.record_stage, job_id, owner, stage, output)
+            self._notify(job_id)
+
+        lease = asyncio.create_task(self._keep_lease(job_id, owner))
+        try:
+            with span("job.run", job_id=job_id, session_id=job["session_id"],
+                      attempt=job["attempts"]) as sp:
+                logger.info("job %s started (trace %s)", job_id, sp.trace_id)
+                result = await self.runner(job["input"], on_stage=_on_stage, **job["options"])
+        except asyncio.CancelledError:
+            # Shutdown: leave the job RUNNING; its lease expires and it is re-claimed.
+            raise
+        except Exception as e:
+            logger.error("job %s failed: %s", job_id, e, exc_info=True)
+            written = await asyncio.to_thread(self.store.fail, job_id, owner, str(e) or e.__class__.__name__)
+        else:
+            written = await asyncio.to_thread(self.store.finish, job_id, owner, result)
+        finally:
+            lease.cancel()
+        if not written:
+            logger.warning("job %s: lease lost to another worker; result discarded", job_id)
+        self._notify(job_id)
+
+    async def _keep_lease(self, job_id: str, owner: str) -> None:
+        """Renew the lease while the job runs, so long stages are not re-claimed elsewhere."""
+        interval = max(0.1, self.store.lease_s / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self.store.renew, job_id, owner):
+                    return
+            except sqlite3.Error as e:
+                logger.warning("job %s lease renewal failed: %s", job_id, e)
+
+
+_QUEUE: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue backed by JOBS_DB_PATH."""
+    global _QUEUE
+    if _QUEUE is None:
+        from backend.orchestrator.pipeline import run_pipeline
+        _QUEUE = JobQueue(JobStore(JOBS_DB_PATH), run_pipeline, workers=JOB_WORKERS)
+    return _QUEUE
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set
+
+from backend.llm.orchestrator_input import intake_fields
+from backend.orchestrator.direct import (
+    MAX_ACTIVITIES, compute_budget, normalize_activities, rank_flights, rank_hotels, trip_params, usd_totals,
+)
+from backend.schemas.trip_schema import Trip
+from backend.tools.async_tools import search_activities_async, search_flights_async, search_hotels_async
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.orchestrator.multicity")
+
+
+def _date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def trip_legs(merged: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Legs of a multi-city trip as [{"city", "start_date", "end_date"}], taken
+    from the planner's "legs" (top level or under "trip") or the intake state.
+    Legs that all carry a start date are put in date order. A leg without an
+    end date ends where the next one starts; the last one ends with the trip.
+    Returns [] for single-city trips, and (logged) when the leg dates are
+    missing, reversed or out of order, so the run takes the single-city path.
+    """
+    trip = merged.get("trip") if isinstance(merged.get("trip"), dict) else {}
+    raw = merged.get("legs") or trip.get("legs") or intake_fields(merged).get("legs") or []
+    raw = [leg for leg in raw if isinstance(leg, dict) and (leg.get("city") or leg.get("destination"))]
+    if len(raw) < 2:
+        return []
+    starts = [_date(leg.get("start_date")) for leg in raw]
+    if all(starts):
+        raw = [leg for _, leg in sorted(zip(starts, raw), key=lambda pair: pair[0])]
+    p = trip_params(merged)
+    legs: List[Dict[str, Any]] = []
+    for i, leg in enumerate(raw):
+        nxt = raw[i + 1] if i + 1 < len(raw) else {}
+        start = leg.get("start_date") or (legs[-1]["end_date"] if legs else p["start_date"])
+        end = leg.get("end_date") or nxt.get("start_date") or (p["end_date"] if not nxt else None)
+        legs.append({
+            "city": str(leg.get("city") or leg.get("destination")).upper(),
+            "start_date": start,
+            "end_date": end,
+        })
+    previous: Optional[date] = None
+    for leg in legs:
+        s, e = _date(leg["start_date"]), _date(leg["end_date"])
+        if s is None or e is None or e < s or (previous is not None and s < previous):
+            logger.warning("ignoring multi-city legs, invalid dates for %s: %s .. %s",
+                           leg["city"], leg["start_date"], leg["end_date"])
+            return []
+        previous = s
+    return legs
+
+
+async def _search_leg(leg: Dict[str, Any], p: Dict[str, Any]) -> Dict[str, Any]:
+    """Lodging + activities for one leg, side by side."""
+    hotels, acts = await asyncio.gather(
+        search_hotels_async(city=leg["city"], check_in=leg["start_date"], check_out=leg["end_date"],
+                            guests=p["adults"], currency=p["currency"], refundable_only=p["refundable_only"],
+                            max_results=p["max_results_hotels"]),
+        search_activities_async(city_code=leg["city"], for_date=leg["start_date"], max_results=MAX_ACTIVITIES)
+        if p["activities_enabled"] else asyncio.sleep(0, []),
+        return_exceptions=True,
+    )
+    for what, res in (("hotels", hotels), ("activities", acts)):
+        if isinstance(res, Exception):
+            # a failed search degrades to an empty category instead of failing the run
+            logger.warning("multi-city %s search for %s failed: %s", what, leg["city"], res)
+    return {
+        **leg,
+        "lodging_options": rank_hotels([] if isinstance(hotels, Exception) else hotels,
+                                       leg["city"], p["max_results_hotels"]),
+        "activities": normalize_activities([] if isinstance(acts, Exception) else acts),
+    }
+
+
+async def _one_way(origin: Optional[str], destination: str, day: Optional[str],
+                   p: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not (origin and day):
+        return []
+    try:
+        return await search_flights_async(origin=origin, destination=destination, depart_date=day,
+                                          adults=p["adults"], currency=p["currency"], non_stop=p["non_stop"],
+                                          max_results=p["max_results_flights"])
+    except Exception as e:
+        logger.warning("multi-city flight search %s-%s failed: %s", origin, destination, e)
+        return []
+
+
+def _days(trip: Trip, legs: List[Dict[str, Any]]) -> None:
+    """One ItineraryDay per date, in the city of the leg covering it (transfer days go to the next city)."""
+    for i, leg in enumerate(legs):
+        start, end = _date(leg["start_date"]), _date(leg["end_date"])
+        last = end if i == len(legs) - 1 else end - timedelta(days=1)
+        by_day: Dict[str, List[str]] = {}
+        for a in leg["activities"]:
+            by_day.setdefault((a.get("start_time") or "")[:10], []).append(a["title"])
+        day = start
+        while day <= last:
+            titles = by_day.get(day.isoformat())
+            trip.add_day(city=leg["city"], notes="; ".join(titles) if titles else None)
+            day += timedelta(days=1)
+
+
+async def multicity_stage(merged: Dict[str, Any], legs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fan out every search of a multi-city trip at once: open-jaw flights
+    (origin -> first city, last city -> origin) and lodging + activities per
+    leg. All calls go through the shared search cache and per-tool limits,
+    so N cities take about as long as the slowest single search.
+    """
+    p = trip_params(merged)
+    outbound, inbound, *per_leg = await asyncio.gather(
+        _one_way(p["origin"], legs[0]["city"], legs[0]["start_date"], p),
+        _one_way(legs[-1]["city"], p["origin"], legs[-1]["end_date"], p),
+        *(_search_leg(leg, p) for leg in legs),
+    )
+    flight_options = rank_flights(outbound, p["currency"])
+    flight_options["return_offers"] = rank_flights(inbound, p["currency"])["offers"]
+    lodging = [h for leg in per_leg for h in leg["lodging_options"]]
+    activities = [a for leg in per_leg for a in leg["activities"]]
+
+    # Cheapest outbound + return + cheapest hotel per leg + all activities
+    fx = p["fx_rates"]
+    missing_fx: Set[str] = set()
+
+    def cheapest(options: List[Dict[str, Any]]) -> float:
+        usd = usd_totals(options, "total", fx, missing_fx)
+        return min(usd) if usd else 0.0
+
+    budget = compute_budget(
+        p["budget_usd"],
+        {"offers": [{"total": cheapest(flight_options["offers"]) + cheapest(flight_options["return_offers"]),
+                     "currency": "USD"}]},
+        [{"total": sum(cheapest(leg["lodging_options"]) for leg in per_leg), "currency": "USD"}],
+        activities, fx, missing_fx,
+    )
+
+    planned = merged.get("trip") if isinstance(merged.get("trip"), dict) else {}
+    trip = Trip(
+        id=planned.get("id") or "",
+        user_id=str(merged.get("user_id") or intake_fields(merged).get("user_id") or "anonymous"),
+        title=" → ".join(leg["city"] for leg in legs),
+        origin=p["origin"] or "",
+        destination=legs[0]["city"],
+        start_date=_date(legs[0]["start_date"]),
+        end_date=_date(legs[-1]["end_date"]),
+        budget_usd=Decimal(str(budget["cap_usd"])),
+    )
+    _days(trip, per_leg)
+    trip_out = trip.to_dict()
+    trip_out["legs"] = legs
+
+    return {
+        "trip": trip_out,
+        "legs": per_leg,
+        "flight_options": flight_options,
+        "lodging_options": lodging,
+        "activities": activities,
+        "budget": budget,
+    }
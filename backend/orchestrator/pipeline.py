@@ -0,0 +1,256 @@
+from __future__ import annotations
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.config.settings import PIPELINE_MODE, STAGE_REASK_MAX
+from backend.llm.agents_graph import get_agent
+from backend.llm.memory import HistoryPolicy, ephemeral_session
+from backend.llm.model_routing import run_routed
+from backend.llm.orchestrator_input import intake_fields
+from backend.orchestrator.critic_checks import critic_from_findings, rules_critic, run_checks
+from backend.orchestrator.direct import (
+    DIRECT_STAGES, activities_stage, budget_stage, flights_stage, lodging_stage, planner_fallback,
+)
+from backend.orchestrator.multicity import multicity_stage, trip_legs
+from backend.orchestrator.replan import Memo, StagePlan
+from backend.schemas.agent_schema import StageOutputError, validate_output
+from backend.utils.deadline import DeadlineExceeded, stage_share, within
+from backend.utils.logger import get_logger, log_payload
+from backend.utils.metrics import CRITIC_PATHS, OUTPUT_REPAIRS, record_usage, track_stage
+from backend.utils.tracing import span
+from backend.utils.utils import as_prompt, as_reask_prompt
+
+logger = get_logger("backend.orchestrator.pipeline")
+
+# Keys returned to clients from the merged pipeline state
+RESULT_KEYS = ["trip", "legs", "flight_options", "lodging_options", "activities", "plan", "budget", "critic"]
+
+# (stage name, label used in logs); agents come from get_agent(stage name) and their
+# replies are checked against backend.schemas.agent_schema.STAGE_OUTPUTS
+STAGES = [
+    ("planner", "PLANNER"),
+    ("flights", "FLIGHT"),
+    ("lodging", "HOTELS"),
+    ("activities", "ACTIVITIES"),
+    ("budget", "Budget"),
+    ("critic", "Critics"),
+]
+
+StageCallback = Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]]
+
+# "agents": every stage is an LLM agent (tool-using for flights/lodging/activities).
+# "direct": planner (+ optional critic) are agents; searches run as concurrent
+#           tool calls with deterministic ranking, and the budget is computed.
+PIPELINE_MODES = ("agents", "direct")
+_STAGE_BY_NAME = {stage[0]: stage for stage in STAGES}
+
+# What an agent stage degrades to when it runs out of time
+FALLBACKS: Dict[str, Optional[Callable[[Dict[str, Any]], Any]]] = {
+    "planner": planner_fallback,
+    "flights": flights_stage,
+    "lodging": lodging_stage,
+    "activities": activities_stage,
+    "budget": budget_stage,
+    "critic": rules_critic,
+}
+
+
+async def _emit(on_stage: Optional[StageCallback], name: str, out: Dict[str, Any]) -> None:
+    if on_stage is not None:
+        maybe = on_stage(name, out)
+        if inspect.isawaitable(maybe):
+            await maybe
+
+
+async def _reask(name: str, agent: Any, merged: Dict[str, Any], error: StageOutputError) -> Dict[str, Any]:
+    """Ask the stage again, showing the model its invalid reply and what was wrong with it."""
+    for _ in range(max(0, STAGE_REASK_MAX)):
+        OUTPUT_REPAIRS.inc(stage=name, result="reasked")
+        logger.warning("stage %s output invalid (%s); re-asking", name, error.errors)
+        # no session: the prompt carries everything, and the bad reply stays out of the history
+        res = await run_routed(agent, name, input=as_reask_prompt(merged, error.raw, error.errors))
+        record_usage(name, res)
+        try:
+            return validate_output(name, getattr(res, "final_output", res))
+        except StageOutputError as e:
+            error = e
+    OUTPUT_REPAIRS.inc(stage=name, result="failed")
+    raise error
+
+
+async def _agent_stage(name: str, merged: Dict[str, Any], session: Any,
+                       pending: List[str], degraded: List[str]) -> Dict[str, Any]:
+    """
+    Run one agent stage within its share of the remaining deadline. A reply
+    that does not match the stage's output model (after JSON repair) is
+    re-asked once. Out of time or still invalid, the stage degrades to its
+    deterministic fallback (direct search, which serves cached results
+    first, or a computed output) or is skipped.
+    """
+    label = _STAGE_BY_NAME[name][1]
+    agent = get_agent(name)
+    try:
+        with within(stage_share(name, pending)):
+            with span(f"agent.{name}", stage=name), track_stage(name):
+                res = await run_routed(agent, name, input=as_prompt(merged), session=session)
+                record_usage(name, res)
+                try:
+                    out = validate_output(name, getattr(res, "final_output", res))
+                except StageOutputError as e:
+                    out = await _reask(name, agent, merged, e)
+    except (DeadlineExceeded, StageOutputError) as e:
+        degraded.append(name)
+        fallback = FALLBACKS.get(name)
+        logger.warning("stage %s degraded (%s); %s", name, e, "fallback" if fallback else "skipped")
+        if fallback is None:
+            return {}
+        out = fallback(merged)
+        return await out if inspect.isawaitable(out) else out
+    log_payload(logger, "stage_output", f"{label} output", out, stage=name)
+    return out
+
+
+async def _direct_stage(name: str, fn: Callable[[Dict[str, Any]], Any], merged: Dict[str, Any],
+                        on_stage: Optional[StageCallback]) -> Dict[str, Any]:
+    with span(f"direct.{name}", stage=name), track_stage(name):
+        out = fn(merged)
+        if inspect.isawaitable(out):
+            out = await out
+    label = _STAGE_BY_NAME[name][1] if name in _STAGE_BY_NAME else name.upper()
+    log_payload(logger, "stage_output", f"{label} output", out, stage=name)
+    await _emit(on_stage, name, out)
+    return out
+
+
+async def _critic_stage(merged: Dict[str, Any], session: Any, critic: Optional[bool],
+                        pending: List[str], degraded: List[str]) -> Dict[str, Any]:
+    """
+    Rule checks first (backend.orchestrator.critic_checks). The critic agent
+    only runs when a check flags something or the client forced it
+    (critic=True); it sees the findings as `critic_checks`. A clean plan gets
+    the deterministic critic output instead of an LLM turn.
+    """
+    findings = run_checks(merged)
+    if findings or critic is True:
+        CRITIC_PATHS.inc(path="llm")
+        return await _agent_stage("critic", {**merged, "critic_checks": findings}, session, pending, degraded)
+    CRITIC_PATHS.inc(path="rules")
+    with span("rules.critic", stage="critic"), track_stage("critic"):
+        out = critic_from_findings(findings, merged)
+    log_payload(logger, "stage_output", "Critics output", out, stage="critic")
+    return out
+
+
+async def _memoized(plan: StagePlan, name: str, merged: Dict[str, Any], run: Callable[[], Awaitable[Dict[str, Any]]],
+                    degraded: List[str], on_stage: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """Memoized output when the stage's inputs are unchanged, else run it (degraded outputs are not kept)."""
+    out = plan.cached(name, merged)
+    if out is not None:
+        await _emit(on_stage, name, out)
+        return out
+    out = await run()
+    if name not in degraded:
+        plan.store(name, out)
+    return out
+
+
+def _critic_wanted(merged: Dict[str, Any], critic: Optional[bool]) -> bool:
+    if critic is not None:
+        return critic
+    return merged.get("critic_enabled", intake_fields(merged).get("critic_enabled", True)) is not False
+
+
+async def run_pipeline(
+    state: dict,
+    *,
+    on_stage: Optional[StageCallback] = None,
+    history: Optional[HistoryPolicy] = None,
+    mode: str = PIPELINE_MODE,
+    critic: Optional[bool] = None,
+    memo: Optional[Memo] = None,
+    only: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Execute full pipeline:
+      planner -> flights -> lodging -> activities -> budget -> critic
+    In "direct" mode flights/lodging/activities run concurrently as plain tool
+    calls and the budget is computed, so only the planner (and the critic, when
+    enabled) call the LLM. `critic` forces the critic on/off; None follows the
+    state's critic_enabled (agents mode always runs it unless False). Unless
+    forced on, the critic agent is only called when the rule checks flag
+    something; otherwise their deterministic review is returned.
+    When the planner emits two or more "legs" (multi-city), the searches for
+    all legs run concurrently as tool calls in either mode and are merged into
+    one Trip with per-city itinerary days (backend.orchestrator.multicity).
+    Under a request deadline (backend.utils.deadline) each stage gets a weighted
+    share of the remaining time; stages that run out degrade (see FALLBACKS) and
+    are listed under "degraded" in the result.
+    With a per-session `memo` (backend.orchestrator.replan), stages whose
+    inputs did not change since the last run reuse their output (listed
+    under "reused"); a budget-only change just re-caps the old breakdown.
+    `only` runs a single stage plus whatever it depends on.
+    `on_stage(name, output)` is called after each stage so callers (e.g. the job
+    worker) can surface partial results. Each run gets its own ephemeral,
+    windowed session so concurrent runs never share history.
+    Returns the merged result payload.
+    """
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"unknown pipeline mode {mode!r} (expected one of {', '.join(PIPELINE_MODES)})")
+    session = ephemeral_session("run", history)
+    merged = dict(state)
+
+    degraded: List[str] = []
+    plan = StagePlan(state, memo, only, mode=mode, critic=critic)
+    with_critic = ["critic"] if critic is not False and plan.wanted("critic") else []
+    searches = [name for name, *_ in STAGES[1:-1] if plan.wanted(name)] if mode == "agents" else ["flights"]
+
+    out = await _memoized(plan, "planner", merged, lambda: _agent_stage(
+        "planner", merged, session, ["planner", *searches, *with_critic], degraded), degraded)
+    merged = {**merged, **out}
+    await _emit(on_stage, "planner", out)
+
+    legs = trip_legs(merged)
+    if legs:
+        # multi-city (either mode): every leg's searches fan out at once as tool calls
+        if plan.wanted("flights", "lodging", "activities", "budget", "critic"):
+            with within(stage_share("flights", ["flights", *with_critic])):
+                out = await _memoized(plan, "multicity", merged, lambda: _direct_stage(
+                    "multicity", lambda m: multicity_stage(m, legs), merged, on_stage), degraded, on_stage)
+            merged = {**merged, **out}
+    elif mode == "agents":
+        for i, name in enumerate(searches):
+            out = await _memoized(plan, name, merged, lambda n=name, rest=searches[i:]: _agent_stage(
+                n, merged, session, [*rest, *with_critic], degraded), degraded)
+            merged = {**merged, **out}
+            await _emit(on_stage, name, out)
+    else:
+        # the three searches share one slice (they run side by side); failures degrade to empty
+        snapshot = dict(merged)
+        with within(stage_share("flights", ["flights", *with_critic])):
+            outs = await asyncio.gather(*(
+                _memoized(plan, name, snapshot, lambda n=name, f=fn: _direct_stage(n, f, snapshot, on_stage),
+                          degraded, on_stage)
+                for name, fn in DIRECT_STAGES if plan.wanted(name)
+            ))
+        for out in outs:
+            merged = {**merged, **out}
+        if plan.wanted("budget"):
+            out = await _memoized(plan, "budget", merged, lambda: _direct_stage(
+                "budget", budget_stage, merged, on_stage), degraded, on_stage)
+            merged = {**merged, **out}
+
+    run_critic = (critic is not False) if mode == "agents" else _critic_wanted(merged, critic)
+    if run_critic and plan.wanted("critic"):
+        out = await _memoized(plan, "critic", merged, lambda: _critic_stage(
+            merged, session, critic, ["critic"], degraded), degraded)
+        merged = {**merged, **out}
+        await _emit(on_stage, "critic", out)
+
+    result = {k: merged[k] for k in RESULT_KEYS if k in merged}
+    if degraded:
+        result["degraded"] = degraded
+    if plan.reused:
+        result["reused"] = plan.reused
+    log_payload(logger, "pipeline_result", "pipeline finished", result, mode=mode)
+    return result
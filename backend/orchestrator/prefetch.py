@@ -0,0 +1,127 @@
+from __future__ import annotations
+import asyncio
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config.settings import PREFETCH_CONCURRENCY, PREFETCH_ENABLED
+from backend.orchestrator.direct import MAX_ACTIVITIES, trip_params
+from backend.tools.async_tools import run_blocking, search_activities, search_flights, search_hotels
+from backend.tools.search_cache import (
+    SEARCH_CACHE, SearchCache, activity_params, flight_params, hotel_params,
+)
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.orchestrator.prefetch")
+
+# (tool, params, limit, compute)
+Warmup = Tuple[str, Dict[str, Any], int, Callable[[int], List[Dict[str, Any]]]]
+
+
+def _iso(value: Any) -> Optional[str]:
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def plan_warmups(state: Dict[str, Any]) -> List[Warmup]:
+    """
+    Searches that can already run for an intake state. Needs destination and
+    start date; flights also need an origin and hotels an end date.
+    Params and limits come from trip_params / the direct stages, so a warmed
+    entry is the one those stages (and the smaller agent tool calls) look up.
+    """
+    try:
+        p = trip_params(state)
+    except (TypeError, ValueError):
+        return []
+    dest = p["destination"]
+    start, end = _iso(p["start_date"]), _iso(p["end_date"])
+    if not isinstance(dest, str) or not dest.strip() or not start:
+        return []
+    out: List[Warmup] = []
+
+    origin = p["origin"]
+    if isinstance(origin, str) and origin.strip():
+        p_f = flight_params(origin, dest, start, end, p["adults"], p["currency"], p["non_stop"])
+        out.append(("search_flights", p_f, p["max_results_flights"],
+                    lambda n: search_flights(
+                        origin_code=p_f["origin"], dest_code=p_f["destination"],
+                        depart=date.fromisoformat(start), ret=date.fromisoformat(end) if end else None,
+                        adults=p_f["adults"], currency=p_f["currency"], non_stop=p_f["non_stop"],
+                        max_results=n)))
+    if end:
+        p_h = hotel_params(dest, start, end, p["adults"], p["currency"], p["refundable_only"])
+        out.append(("search_hotels", p_h, p["max_results_hotels"],
+                    lambda n: search_hotels(
+                        city=p_h["city"], check_in=date.fromisoformat(start), check_out=date.fromisoformat(end),
+                        guests=p_h["guests"], currency=p_h["currency"],
+                        refundable_only=p_h["refundable_only"], max_results=n)))
+    if p["activities_enabled"]:
+        p_a = activity_params(dest, start)
+        out.append(("search_activities", p_a, MAX_ACTIVITIES,
+                    lambda n: search_activities(
+                        city_code=p_a["city_code"], for_date=date.fromisoformat(start), max_results=n)))
+    return out
+
+
+class Prefetcher:
+    """
+    Warms the search cache while the user is still chatting. Each intake update
+    re-plans the searches for that session; if they differ from the last plan,
+    queued warmups are cancelled and the new ones start. A search already running
+    in the tool pool cannot be interrupted: it finishes and its entry simply
+    expires unused (keys include every search param, so stale results are never served).
+    A session is only tracked while its warmups run, so expired or evicted
+    sessions do not accumulate here.
+    """
+
+    def __init__(self, cache: SearchCache = SEARCH_CACHE, *, concurrency: int = PREFETCH_CONCURRENCY,
+                 enabled: bool = PREFETCH_ENABLED):
+        self.cache = cache
+        self.enabled = enabled
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._sessions: Dict[str, Tuple[Tuple[str, ...], List[asyncio.Task]]] = {}
+
+    def on_state(self, session_id: str, state: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        warmups = plan_warmups(state)
+        signature = tuple(sorted(self.cache.key(tool, params) for tool, params, _, _ in warmups))
+        current = self._sessions.get(session_id)
+        if current is not None and current[0] == signature:
+            return
+        self.forget(session_id)
+        if not warmups:
+            return
+        tasks = [asyncio.create_task(self._warm(session_id, *w))
+                 for w in warmups if not self.cache.peek(w[0], w[1], w[2])]
+        if not tasks:
+            return
+        entry = (signature, tasks)
+        self._sessions[session_id] = entry
+
+        def _done(_: asyncio.Task) -> None:
+            # Drop the session once its last warmup ends (unless a newer plan replaced it)
+            if self._sessions.get(session_id) is entry and all(t.done() for t in tasks):
+                del self._sessions[session_id]
+
+        for t in tasks:
+            t.add_done_callback(_done)
+
+    def forget(self, session_id: str) -> None:
+        current = self._sessions.pop(session_id, None)
+        if current is not None:
+            for t in current[1]:
+                t.cancel()
+
+    async def _warm(self, session_id: str, tool: str, params: Dict[str, Any], limit: int,
+                    compute: Callable[[int], List[Dict[str, Any]]]) -> None:
+        async with self._sem:
+            try:
+                await run_blocking(tool, self.cache.fetch, tool, params, limit, compute)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # the real tool call retries and surfaces the error
+                logger.warning("prefetch %s for session %s failed: %s", tool, session_id, e)
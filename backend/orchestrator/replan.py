@@ -0,0 +1,147 @@
+from __future__ import annotations
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from backend.config.settings import STAGE_MEMO_SESSIONS
+from backend.llm.orchestrator_input import intake_fields
+from backend.orchestrator.direct import rebudget, trip_params
+from backend.orchestrator.run_cache import canonical
+
+# State keys each stage reads (besides its upstream stages' outputs)
+STAGE_KEYS: Dict[str, FrozenSet[str]] = {
+    "flights": frozenset({"origin", "destination", "start_date", "end_date", "adults", "currency",
+                          "non_stop", "max_results_flights"}),
+    "lodging": frozenset({"destination", "start_date", "end_date", "adults", "currency",
+                          "max_results_hotels", "preview_hotels", "refundable_only"}),
+    "activities": frozenset({"destination", "start_date", "end_date", "activities_enabled"}),
+    "budget": frozenset({"fx_rates"}),  # budget_usd only moves the cap: see REFRESH
+    "critic": frozenset({"budget_usd", "critic_enabled"}),
+}
+STAGE_KEYS["multicity"] = STAGE_KEYS["flights"] | STAGE_KEYS["lodging"] | STAGE_KEYS["activities"] \
+    | STAGE_KEYS["budget"] | {"legs"}
+
+# Keys only downstream stages read; every other key (including unknown ones) replans from the planner
+DOWNSTREAM_ONLY: FrozenSet[str] = frozenset({"budget_usd", "fx_rates", "refundable_only"})
+
+UPSTREAM: Dict[str, Tuple[str, ...]] = {
+    "planner": (),
+    "flights": ("planner",),
+    "lodging": ("planner",),
+    "activities": ("planner",),
+    "budget": ("flights", "lodging", "activities"),
+    "multicity": ("planner",),
+    "critic": ("budget", "multicity"),
+}
+
+
+
+def _recap(out: Dict[str, Any], merged: Dict[str, Any]) -> Dict[str, Any]:
+    return {**out, "budget": rebudget(out.get("budget") or {}, trip_params(merged)["budget_usd"])}
+
+
+# Cheap fix-ups applied to a memoized output instead of re-running the stage
+REFRESH: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    "budget": _recap,
+    "multicity": _recap,
+}
+
+Memo = Dict[str, Tuple[str, Dict[str, Any]]]
+
+
+def _empty(value: Any) -> bool:
+    if isinstance(value, dict) and "offers" in value:
+        return not value["offers"]
+    return value in (None, [], {})
+
+
+def upstream_closure(stage: str) -> Set[str]:
+    """The stage and every stage it (transitively) depends on."""
+    out, todo = set(), [stage]
+    while todo:
+        s = todo.pop()
+        if s not in out:
+            out.add(s)
+            todo.extend(UPSTREAM.get(s, ()))
+    return out
+
+
+def affected_stages(keys: Iterable[str]) -> Set[str]:
+    """Stages that re-run (or refresh) when `keys` change: readers plus everything downstream."""
+    keys = set(keys)
+    hit = {s for s, ks in STAGE_KEYS.items() if keys & ks}
+    if keys - DOWNSTREAM_ONLY:
+        hit.add("planner")  # the planner sees the whole state
+    if "budget_usd" in keys:
+        hit.update(REFRESH)
+    return {s for s in UPSTREAM if upstream_closure(s) & hit}
+
+
+class StagePlan:
+    """
+    Fingerprints and memoized outputs for one run. A stage's fingerprint
+    hashes the state keys it reads, the run options and its upstream
+    fingerprints, so a memoized output is reused exactly when nothing it
+    depends on changed. `only` limits the run to one stage and its upstream.
+    """
+
+    def __init__(self, state: Dict[str, Any], memo: Optional[Memo] = None, only: Optional[str] = None,
+                 **options: Any):
+        self.fields = canonical(intake_fields(state))
+        self.memo = memo
+        self.options = options
+        self.only = upstream_closure(only) if only else None
+        self.reused: List[str] = []
+        self._fps: Dict[str, str] = {}
+
+    def wanted(self, *stages: str) -> bool:
+        return self.only is None or any(s in self.only for s in stages)
+
+    def fingerprint(self, stage: str) -> str:
+        fp = self._fps.get(stage)
+        if fp is None:
+            if stage == "planner":
+                fields = {k: v for k, v in self.fields.items() if k not in DOWNSTREAM_ONLY}
+            else:
+                fields = {k: self.fields.get(k) for k in sorted(STAGE_KEYS[stage])}
+            doc = {"stage": stage, "fields": fields, "options": self.options,
+                   "upstream": [self.fingerprint(u) for u in UPSTREAM[stage]]}
+            fp = self._fps[stage] = hashlib.sha256(
+                json.dumps(doc, sort_keys=True, default=str).encode()).hexdigest()
+        return fp
+
+    def cached(self, stage: str, merged: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self.memo is None:
+            return None
+        hit = self.memo.get(stage)
+        if hit is None or hit[0] != self.fingerprint(stage):
+            return None
+        self.reused.append(stage)
+        refresh = REFRESH.get(stage)
+        return refresh(hit[1], merged) if refresh else hit[1]
+
+    def store(self, stage: str, out: Dict[str, Any]) -> None:
+        # empty results are usually a failed search; retry those next run
+        if self.memo is not None and not all(_empty(v) for v in out.values()):
+            self.memo[stage] = (self.fingerprint(stage), out)
+
+
+class StageMemo:
+    """Per-session memoized stage outputs (LRU over sessions, in-process)."""
+
+    def __init__(self, max_sessions: int = STAGE_MEMO_SESSIONS):
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, Memo]" = OrderedDict()
+
+    def for_session(self, session_id: str) -> Memo:
+        memo = self._sessions.get(session_id)
+        if memo is None:
+            memo = self._sessions[session_id] = {}
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return memo
+
+    def forget(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.config.settings import REQUEST_DEADLINE_MAX_S, RUN_CACHE_MAX, RUN_CACHE_TTL_S
+from backend.llm.intake_parser import CITY_CODES
+from backend.utils.deadline import current_deadline, detached
+from backend.utils.metrics import record_cache
+
+Result = Dict[str, Any]
+
+# Intake bookkeeping that does not change what the pipeline plans
+IGNORED_KEYS = frozenset({"need_more_info", "questions", "next_step"})
+CODE_KEYS = frozenset({"origin", "destination", "currency", "city", "city_code", "iataCity"})
+DATE_KEYS = frozenset({"start_date", "end_date", "check_in", "check_out", "depart_date", "return_date"})
+
+_DATE_PREFIX = re.compile(r"^(\d{4})[-/](\d{1,2})[-/](\d{1,2})")
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused for a run with different inputs."""
+
+
+def _norm_date(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    m = _DATE_PREFIX.match(str(value).strip()) if isinstance(value, str) else None
+    if not m:
+        return value
+    try:
+        return date(*map(int, m.groups())).isoformat()
+    except ValueError:
+        return value
+
+
+def _norm_code(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    v = value.strip()
+    return CITY_CODES.get(v.lower(), v.upper())
+
+
+def canonical(value: Any, key: Optional[str] = None) -> Any:
+    """
+    Canonical form of a run input: intake bookkeeping and None values
+    dropped, strings stripped, dates as YYYY-MM-DD, codes upper-cased (city
+    names mapped to their code), integral floats as ints. Key order is
+    handled by the sorted JSON in `state_hash`.
+    """
+    if isinstance(value, dict):
+        return {k: canonical(v, k) for k, v in value.items() if v is not None and k not in IGNORED_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if key in DATE_KEYS:
+        return _norm_date(value)
+    if key in CODE_KEYS:
+        return _norm_code(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def state_hash(state: Dict[str, Any], **options: Any) -> str:
+    """sha256 of the canonical state plus the run options (mode, critic, ...)."""
+    doc = {"state": canonical(state), "options": options}
+    return hashlib.sha256(json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+
+
+class RunCache:
+    """
+    Completed pipeline results keyed by `state_hash`, with TTL + LRU. A run
+    whose key is already executing waits for that execution instead of
+    starting another; the execution is shielded, so one caller going away
+    does not cancel it for the others.
+    An execution runs under the deadline of the caller that started it
+    (`deadline_s` from then without one), so a short-deadline caller gets a
+    degraded result in time instead of a 504. A caller joins an execution
+    that ends no later than its own deadline (and at most JOIN_SLACK_S
+    earlier); one with less time runs its own, one with noticeably more
+    time starts a new shared execution. Failures and degraded results
+    (stages cut short or replaced by their fallback) are not cached.
+    Idempotency keys map to the hash of the run they were first used for.
+    """
+
+    # A caller whose deadline is this much later than the in-flight run's starts a longer run
+    JOIN_SLACK_S = 1.0
+
+    def __init__(self, ttl_s: float = RUN_CACHE_TTL_S, max_entries: int = RUN_CACHE_MAX,
+                 deadline_s: Optional[float] = REQUEST_DEADLINE_MAX_S):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        self.deadline_s = deadline_s
+        self._done: "OrderedDict[str, Tuple[float, Result]]" = OrderedDict()
+        # key -> (task, absolute deadline it runs under, started without a caller deadline)
+        self._inflight: Dict[str, Tuple[asyncio.Task, float, bool]] = {}
+        self._idem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def bind(self, idempotency_key: Optional[str], key: str) -> str:
+        """Key to use for a run; raises IdempotencyConflict if the idempotency key belongs to another run."""
+        if not idempotency_key:
+            return key
+        now = time.time()
+        bound = self._idem.get(idempotency_key)
+        if bound is not None and bound[0] > now and bound[1] != key:
+            raise IdempotencyConflict(f"Idempotency-Key {idempotency_key!r} was used for a different run")
+        self._idem[idempotency_key] = (now + self.ttl_s, key)
+        self._idem.move_to_end(idempotency_key)
+        while len(self._idem) > self.max_entries:
+            self._idem.popitem(last=False)
+        return key
+
+    def get(self, key: str) -> Optional[Result]:
+        hit = self._done.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.time():
+            del self._done[key]
+            return None
+        self._done.move_to_end(key)
+        return hit[1]
+
+    def invalidate(self, key: str) -> None:
+        self._done.pop(key, None)
+
+    async def run(self, key: str, runner: Callable[[], Awaitable[Result]]) -> Tuple[Result, str]:
+        """(result, how) where how is "hit" (cached), "joined" (waited on a duplicate) or "miss"."""
+        cached = self.get(key)
+        if cached is not None:
+            record_cache("run", hit=True)
+            return cached, "hit"
+        mine = current_deadline()
+        unbounded = mine is None
+        if unbounded:
+            mine = time.monotonic() + self.deadline_s if self.deadline_s is not None else math.inf
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            task, ends, was_unbounded = inflight
+            if ends <= mine and (unbounded == was_unbounded or mine - ends <= self.JOIN_SLACK_S):
+                record_cache("run", hit=True)
+                return await asyncio.shield(task), "joined"
+        record_cache("run", hit=False)
+        task = self._start(runner, mine)
+        if inflight is None or mine > inflight[1]:
+            # the longest-running execution is the one later callers join
+            self._inflight[key] = (task, mine, unbounded)
+        task.add_done_callback(lambda t, k=key: self._finished(k, t))
+        return await asyncio.shield(task), "miss"
+
+    @staticmethod
+    def _start(runner: Callable[[], Awaitable[Result]], ends: float) -> asyncio.Task:
+        seconds = None if math.isinf(ends) else ends - time.monotonic()
+        return asyncio.get_running_loop().create_task(runner(), context=detached(seconds))
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if isinstance(result, dict) and result.get("degraded"):
+            return
+        self._done[key] = (time.time() + self.ttl_s, result)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
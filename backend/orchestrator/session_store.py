@@ -0,0 +1,360 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple, Type
+
+from backend.config.settings import (
+    SESSION_DB_PATH,
+    SESSION_MAX,
+    SESSION_REDIS_URL,
+    SESSION_STORE,
+    SESSION_TTL_S,
+)
+from backend.llm.memory import HistoryPolicy
+from backend.llm.orchestrator_input import OrchestratorInputs
+from backend.llm.state_patch import VersionConflict
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.orchestrator.session_store")
+
+# Tables the Agents SDK SQLiteSession keeps conversation items in
+_SDK_TABLES = ("agent_messages", "agent_sessions")
+
+
+class SessionStore(ABC):
+    """
+    Bounded store of OrchestratorInputs keyed by session id.
+    Entries idle for longer than `ttl_s` expire; beyond `max_entries` the least
+    recently used entry is evicted. Callers write through with `put` after
+    every mutation so other workers see the latest state. `put` is a
+    compare-and-set on the state version: it raises VersionConflict when the
+    session was written by someone else since this copy was read.
+    """
+
+    def __init__(self, *, ttl_s: float = SESSION_TTL_S, max_entries: int = SESSION_MAX):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, int(max_entries))
+        # One Agents SDK session (and its connection) per session id, reused across loads
+        self._conversations: "OrderedDict[str, Any]" = OrderedDict()
+        self._conv_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[OrchestratorInputs]:
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, orch: OrchestratorInputs) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    def conversation(self, session_id: str) -> Optional[Any]:
+        """Agents SDK session persisting the orchestrator's conversation (None = in-memory)."""
+        with self._conv_lock:
+            conv = self._conversations.get(session_id)
+            if conv is not None:
+                self._conversations.move_to_end(session_id)
+                return conv
+            conv = self._open_conversation(session_id)
+            if conv is not None:
+                self._conversations[session_id] = conv
+                while len(self._conversations) > self.max_entries:
+                    self._conversations.popitem(last=False)
+            return conv
+
+    def _open_conversation(self, session_id: str) -> Optional[Any]:
+        return None
+
+    def _forget_conversations(self, ids: Iterable[str]) -> None:
+        with self._conv_lock:
+            for sid in ids:
+                self._conversations.pop(sid, None)
+
+    def create(self, session_id: str, history: Optional[HistoryPolicy] = None) -> OrchestratorInputs:
+        """Fresh session under `session_id`, replacing any previous state and conversation."""
+        self.delete(session_id)
+        orch = OrchestratorInputs(session_id=session_id, history=history,
+                                  conversation=self.conversation(session_id))
+        self.put(session_id, orch)
+        return orch
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+
+def _conflict(orch: OrchestratorInputs, current: Optional[int]) -> VersionConflict:
+    return VersionConflict(orch.stored_version or 0, -1 if current is None else current, ["*"])
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process LRU of live objects (single worker / local dev)."""
+
+    def __init__(self, **kw: Any):
+        super().__init__(**kw)
+        self._items: "OrderedDict[str, Tuple[OrchestratorInputs, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[OrchestratorInputs]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(session_id)
+            if entry is None:
+                return None
+            orch, last = entry
+            if now - last > self.ttl_s:
+                del self._items[session_id]
+                return None
+            self._items[session_id] = (orch, now)
+            self._items.move_to_end(session_id)
+            orch.stored_version = orch.version
+            return orch
+
+    def put(self, session_id: str, orch: OrchestratorInputs) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(session_id)
+            # Callers share the live object; a different object must be based on the stored version
+            if (entry is not None and entry[0] is not orch and orch.stored_version is not None
+                    and entry[0].version != orch.stored_version):
+                raise _conflict(orch, entry[0].version)
+            self._items[session_id] = (orch, now)
+            self._items.move_to_end(session_id)
+            orch.stored_version = orch.version
+            # Oldest entries sit at the front; drop expired ones and any overflow
+            while self._items:
+                oldest_id, (_, last) = next(iter(self._items.items()))
+                if len(self._items) > self.max_entries or now - last > self.ttl_s:
+                    del self._items[oldest_id]
+                else:
+                    break
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._items.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Snapshots in a shared SQLite file (WAL) so every local worker sees them.
+    The orchestrator's conversation is kept in the same file (Agents SDK
+    SQLiteSession tables) and removed with its session.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, **kw: Any):
+        super().__init__(**kw)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, snapshot TEXT NOT NULL, accessed_at REAL NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        try:  # tables created before the version column existed
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions(accessed_at)"
+        )
+
+    def _open_conversation(self, session_id: str) -> Optional[Any]:
+        if self.path == ":memory:":
+            return None
+        from agents import SQLiteSession
+
+        return SQLiteSession(session_id, db_path=self.path)
+
+    def _drop_conversations(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+        self._forget_conversations(ids)
+        marks = ",".join("?" * len(ids))
+        for table in _SDK_TABLES:
+            try:
+                self._conn.execute(f"DELETE FROM {table} WHERE session_id IN ({marks})", ids)
+            except sqlite3.OperationalError:  # no conversation stored yet
+                pass
+
+    def get(self, session_id: str) -> Optional[OrchestratorInputs]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT snapshot, accessed_at, version FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_s:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._drop_conversations([session_id])
+                return None
+            self._conn.execute(
+                "UPDATE sessions SET accessed_at = ? WHERE id = ?", (now, session_id)
+            )
+        orch = OrchestratorInputs.from_snapshot(row[0], conversation=self.conversation(session_id))
+        orch.stored_version = row[2]
+        return orch
+
+    def put(self, session_id: str, orch: OrchestratorInputs) -> None:
+        now = time.time()
+        values = (orch.snapshot(), now, orch.version)
+        with self._lock:
+            if orch.stored_version is None:  # new session: create or replace
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (snapshot, accessed_at, version, id) VALUES (?, ?, ?, ?)",
+                    (*values, session_id),
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE sessions SET snapshot = ?, accessed_at = ?, version = ? WHERE id = ? AND version = ?",
+                    (*values, session_id, orch.stored_version),
+                )
+                if cur.rowcount == 0:
+                    cur = self._conn.execute(  # expired/evicted meanwhile: write it back
+                        "INSERT OR IGNORE INTO sessions (snapshot, accessed_at, version, id) VALUES (?, ?, ?, ?)",
+                        (*values, session_id),
+                    )
+                if cur.rowcount == 0:
+                    row = self._conn.execute(
+                        "SELECT version FROM sessions WHERE id = ?", (session_id,)
+                    ).fetchone()
+                    raise _conflict(orch, row[0] if row else None)
+            orch.stored_version = orch.version
+            gone = [r[0] for r in self._conn.execute(
+                "SELECT id FROM sessions WHERE accessed_at < ? UNION"
+                " SELECT id FROM (SELECT id FROM sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl_s, self.max_entries),
+            )]
+            if gone:
+                marks = ",".join("?" * len(gone))
+                self._conn.execute(f"DELETE FROM sessions WHERE id IN ({marks})", gone)
+                self._drop_conversations(gone)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._drop_conversations([session_id])
+
+
+class _NoWatchError(Exception):
+    """Placeholder when neither the client nor redis-py provides WatchError."""
+
+
+def _redis_watch_error() -> Type[BaseException]:
+    try:
+        from redis.exceptions import WatchError
+    except ImportError:
+        return _NoWatchError
+    return WatchError
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Snapshots in any Redis-protocol server. Idle TTL uses key expiry; the LRU
+    cap is kept with a sorted set of last-access times. `put` is a WATCH /
+    MULTI transaction on the snapshot key.
+    `client` may be any redis-py compatible client (e.g. a local stand-in);
+    a stand-in may expose the exception its transactions raise as
+    `client.WatchError`.
+    Conversations use the Agents SDK RedisSession on the same server when
+    the store was built from a URL.
+    """
+
+    def __init__(self, client: Any = None, *, url: Optional[str] = SESSION_REDIS_URL,
+                 prefix: str = "orch:session:", **kw: Any):
+        super().__init__(**kw)
+        self.url: Optional[str] = None
+        if client is None:
+            import redis  # optional: only needed for this backend
+            self.url = url or "redis://localhost:6379/0"
+            client = redis.Redis.from_url(self.url)
+        self.client = client
+        self.watch_error: Type[BaseException] = getattr(client, "WatchError", None) or _redis_watch_error()
+        self.prefix = prefix
+        self.index = prefix + "lru"
+        self.conv_prefix = prefix + "conv"
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def _conv_keys(self, session_id: str) -> list:
+        # RedisSession layout: <key_prefix>:<id>, :messages, :counter
+        base = f"{self.conv_prefix}:{session_id}"
+        return [base, base + ":messages", base + ":counter"]
+
+    def _open_conversation(self, session_id: str) -> Optional[Any]:
+        if self.url is None:
+            return None
+        try:
+            from agents.extensions.memory import RedisSession
+        except ImportError:
+            logger.warning("agents RedisSession unavailable; conversation history is per request")
+            return None
+        return RedisSession.from_url(session_id, url=self.url, key_prefix=self.conv_prefix,
+                                     ttl=int(self.ttl_s))
+
+    def get(self, session_id: str) -> Optional[OrchestratorInputs]:
+        raw = self.client.get(self._key(session_id))
+        if raw is None:
+            self.client.zrem(self.index, session_id)
+            return None
+        self.client.expire(self._key(session_id), int(self.ttl_s))
+        self.client.zadd(self.index, {session_id: time.time()})
+        orch = OrchestratorInputs.from_snapshot(raw, conversation=self.conversation(session_id))
+        orch.stored_version = orch.version
+        return orch
+
+    def put(self, session_id: str, orch: OrchestratorInputs) -> None:
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if orch.stored_version is not None:
+                    raw = pipe.get(key)
+                    current = None if raw is None else int(json.loads(raw).get("version") or 0)
+                    if current is not None and current != orch.stored_version:
+                        raise _conflict(orch, current)
+                pipe.multi()
+                pipe.set(key, orch.snapshot(), ex=int(self.ttl_s))
+                pipe.execute()
+            except self.watch_error:
+                raise _conflict(orch, None) from None
+        orch.stored_version = orch.version
+        self.client.zadd(self.index, {session_id: time.time()})
+        overflow = int(self.client.zcard(self.index)) - self.max_entries
+        if overflow > 0:
+            victims = [
+                v.decode() if isinstance(v, bytes) else v
+                for v in self.client.zrange(self.index, 0, overflow - 1)
+            ]
+            if victims:
+                self.client.delete(*[k for v in victims for k in [self._key(v), *self._conv_keys(v)]])
+                self.client.zrem(self.index, *victims)
+                self._forget_conversations(victims)
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(self._key(session_id), *self._conv_keys(session_id))
+        self.client.zrem(self.index, session_id)
+        self._forget_conversations([session_id])
+
+
+def make_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    """Build the store selected by SESSION_STORE (memory | sqlite | redis)."""
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return InMemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected memory|sqlite|redis)")
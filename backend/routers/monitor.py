@@ -0,0 +1,42 @@
+from __future__ import annotations
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from backend.llm.model_routing import ROUTER
+from backend.utils.metrics import render_prometheus
+from backend.utils.tracing import BUFFER, trace_view
+
+router = APIRouter(tags=["monitor"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage, Amadeus, cache and API metrics."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/traces", response_model=dict)
+async def list_traces(limit: int = Query(20, ge=1, le=200)):
+    """Most recent traces held in the in-memory ring buffer."""
+    return {"ok": True, "traces": BUFFER.recent_traces(limit)}
+
+
+@router.get("/debug/traces/{trace_id}", response_model=dict)
+async def get_trace(trace_id: str):
+    """Waterfall of one trace: spans ordered by start with depth and offsets."""
+    view = trace_view(trace_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found.")
+    return {"ok": True, **view}
+
+
+@router.get("/debug/model-routing", response_model=dict)
+async def model_routing():
+    """Effective per-stage model profiles and which stages are currently downgraded."""
+    return {"ok": True, "stages": ROUTER.describe()}
+
+
+@router.post("/debug/model-routing/reload", response_model=dict)
+async def reload_model_routing():
+    """Re-read MODEL_ROUTING_FILE now (it is also picked up automatically when it changes)."""
+    return {"ok": True, "stages": ROUTER.reload()}
@@ -0,0 +1,31 @@
+from __future__ import annotations
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from backend.orchestrator.jobs import get_job_queue
+from backend.utils.encoding import negotiated
+
+router = APIRouter(tags=["runs"])
+
+MAX_WAIT_S = 60.0
+
+
+@router.get("/runs/{job_id}", response_model=dict)
+async def get_run(
+    request: Request,
+    job_id: str,
+    wait: float = Query(0.0, ge=0.0, le=MAX_WAIT_S, description="Long-poll seconds to wait for a change"),
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths, e.g. status,result.budget"),
+):
+    """
+    Return job status, partial stage outputs and (when finished) the result.
+    With `wait`, blocks until the job changes or the wait elapses.
+    Carries a strong ETag; a matching If-None-Match gets 304 without a body.
+    """
+    queue = get_job_queue()
+    job = await queue.wait(job_id, wait) if wait else await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Run '{job_id}' not found.")
+    job.pop("input", None)
+    return negotiated(request, {"ok": True, **job}, fields=fields, etag=True)
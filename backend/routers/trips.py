@@ -0,0 +1,75 @@
+from __future__ import annotations
+import asyncio
+import json
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Literal
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.config.settings import BATCH_CONCURRENCY, BATCH_MAX_ITEMS, PIPELINE_MODE
+from backend.orchestrator.critic_checks import rules_critic
+from backend.orchestrator.pipeline import run_pipeline
+from backend.utils.logger import get_logger
+from backend.utils.tracing import span
+
+logger = get_logger("backend.routers.trips")
+
+router = APIRouter(tags=["trips"])
+
+# One cap shared by every batch request on a loop
+_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _SLOTS.get(loop)
+    if sem is None:
+        sem = _SLOTS[loop] = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    return sem
+
+
+class BatchPlanBody(BaseModel):
+    specs: List[Dict[str, Any]] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS,
+                                        description="Trip fields per item (origin, destination, dates, budget_usd, ...)")
+    mode: Literal["agents", "direct"] = PIPELINE_MODE
+
+
+async def _run_item(i: int, spec: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    async with _slots():
+        try:
+            with span("batch.item", index=i, mode=mode):
+                # Own planner, ranking and budget per spec; identical searches (e.g.
+                # budget tiers of one trip) are shared through the search cache
+                result = await run_pipeline({"state": dict(spec)}, mode=mode, critic=False)
+                result.update(rules_critic({"state": spec, **result}))
+        except Exception as e:
+            logger.warning("batch item %d failed: %s", i, e)
+            return {"index": i, "id": spec.get("id"), "ok": False, "error": str(e) or e.__class__.__name__}
+    return {"index": i, "id": spec.get("id"), "ok": True, "result": result}
+
+
+async def _stream(specs: List[Dict[str, Any]], mode: str) -> AsyncIterator[bytes]:
+    tasks = [asyncio.create_task(_run_item(i, spec, mode)) for i, spec in enumerate(specs)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield (json.dumps(await done, ensure_ascii=False, default=str) + "\n").encode()
+        yield (json.dumps({"done": True, "items": len(specs)}) + "\n").encode()
+    finally:
+        for t in tasks:  # client went away
+            t.cancel()
+
+
+@router.post("/plans:batch")
+async def plan_batch(body: BatchPlanBody):
+    """
+    Plan many trips in one request (budget tiers, group travel from several
+    origins). Every spec gets its own pipeline run (planner, ranking, budget);
+    runs go concurrently, at most BATCH_CONCURRENCY across all batch
+    requests, and identical searches across runs (e.g. budget tiers of one
+    trip) are served once by the shared search cache. Results stream back as NDJSON, one line per spec in
+    completion order ({"index", "id", "ok", "result" | "error"}), then a
+    {"done": true} line. Items get the rule-based critic review.
+    """
+    return StreamingResponse(_stream(body.specs, body.mode), media_type="application/x-ndjson")
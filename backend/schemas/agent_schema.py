@@ -0,0 +1,249 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, ConfigDict, ValidationError, model_validator
+
+from backend.utils.json_repair import loads_tolerant
+
+# Output models for each agent (see docs/prompts/<stage>.md). They are the
+# agents' `output_type`: fields the pipeline depends on are required, the
+# rest is optional, and unknown keys are kept (extra="allow").
+
+Amount = Union[float, str, None]
+
+
+class _Output(BaseModel):
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+
+# ---- Orchestrator ----------------------------------------------------------------
+
+class PatchOp(_Output):
+    op: str
+    path: str
+    value: Any = None
+
+
+class OrchestratorOutput(_Output):
+    need_more_info: bool = False
+    questions: List[str] = []
+    patch: Optional[List[PatchOp]] = None
+    state: Optional[Dict[str, Any]] = None  # legacy form of `patch`
+    next_step: Optional[str] = None
+
+
+# ---- Planner ---------------------------------------------------------------------
+
+class PlannedTrip(_Output):
+    id: Optional[str] = None
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
+class Leg(_Output):
+    city: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
+class PlannerOutput(_Output):
+    trip: PlannedTrip
+    primary_city: str
+    legs: Optional[List[Leg]] = None
+    adults: Optional[int] = None
+    currency: Optional[str] = None
+    non_stop: Optional[bool] = None
+    max_results_flights: Optional[int] = None
+    max_results_hotels: Optional[int] = None
+    preview_hotels: Optional[int] = None
+    activities_enabled: Optional[bool] = None
+    critic_enabled: Optional[bool] = None
+
+
+# ---- Flights ---------------------------------------------------------------------
+
+class Segment(_Output):
+    carrier: Optional[str] = None
+    flight_number: Optional[str] = None
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    depart_iso: Optional[str] = None
+    arrive_iso: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    stops: Optional[int] = None
+    cabin: Optional[str] = None
+    baggage_note: Optional[str] = None
+
+
+class FlightOffer(_Output):
+    id: Optional[str] = None
+    currency: Optional[str] = None
+    total: Amount = None
+    carriers: List[str] = []
+    itinerary_count: Optional[int] = None
+    durations: List[Optional[str]] = []
+    segments: List[Segment] = []
+    raw_offer_id: Optional[str] = None
+
+
+class FlightOptions(_Output):
+    source: Optional[str] = None
+    currency: Optional[str] = None
+    count: Optional[int] = None
+    offers: List[FlightOffer] = []
+
+
+class FlightsOutput(_Output):
+    flight_options: FlightOptions
+
+
+# ---- Lodging ---------------------------------------------------------------------
+
+class HotelOption(_Output):
+    hotelId: Optional[str] = None
+    amadeus_hotel_id: Optional[str] = None
+    name: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+    rating: Optional[float] = None
+    room_type: Optional[str] = None
+    refundable: Optional[bool] = None
+    refund_policy: Optional[str] = None
+    cancel_deadline: Optional[str] = None
+    board: Optional[str] = None
+    currency: Optional[str] = None
+    avg_per_night: Amount = None
+    total: Amount = None
+    raw_offer_id: Optional[str] = None
+    iataCity: Optional[str] = None
+    geo: Optional[Dict[str, float]] = None
+
+
+class LodgingOutput(_Output):
+    lodging_options: List[HotelOption]
+
+
+# ---- Activities ------------------------------------------------------------------
+
+class Activity(_Output):
+    title: str
+    category: Optional[str] = None
+    start_time: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    price: Amount = None
+    currency: Optional[str] = None
+    location: Union[Dict[str, float], str, None] = None
+    refundable: Optional[bool] = None
+    raw_offer_id: Optional[str] = None
+
+
+class ActivitiesOutput(_Output):
+    activities: Optional[List[Activity]] = None
+    plan: Optional[Dict[str, List[Activity]]] = None  # day-by-day form
+
+    @model_validator(mode="after")
+    def _one_shape(self) -> "ActivitiesOutput":
+        if self.activities is None and self.plan is None:
+            raise ValueError("expected `activities` or `plan`")
+        return self
+
+
+# ---- Budget / critic -------------------------------------------------------------
+
+class Breakdown(_Output):
+    flights_usd: float = 0.0
+    lodging_usd: float = 0.0
+    activities_usd: float = 0.0
+
+
+class Budget(_Output):
+    cap_usd: float
+    total_usd: float
+    status: str
+    delta_usd: float
+    breakdown: Optional[Breakdown] = None
+
+
+class BudgetOutput(_Output):
+    budget: Budget
+
+
+class Risk(_Output):
+    issue: str
+    mitigation: Optional[str] = None
+
+
+class Critique(_Output):
+    summary: str
+    risks: List[Risk] = []
+    next_actions: List[str] = []
+    confidence: Optional[str] = None
+
+
+class CriticOutput(_Output):
+    critic: Critique
+
+
+STAGE_OUTPUTS: Dict[str, Type[BaseModel]] = {
+    "orchestrator": OrchestratorOutput,
+    "planner": PlannerOutput,
+    "flights": FlightsOutput,
+    "lodging": LodgingOutput,
+    "activities": ActivitiesOutput,
+    "budget": BudgetOutput,
+    "critic": CriticOutput,
+}
+
+
+# ---- Parsing ---------------------------------------------------------------------
+
+@dataclass
+class InvalidOutput:
+    """A reply that could not be repaired into the stage's model (kept for the re-ask)."""
+    raw: str
+    errors: str
+
+
+class StageOutputError(ValueError):
+    """An agent stage's reply does not match its output model."""
+
+    def __init__(self, stage: str, raw: str, errors: str):
+        super().__init__(f"{stage} output invalid: {errors}")
+        self.stage = stage
+        self.raw = raw
+        self.errors = errors
+
+
+def _errors(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or '<root>'}: {err['msg']}" for err in e.errors()[:10])
+    return str(e)
+
+
+def parse_output(stage: str, value: Any) -> BaseModel:
+    """
+    A stage's reply as its output model. Accepts the model itself (SDK
+    output_type), a dict, {"text": "<json>"} or a string, which goes through
+    loads_tolerant. Raises StageOutputError.
+    """
+    if isinstance(value, InvalidOutput):
+        raise StageOutputError(stage, value.raw, value.errors)
+    model = STAGE_OUTPUTS[stage]
+    if isinstance(value, model):
+        return value
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json", exclude_unset=True)
+    if isinstance(value, dict) and set(value) == {"text"} and isinstance(value["text"], str):
+        value = value["text"]
+    try:
+        return model.model_validate(loads_tolerant(value) if isinstance(value, str) else value)
+    except ValueError as e:  # includes ValidationError
+        raise StageOutputError(stage, value if isinstance(value, str) else repr(value), _errors(e)) from e
+
+
+def validate_output(stage: str, value: Any) -> Dict[str, Any]:
+    """parse_output as a plain dict (the fields the model returned, plus any extra keys)."""
+    return parse_output(stage, value).model_dump(mode="json", exclude_unset=True)
@@ -0,0 +1,273 @@
+from __future__ import annotations
+import gc
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_EVEN, Decimal
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from backend.schemas.trip_schema import LineItem, LineItemType, Trip
+
+try:  # optional: `pip install .[analytics]`
+    import numpy as np
+except ImportError:
+    np = None
+
+TYPES: List[LineItemType] = list(LineItemType)
+PRICE_SCALE = 2  # prices are stored as integer cents
+
+_EPOCH = date(1970, 1, 1).toordinal()
+_EPOCH_DT = datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH_DT.replace(tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+_US_PER_DAY = 86_400_000_000
+NA_TS = -(2 ** 63)   # missing start_ts / end_ts
+NA_DAY = -(2 ** 31)  # missing start date
+
+GROUP_KEYS = ("type", "vendor", "currency", "trip", "date")
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("LineItemStore needs numpy (pip install '.[analytics]')")
+
+
+def _cents(price: Decimal) -> int:
+    return int((price * 100).to_integral_value(ROUND_HALF_EVEN))
+
+
+def _price(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-PRICE_SCALE)
+
+
+def _us(dt: Optional[datetime]) -> int:
+    """Microseconds since the epoch (UTC for tz-aware datetimes), NA_TS for None."""
+    if dt is None:
+        return NA_TS
+    return (dt - (_EPOCH_UTC if dt.tzinfo is not None else _EPOCH_DT)) // _US
+
+
+def _aware(dt: Optional[datetime]) -> bool:
+    return dt is not None and dt.tzinfo is not None
+
+
+def _objects(values: List[Any]) -> "np.ndarray":
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+class _Codes:
+    """Categorical dictionary: value -> small int code, in first-seen order."""
+
+    def __init__(self, values: Sequence[Any] = ()):
+        self.values: List[Any] = list(values)
+        self.index: Dict[Any, int] = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: Any) -> int:
+        c = self.index.get(value)
+        if c is None:
+            c = self.index[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+
+class LineItemStore:
+    """
+    Columnar, NumPy-backed copy of many trips' line items for reporting.
+    Prices are fixed-point integer cents (Decimal rounded half-even to
+    PRICE_SCALE places), type/vendor/currency/trip are categorical codes,
+    timestamps are int64 microseconds (tz-aware ones in UTC) and the start
+    date is an int32 day number. Grouping and filtering are vectorized;
+    to_line_items() rebuilds LineItem objects without re-validating them.
+    """
+
+    def __init__(self, cols: Dict[str, "np.ndarray"], vendors: List[Optional[str]],
+                 currencies: List[str], trip_ids: List[str]):
+        self.cols = cols
+        self.vendors = vendors
+        self.currencies = currencies
+        self.trip_ids = trip_ids
+
+    # ---- building -----------------------------------------------------------------
+
+    @classmethod
+    def from_trips(cls, trips: Iterable[Trip]) -> "LineItemStore":
+        return cls.from_items(chain.from_iterable(t.line_items for t in trips))
+
+    @classmethod
+    def from_items(cls, items: Iterable[LineItem]) -> "LineItemStore":
+        _require_numpy()
+        items = list(items)
+        type_codes = {t: i for i, t in enumerate(TYPES)}  # str-valued enum: matches "flight" too
+        vendors, currencies, trips = _Codes([None]), _Codes(), _Codes()
+        start = np.array([_us(li.start_ts) for li in items], dtype=np.int64)
+        day = np.where(start == NA_TS, NA_DAY, start // _US_PER_DAY).astype(np.int32)
+        cols = {
+            "trip": np.array([trips.code(li.trip_id) for li in items], dtype=np.int32),
+            "type": np.array([type_codes[li.type] for li in items], dtype=np.int8),
+            "vendor": np.array([vendors.code(li.vendor) for li in items], dtype=np.int32),
+            "currency": np.array([currencies.code(li.currency) for li in items], dtype=np.int16),
+            "price_cents": np.array([_cents(li.price_usd) for li in items], dtype=np.int64),
+            "start_us": start,
+            "end_us": np.array([_us(li.end_ts) for li in items], dtype=np.int64),
+            "utc": np.array([_aware(li.start_ts or li.end_ts) for li in items], dtype=bool),
+            "date": day,
+            "refundable": np.array([li.refundable for li in items], dtype=bool),
+            "id": _objects([li.id for li in items]),
+            "ref": _objects([li.ref for li in items]),
+            "terms": _objects([li.terms for li in items]),
+            "meta": _objects([li.meta for li in items]),
+        }
+        return cls(cols, vendors.values, currencies.values, trips.values)
+
+    def __len__(self) -> int:
+        return len(self.cols["price_cents"])
+
+    def take(self, rows: "np.ndarray") -> "LineItemStore":
+        """Store of the selected rows (boolean mask or indexes); categories are shared."""
+        return LineItemStore({k: v[rows] for k, v in self.cols.items()},
+                             self.vendors, self.currencies, self.trip_ids)
+
+    # ---- queries ------------------------------------------------------------------
+
+    def _codes(self, key: str, values: Iterable[Any]) -> List[int]:
+        if key == "type":
+            values = [LineItemType(v).value for v in values]
+        index = {v: i for i, v in enumerate(self._table(key))}
+        return [index[v] for v in values if v in index]
+
+    def filter(self, *, start: Optional[date] = None, end: Optional[date] = None,
+               types: Optional[Iterable[Any]] = None, vendors: Optional[Iterable[Optional[str]]] = None,
+               currencies: Optional[Iterable[str]] = None,
+               trips: Optional[Iterable[str]] = None) -> "LineItemStore":
+        """
+        Items whose start date is within [start, end] (inclusive; items
+        without a start_ts are dropped when a bound is given) and whose
+        type/vendor/currency/trip is among the given values.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        day = self.cols["date"]
+        if start is not None or end is not None:
+            mask &= day != NA_DAY
+        if start is not None:
+            mask &= day >= start.toordinal() - _EPOCH
+        if end is not None:
+            mask &= day <= end.toordinal() - _EPOCH
+        for key, values in (("type", types), ("vendor", vendors), ("currency", currencies), ("trip", trips)):
+            if values is not None:
+                mask &= np.isin(self.cols[key], self._codes(key, values))
+        return self.take(mask)
+
+    def total_usd(self) -> Decimal:
+        return _price(int(self.cols["price_cents"].sum()))
+
+    def _table(self, key: str) -> List[Any]:
+        """Category values of a coded column, indexed by code."""
+        if key == "type":
+            return [t.value for t in TYPES]
+        return {"vendor": self.vendors, "currency": self.currencies, "trip": self.trip_ids}[key]
+
+    def _decode(self, key: str, codes: "np.ndarray") -> List[Any]:
+        if key == "date":
+            return [None if d == NA_DAY else date.fromordinal(d + _EPOCH) for d in codes.tolist()]
+        table = self._table(key)
+        return [table[c] for c in codes.tolist()]
+
+    def group_totals(self, *keys: str) -> List[Dict[str, Any]]:
+        """
+        Cost totals grouped by any of GROUP_KEYS, e.g. group_totals("type",
+        "vendor", "date"): one row per combination present, in key order,
+        with "total_usd" (exact Decimal) and "items". One sort over a
+        combined key, then segment sums on the integer cents.
+        """
+        unknown = set(keys) - set(GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"unknown group keys {sorted(unknown)}; expected {GROUP_KEYS}")
+        n = len(self)
+        if n == 0:
+            return []
+        if not keys:
+            return [{"total_usd": self.total_usd(), "items": n}]
+        # mixed-radix key over the dense codes of each column (dates are densified first)
+        uniques, combined = [], np.zeros(n, dtype=np.int64)
+        for k in keys:
+            if k == "date":
+                uniq, inv = np.unique(self.cols[k], return_inverse=True)
+            else:
+                uniq, inv = np.arange(len(self._table(k))), self.cols[k]
+            uniques.append(uniq)
+            combined = combined * len(uniq) + inv.reshape(-1)
+        order = np.argsort(combined, kind="stable")
+        ordered = combined[order]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        sums = np.add.reduceat(self.cols["price_cents"][order], starts)
+        counts = np.diff(np.r_[starts, n])
+        group = ordered[starts]
+        columns = []
+        for k, uniq in zip(reversed(keys), reversed(uniques)):
+            columns.append(self._decode(k, uniq[group % len(uniq)]))
+            group = group // len(uniq)
+        columns.reverse()
+        return [
+            {**dict(zip(keys, values)), "total_usd": _price(total), "items": count}
+            for *values, total, count in zip(*columns, sums.tolist(), counts.tolist())
+        ]
+
+    def totals_by(self, *keys: str) -> Dict[Any, Decimal]:
+        """group_totals as {value: total} for one key, {(v1, v2, ...): total} for several."""
+        return {
+            (row[keys[0]] if len(keys) == 1 else tuple(row[k] for k in keys)): row["total_usd"]
+            for row in self.group_totals(*keys)
+        }
+
+    # ---- back to objects --------------------------------------------------------------
+
+    def to_line_items(self) -> List[LineItem]:
+        """
+        LineItem objects for every row. Rows came from validated LineItems,
+        so __init__/__post_init__ are skipped and the slots are set directly;
+        each column is decoded in one vectorized step first, and the cyclic
+        GC is paused while the objects are allocated (with millions of new
+        objects its repeated collections otherwise dominate). Prices come back
+        at PRICE_SCALE places (Decimal("10.5") -> "10.50").
+        """
+        c = self.cols
+        utc = c["utc"]
+
+        def stamps(us: "np.ndarray") -> List[Optional[datetime]]:
+            out = us.astype("datetime64[us]").tolist()  # NA_TS is NaT -> None
+            for i in np.flatnonzero(utc & (us != NA_TS)).tolist():
+                out[i] = out[i].replace(tzinfo=timezone.utc)
+            return out
+
+        cents, inv = np.unique(c["price_cents"], return_inverse=True)
+        prices = _objects([_price(v) for v in cents.tolist()])[inv.reshape(-1)].tolist()
+        rows = zip(
+            c["id"].tolist(), self._decode("trip", c["trip"]), [TYPES[t] for t in c["type"].tolist()],
+            self._decode("vendor", c["vendor"]), c["ref"].tolist(), stamps(c["start_us"]),
+            stamps(c["end_us"]), prices, self._decode("currency", c["currency"]),
+            c["refundable"].tolist(), c["terms"].tolist(), c["meta"].tolist())
+        new = object.__new__
+        out: List[LineItem] = []
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for id_, trip, typ, vendor, ref, start, end, price, currency, refundable, terms, meta in rows:
+                li = new(LineItem)
+                li.id = id_
+                li.trip_id = trip
+                li.type = typ
+                li.vendor = vendor
+                li.ref = ref
+                li.start_ts = start
+                li.end_ts = end
+                li.price_usd = price
+                li.currency = currency
+                li.refundable = refundable
+                li.terms = terms
+                li.meta = meta
+                out.append(li)
+        finally:
+            if collecting:
+                gc.enable()
+        return out
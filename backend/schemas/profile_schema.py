@@ -1,23 +1,25 @@
 from __future__ import annotations
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from decimal import Decimal
 from enum import Enum
 from typing import List, Optional, Dict, Any
 
+from backend.schemas.serialize import encoder_for
+
 class RiskTolerance(str, Enum):
     LOW = "low"
     MEDIUM = "medium"
     HIGH = "high"
 
 
-@dataclass
+@dataclass(slots=True)
 class LoyaltyProgram:
     program: str                  # e.g., "Delta SkyMiles", "Marriott Bonvoy"
     id_or_number: Optional[str] = None
     status: Optional[str] = None  # e.g., "Gold", "Platinum"
 
 
-@dataclass
+@dataclass(slots=True)
 class AccessibilityPrefs:
     mobility_assistance: bool = False
     step_free_access: bool = False
@@ -26,7 +28,7 @@ class AccessibilityPrefs:
     notes: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class PetPolicy:
     traveling_with_pet: bool = False
     pet_type: Optional[str] = None      # e.g., "dog", "cat"
@@ -35,7 +37,7 @@ class PetPolicy:
     crate_dimensions_cm: Optional[str] = None  # "LxWxH"
 
 
-@dataclass
+@dataclass(slots=True)
 class PreferenceProfile:
     user_id: str
     home_airport: Optional[str] = None           # IATA code (e.g., "MEX", "SFO")
@@ -67,15 +69,8 @@ class PreferenceProfile:
             raise ValueError("budget_band_usd must be positive when provided")
 
     def to_dict(self) -> Dict[str, Any]:
-        def _convert(obj):
-            if isinstance(obj, Decimal):
-                return str(obj)
-            if hasattr(obj, "__dict__") or isinstance(obj, (list, dict)):
-                # dataclasses.asdict handles nested dataclasses
-                return obj
-            return obj
-        d = asdict(self)
-        return d
+        """JSON-ready dict in one pass (Decimals as strings, enums as values)."""
+        return encoder_for(PreferenceProfile)(self)
 
 
 
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import dataclasses
+import json
+import typing
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Union
+
+Encoder = Callable[[Any], Dict[str, Any]]
+
+_ENCODERS: Dict[type, Encoder] = {}
+
+
+def _plain(v: Any) -> Any:
+    """JSON-ready copy of an untyped value (Dict[str, Any] fields, Any)."""
+    if isinstance(v, (str, int, float, bool)) or v is None:
+        return v.value if isinstance(v, Enum) else v
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    if isinstance(v, Enum):
+        return v.value
+    if isinstance(v, dict):
+        return {k: _plain(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_plain(x) for x in v]
+    if dataclasses.is_dataclass(v):
+        return encoder_for(type(v))(v)
+    return v
+
+
+def _optional(tp: Any) -> Any:
+    """X for Optional[X], else None."""
+    if typing.get_origin(tp) is Union:
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return None
+
+
+def _expr(tp: Any, v: str, ns: Dict[str, Any]) -> str:
+    """Python expression converting the value `v` of type `tp` to its JSON form."""
+    inner = _optional(tp)
+    if inner is not None:
+        conv = _expr(inner, v, ns)
+        return v if conv == v else f"(None if {v} is None else {conv})"
+    origin = typing.get_origin(tp)
+    if origin in (list, tuple):
+        args = typing.get_args(tp)
+        item = _expr(args[0], "x", ns) if args else "_plain(x)"
+        return f"list({v})" if item == "x" else f"[{item} for x in {v}]"
+    if isinstance(tp, type):
+        if issubclass(tp, Enum):
+            return f"{v}.value"
+        if tp in (str, int, float, bool):
+            return v
+        if issubclass(tp, (date, Decimal)):  # datetime is a date
+            return f"{v}.isoformat()" if issubclass(tp, date) else f"str({v})"
+        if dataclasses.is_dataclass(tp):
+            name = f"_enc_{tp.__name__}"
+            ns[name] = encoder_for(tp)
+            return f"{name}({v})"
+    return f"_plain({v})"
+
+
+def encoder_for(cls: type) -> Encoder:
+    """
+    Single-pass dict encoder for a dataclass, generated once from its type
+    hints: one dict literal reading each public field and converting it in
+    place (dates as ISO strings, Decimals as strings, enums as values, nested
+    dataclasses through their own encoders). Fields starting with "_" are
+    internal and left out.
+    """
+    enc = _ENCODERS.get(cls)
+    if enc is not None:
+        return enc
+    hints = typing.get_type_hints(cls)
+    ns: Dict[str, Any] = {"_plain": _plain}
+    items = []
+    for f in dataclasses.fields(cls):
+        if f.name.startswith("_"):
+            continue
+        items.append(f"{f.name!r}: {_expr(hints.get(f.name, Any), 'o.' + f.name, ns)}")
+    src = "def encode(o):\n    return {" + ", ".join(items) + "}\n"
+    exec(compile(src, f"<encoder {cls.__qualname__}>", "exec"), ns)
+    enc = _ENCODERS[cls] = ns["encode"]
+    return enc
+
+
+def to_builtins(obj: Any) -> Any:
+    """Dicts/lists/strings/numbers for a dataclass (or a structure holding them)."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return encoder_for(type(obj))(obj)
+    return _plain(obj)
+
+
+def to_json(obj: Any) -> bytes:
+    """Compact UTF-8 JSON of a dataclass via its generated encoder."""
+    return json.dumps(to_builtins(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
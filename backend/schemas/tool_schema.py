@@ -4,6 +4,8 @@ from datetime import date
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
+from backend.schemas.serialize import to_builtins
+
 class ToolName(str, Enum):
     FLIGHT_SEARCH = "flight_search"
     HOTEL_SEARCH = "hotel_search"
@@ -18,7 +20,7 @@ class ToolName(str, Enum):
 
 # ---- Generic tool call/result shells ----------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class ToolCall:
     name: ToolName
     input: Dict[str, Any]
@@ -31,7 +33,7 @@ class ToolCall:
             raise ValueError("ToolCall.name must be a ToolName enum")
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolError:
     code: str
     message: str
@@ -39,7 +41,7 @@ class ToolError:
     raw: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolResult:
     name: ToolName
     ok: bool
@@ -64,7 +66,7 @@ class CabinClass(str, Enum):
     BUSINESS = "BUSINESS"
 
 
-@dataclass
+@dataclass(slots=True)
 class FlightSegment:
     carrier: str
     flight_number: str
@@ -78,7 +80,7 @@ class FlightSegment:
     baggage_note: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FlightItinerary:
     price_total_usd: float
     refundable: bool
@@ -96,7 +98,7 @@ class FlightItinerary:
             raise ValueError("currency must be a 3-letter code")
 
 
-@dataclass
+@dataclass(slots=True)
 class FlightSearchInput:
     origin: str
     destination: str
@@ -116,7 +118,7 @@ class FlightSearchInput:
             raise ValueError("return_date cannot be earlier than depart_date")
 
 
-@dataclass
+@dataclass(slots=True)
 class FlightSearchOutput:
     itineraries: List[FlightItinerary]
     source: Optional[str] = None       # which API (e.g., "Amadeus")
@@ -128,23 +130,12 @@ class FlightSearchOutput:
 
 
 
-# def to_dict_dataclass(instance) -> Dict[str, Any]:
-#     """
-#     Safe shallow-to-deep conversion for these tool schemas.
-#     Enum values are rendered as their .value; other nested dataclasses are handled by asdict.
-#     """
-#     def _enum_to_val(x):
-#         return x.value if hasattr(x, "value") and isinstance(x, Enum) else x
-
-#     raw = asdict(instance)
-#     # Walk and convert any Enum leaves (asdict keeps Enums as Enums)
-#     def _walk(v):
-#         if isinstance(v, dict):
-#             return {k: _walk(_enum_to_val(val)) for k, val in v.items()}
-#         if isinstance(v, list):
-#             return [_walk(_enum_to_val(i)) for i in v]
-#         return _enum_to_val(v)
-#     return _walk(raw)  # type: ignore
+def to_dict_dataclass(instance) -> Dict[str, Any]:
+    """
+    JSON-ready dict for these tool schemas in one pass (generated encoder):
+    Enum values are rendered as their .value, dates as ISO strings.
+    """
+    return to_builtins(instance)
 
 
 
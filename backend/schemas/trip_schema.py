@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from typing import List, Optional, Dict, Any
 import uuid
 
+from backend.schemas.serialize import encoder_for
+
 # ENUM: Defines possible categories for trip-related line items
 class LineItemType(str, Enum):
     """Enumeration of supported travel service types within a trip."""
@@ -17,7 +19,7 @@ class LineItemType(str, Enum):
     TRANSFER = "transfer"
 
 # CLASS: LineItem
-@dataclass
+@dataclass(slots=True)
 class LineItem:
     """
     Represents a single booked or planned travel service (e.g., flight, hotel, tour).
@@ -50,7 +52,7 @@ class LineItem:
             raise ValueError("end_ts cannot be earlier than start_ts")
 
 # CLASS: ItineraryDay
-@dataclass
+@dataclass(slots=True)
 class ItineraryDay:
     """
     Represents a single day of a trip itinerary.
@@ -72,11 +74,14 @@ class ItineraryDay:
             raise ValueError("ItineraryDay.trip_id is required")
 
 # CLASS: Trip
-@dataclass
+@dataclass(slots=True)
 class Trip:
     """
     Represents a complete trip plan with metadata, itinerary days, and booked line items.
     Core object used by the vacation planner system.
+    The cost total is maintained by add_line_item/remove_line_item only. Replacing
+    entries of line_items or editing an item's price in place is not tracked;
+    call refresh_total() after such changes.
     """
     id: str
     user_id: str
@@ -90,6 +95,9 @@ class Trip:
     updated_at: datetime = field(default_factory=datetime.utcnow)
     days: List[ItineraryDay] = field(default_factory=list)  # List of daily itineraries
     line_items: List[LineItem] = field(default_factory=list) # List of services booked
+    # Running total of line_items prices, maintained by add/remove_line_item
+    _total_usd: Decimal = field(default=Decimal("0.00"), init=False, repr=False, compare=False)
+    _total_count: int = field(default=0, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         """Validates date consistency and assigns UUID if missing."""
@@ -99,8 +107,20 @@ class Trip:
             raise ValueError("Trip.user_id is required")
         if self.end_date < self.start_date:
             raise ValueError("end_date cannot be earlier than start_date")
-        if self.budget_usd <= 0:
-            raise ValueError("budget_usd must be positive")
+        # 0 means "no cap", as in compute_budget; multi-city plans build a Trip
+        # from the computed budget, whose cap_usd is 0.0 when no budget was given
+        if self.budget_usd < 0:
+            raise ValueError("budget_usd cannot be negative")
+        self._resum()
+
+    def _resum(self) -> None:
+        self._total_usd = sum((li.price_usd for li in self.line_items), Decimal("0.00"))
+        self._total_count = len(self.line_items)
+
+    def refresh_total(self) -> Decimal:
+        """Re-sums the cost total after line_items or item prices were edited directly."""
+        self._resum()
+        return self._total_usd
    
     # Derived properties
     @property
@@ -110,8 +130,14 @@ class Trip:
 
     @property
     def total_cost_usd(self) -> Decimal:
-        """Aggregates all line item prices for total trip cost."""
-        return sum((li.price_usd for li in self.line_items), Decimal("0.00"))
+        """
+        Total of line item prices as of the last add_line_item/remove_line_item
+        (or refresh_total). A direct append/delete on line_items is noticed by
+        its length; in-place replacements and price edits are not.
+        """
+        if self._total_count != len(self.line_items):
+            self._resum()
+        return self._total_usd
     
     # Mutation helpers
     def add_day(self, city: Optional[str] = None, notes: Optional[str] = None) -> ItineraryDay:
@@ -131,27 +157,27 @@ class Trip:
         """Attaches a new line item (e.g., flight, hotel) to this trip."""
         if item.trip_id != self.id:
             raise ValueError("LineItem.trip_id does not match Trip.id")
+        total = self.total_cost_usd
         self.line_items.append(item)
+        self._total_usd = total + item.price_usd
+        self._total_count += 1
         self.updated_at = datetime.utcnow()
+
+    def remove_line_item(self, item_id: str) -> Optional[LineItem]:
+        """Detaches the line item with this id; returns it, or None if it is not on the trip."""
+        for i, li in enumerate(self.line_items):
+            if li.id == item_id:
+                total = self.total_cost_usd
+                del self.line_items[i]
+                self._total_usd = total - li.price_usd
+                self._total_count -= 1
+                self.updated_at = datetime.utcnow()
+                return li
+        return None
     # Serialization helper
     def to_dict(self) -> Dict[str, Any]:
-        """Converts dataclass to dict, serializing complex types to strings."""
-        def _normalize(v):
-            if isinstance(v, datetime):
-                return v.isoformat()
-            if isinstance(v, date):
-                return v.isoformat()
-            if isinstance(v, Decimal):
-                return str(v)
-            return v
-        d = asdict(self)
-        # Normalize nested values for JSON compatibility
-        for k, v in list(d.items()):
-            if isinstance(v, list):
-                d[k] = [{kk: _normalize(vv) for kk, vv in item.items()} for item in v]  # type: ignore
-            else:
-                d[k] = _normalize(v)
-        return d
+        """Converts to a JSON-ready dict in one pass (dates/Decimals as strings, enums as values)."""
+        return encoder_for(Trip)(self)
     
 
 
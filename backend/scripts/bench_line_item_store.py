@@ -0,0 +1,107 @@
+# scripts/bench_line_item_store.py
+"""
+LineItemStore benchmark: bulk analytics over many trips' line items.
+
+Builds the columnar store from trips, then times group-by totals (type,
+vendor, date), a date-range filter and the conversion back to LineItem,
+against the same queries as Python loops over the LineItem objects (the
+results are checked to agree exactly). Needs numpy (`.[analytics]`).
+
+    python -m backend.scripts.bench_line_item_store [--items 1000000] [--per-trip 200] [--max-seconds 10]
+Exit code 1 if build + queries + conversion take longer than --max-seconds.
+"""
+import argparse
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from backend.schemas.line_item_store import LineItemStore
+from backend.schemas.trip_schema import LineItem, LineItemType, Trip
+
+TYPES = list(LineItemType)
+
+
+def make_trips(n: int, per_trip: int) -> list:
+    t0 = datetime(2026, 1, 1, 8)
+    trips = []
+    for t in range(0, n, per_trip):
+        trip = Trip(id=f"trip-{t // per_trip}", user_id="user-bench", title="bench", origin="JFK",
+                    destination="ROM", start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+                    budget_usd=Decimal("1000000"))
+        for i in range(t, min(t + per_trip, n)):
+            start = t0 + timedelta(hours=i % 8760) if i % 20 else None
+            trip.add_line_item(LineItem(
+                id=f"li-{i}", trip_id=trip.id, type=TYPES[i % len(TYPES)], vendor=f"vendor-{i % 500}",
+                start_ts=start, end_ts=start and start + timedelta(hours=2),
+                price_usd=Decimal(f"{10 + i % 900}.{i % 100:02d}"), refundable=bool(i % 2),
+            ))
+        trips.append(trip)
+    return trips
+
+
+def timed(label: str, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:<28} {elapsed * 1000:9.1f}ms")
+    return out, elapsed
+
+
+def loop_totals(items, key) -> dict:
+    out = defaultdict(lambda: Decimal("0.00"))
+    for li in items:
+        out[key(li)] += li.price_usd
+    return dict(out)
+
+
+def main(args: argparse.Namespace) -> int:
+    trips = make_trips(args.items, args.per_trip)
+    items = [li for t in trips for li in t.line_items]
+    lo, hi = date(2026, 3, 1), date(2026, 5, 31)
+    print(f"items={len(items)} trips={len(trips)}")
+
+    print("python loops over LineItem:")
+    by_type, t_loop = timed("totals by type", lambda: loop_totals(items, lambda li: li.type.value))
+    by_vendor, t = timed("totals by vendor", lambda: loop_totals(items, lambda li: li.vendor))
+    t_loop += t
+    by_day, t = timed("totals by date", lambda: loop_totals(
+        items, lambda li: li.start_ts.date() if li.start_ts else None))
+    t_loop += t
+    in_range, t = timed("date-range filter", lambda: [
+        li for li in items if li.start_ts and lo <= li.start_ts.date() <= hi])
+    t_loop += t
+
+    print("LineItemStore:")
+    store, total = timed("build from trips", lambda: LineItemStore.from_trips(trips))
+    s_type, t = timed("totals by type", lambda: store.totals_by("type"))
+    total += t
+    s_vendor, t = timed("totals by vendor", lambda: store.totals_by("vendor"))
+    total += t
+    s_day, t = timed("totals by date", lambda: store.totals_by("date"))
+    total += t
+    _, t = timed("totals by type+vendor+date", lambda: store.group_totals("type", "vendor", "date"))
+    total += t
+    window, t = timed("date-range filter", lambda: store.filter(start=lo, end=hi))
+    total += t
+    back, t = timed("to_line_items", store.to_line_items)
+    total += t
+
+    assert s_type == by_type and s_vendor == by_vendor and s_day == by_day, "totals disagree"
+    assert len(window) == len(in_range) and window.total_usd() == sum(li.price_usd for li in in_range)
+    assert [li.id for li in back] == [li.id for li in items] and back[-1] == items[-1]
+    print(f"loops {t_loop:.2f}s (queries only); store {total:.2f}s (build, queries and conversion)")
+    if total > args.max_seconds:
+        print(f"FAIL: {total:.2f}s > {args.max_seconds}s")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--per-trip", type=int, default=200, help="line items per trip")
+    ap.add_argument("--max-seconds", type=float, default=10.0)
+    sys.exit(main(ap.parse_args()))
@@ -0,0 +1,122 @@
+# scripts/bench_trip_schema.py
+"""
+Trip schema benchmark: serialization, cost totals and memory on trips with
+thousands of line items.
+
+Compares the generated single-pass encoder (Trip.to_dict) with the previous
+dataclasses.asdict + normalize walk, the running cost total with re-summing
+every LineItem per access, and reports memory per LineItem (slots).
+
+    python -m backend.scripts.bench_trip_schema [--items 1000,5000,20000] [--repeat 5] [--min-speedup 2]
+Exit code 1 if to_dict is less than --min-speedup times faster than the old path.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from backend.schemas.serialize import to_json
+from backend.schemas.trip_schema import LineItem, LineItemType, Trip
+
+TYPES = list(LineItemType)
+
+
+def make_trip(n: int) -> Trip:
+    start = date(2026, 6, 1)
+    trip = Trip(id="trip-bench", user_id="user-bench", title="bench", origin="JFK", destination="ROM",
+                start_date=start, end_date=start + timedelta(days=13), budget_usd=Decimal("50000"))
+    for d in range(14):
+        trip.add_day(city="ROM", notes=f"day {d + 1}")
+    t0 = datetime(2026, 6, 1, 8)
+    for i in range(n):
+        trip.add_line_item(LineItem(
+            id=f"li-{i}", trip_id=trip.id, type=TYPES[i % len(TYPES)], vendor=f"vendor-{i % 50}",
+            ref=f"REF{i}", start_ts=t0 + timedelta(hours=i % 300), end_ts=t0 + timedelta(hours=i % 300 + 2),
+            price_usd=Decimal(f"{10 + i % 900}.{i % 100:02d}"), refundable=bool(i % 2),
+            terms={"cancellation": "free until 48h before"}, meta={"seat": "12A"} if i % 3 == 0 else {},
+        ))
+    return trip
+
+
+def legacy_to_dict(trip: Trip) -> dict:
+    """The previous Trip.to_dict: asdict (deep copy) and a second normalizing walk."""
+    def _normalize(v):
+        if isinstance(v, (datetime, date)):
+            return v.isoformat()
+        if isinstance(v, Decimal):
+            return str(v)
+        return v
+    d = asdict(trip)
+    d.pop("_total_usd", None)
+    d.pop("_total_count", None)
+    for k, v in list(d.items()):
+        if isinstance(v, list):
+            d[k] = [{kk: _normalize(vv) for kk, vv in item.items()} for item in v]
+        else:
+            d[k] = _normalize(v)
+    return d
+
+
+def legacy_total(trip: Trip) -> Decimal:
+    return sum((li.price_usd for li in trip.line_items), Decimal("0.00"))
+
+
+def best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def bytes_per_item(n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    trip = make_trip(n)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del trip
+    return used / n
+
+
+def main(args: argparse.Namespace) -> int:
+    worst = float("inf")
+    for n in [int(x) for x in args.items.split(",") if x]:
+        trip = make_trip(n)
+        new = trip.to_dict()
+        old = legacy_to_dict(trip)
+        assert json.dumps(new, default=str) == json.dumps(old, default=str), "encoders disagree"
+        assert trip.total_cost_usd == legacy_total(trip)
+
+        t_old = best(lambda: legacy_to_dict(trip), args.repeat)
+        t_new = best(trip.to_dict, args.repeat)
+        t_json_old = best(lambda: json.dumps(legacy_to_dict(trip), default=str), args.repeat)
+        t_json_new = best(lambda: to_json(trip), args.repeat)
+        t_sum_old = best(lambda: [legacy_total(trip) for _ in range(100)], args.repeat) / 100
+        t_sum_new = best(lambda: [trip.total_cost_usd for _ in range(100)], args.repeat) / 100
+        speedup = t_old / t_new
+        worst = min(worst, speedup)
+        print(f"items={n:>6}  to_dict {t_old * 1000:8.2f}ms -> {t_new * 1000:7.2f}ms ({speedup:4.1f}x)  "
+              f"json {t_json_old * 1000:8.2f}ms -> {t_json_new * 1000:7.2f}ms ({t_json_old / t_json_new:4.1f}x)  "
+              f"total_cost {t_sum_old * 1e6:9.1f}us -> {t_sum_new * 1e6:5.2f}us")
+    print(f"memory: {bytes_per_item(args.memory_items):.0f} bytes per LineItem (incl. ids, dicts, Decimal)")
+    if worst < args.min_speedup:
+        print(f"FAIL: to_dict speedup {worst:.1f}x < {args.min_speedup}x")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--items", default="1000,5000,20000", help="comma-separated line-item counts")
+    ap.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    ap.add_argument("--memory-items", type=int, default=20000)
+    ap.add_argument("--min-speedup", type=float, default=2.0)
+    sys.exit(main(ap.parse_args()))
@@ -0,0 +1,55 @@
+"""
+Direct-mode helpers: trip parameters from loose input and the computed budget.
+"""
+import pytest
+
+from backend.orchestrator.critic_checks import check_budget
+from backend.orchestrator.direct import MAX_HOTELS, compute_budget, rebudget, to_usd, trip_params
+
+
+def _offers(*prices):
+    return {"offers": [{"total": t, "currency": c} for t, c in prices]}
+
+
+def test_to_usd():
+    assert to_usd(100.0, "usd", {}) == 100.0
+    assert to_usd(100.0, "EUR", {"EUR": 1.1}) == pytest.approx(110.0)
+    assert to_usd(100.0, "EUR", {}) is None
+    assert to_usd(None, "USD", {}) is None
+
+
+def test_budget_under_near_over():
+    lodging = [{"total": "300", "currency": "USD"}]
+    assert compute_budget(2000, _offers(("500", "USD")), lodging, [], {})["status"] == "under"
+    assert compute_budget(820, _offers(("500", "USD")), lodging, [], {})["status"] == "near"
+    over = compute_budget(500, _offers(("500", "USD"), ("450", "EUR")), lodging, [], {"EUR": 1.0})
+    assert over["status"] == "over"
+    assert over["breakdown"]["flights_usd"] == 450.0 and over["delta_usd"] == -250.0
+
+
+def test_price_without_fx_rate_makes_the_budget_unknown():
+    budget = compute_budget(1000, _offers(("900", "EUR")), [{"total": "100", "currency": "USD"}],
+                            [{"price": 20, "currency": "GBP"}], {})
+    assert budget["status"] == "unknown"
+    assert budget["missing_fx"] == ["EUR", "GBP"]
+    assert budget["delta_usd"] == 0.0
+    assert budget["breakdown"] == {"flights_usd": 0.0, "lodging_usd": 100.0, "activities_usd": 0.0}
+
+    findings = check_budget({"budget": budget})
+    assert [f["check"] for f in findings] == ["budget"] and "EUR, GBP" in findings[0]["issue"]
+
+    assert rebudget(budget, 50)["status"] == "unknown"
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 1), ("", 1), ("2", 2), (3.0, 3), ("two", 1), ("0", 1), (-4, 1), ([2], 1),
+])
+def test_adults_from_loose_input(value, expected):
+    assert trip_params({"trip": {"adults": value}})["adults"] == expected
+
+
+def test_bad_result_counts_fall_back_to_defaults():
+    p = trip_params({"max_results_flights": "lots", "max_results_hotels": "0"})
+    assert p["max_results_flights"] == 12
+    assert p["max_results_hotels"] == MAX_HOTELS
+    assert trip_params({"max_results_flights": "8"})["max_results_flights"] == 8
@@ -0,0 +1,110 @@
+"""
+Response shaping: sparse fields, content negotiation and ETag revalidation.
+"""
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+
+from backend.utils import encoding
+from backend.utils.encoding import choose_encoding, make_etag, negotiated, select_fields
+
+DOC = {
+    "ok": True,
+    "result": {
+        "budget": {"total_usd": 900.0, "status": "under"},
+        "flight_options": {"offers": [
+            {"id": "a", "total": "500", "segments": [{"carrier": "AF"}]},
+            {"id": "b", "total": "450"},
+        ]},
+    },
+}
+
+
+def _request(**headers) -> Request:
+    raw = [(k.replace("_", "-").lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_no_fields_returns_the_document():
+    assert select_fields(DOC, None) is DOC
+    assert select_fields(DOC, " , ") is DOC
+
+
+def test_select_fields_through_lists_and_merged_paths():
+    out = select_fields(DOC, "result.budget.status, result.flight_options.offers.total,"
+                             "result.flight_options.offers.id")
+    assert out == {"result": {
+        "budget": {"status": "under"},
+        "flight_options": {"offers": [{"total": "500", "id": "a"}, {"total": "450", "id": "b"}]},
+    }}
+
+
+def test_select_fields_ignores_unknown_paths_and_list_elements_without_a_match():
+    assert select_fields(DOC, "result.nope,missing") == {}
+    out = select_fields(DOC, "result.flight_options.offers.segments.carrier")
+    assert out == {"result": {"flight_options": {"offers": [{"segments": [{"carrier": "AF"}]}]}}}
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("deflate, gzip;q=0.5", "gzip"),
+])
+def test_choose_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(encoding, "brotli", None)
+    assert choose_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, *", "gzip"),
+    ("*", "br"),
+])
+def test_choose_encoding_prefers_brotli_when_installed(monkeypatch, header, expected):
+    monkeypatch.setattr(encoding, "brotli", object())
+    assert choose_encoding(header) == expected
+
+
+def test_etag_includes_the_content_coding():
+    assert make_etag(b"x") != make_etag(b"x", "gzip")
+    assert make_etag(b"x", "gzip").endswith('-gzip"')
+
+
+def test_negotiated_json_with_gzip(monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)
+    monkeypatch.setattr(encoding, "RESPONSE_COMPRESS_MIN_BYTES", 10)
+    resp = negotiated(_request(accept_encoding="gzip"), DOC, fields="result.budget")
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(resp.body)) == {"result": {"budget": DOC["result"]["budget"]}}
+
+
+def test_small_bodies_are_not_compressed(monkeypatch):
+    monkeypatch.setattr(encoding, "RESPONSE_COMPRESS_MIN_BYTES", 10_000)
+    resp = negotiated(_request(accept_encoding="gzip"), DOC)
+    assert "content-encoding" not in resp.headers
+    assert json.loads(resp.body) == DOC
+
+
+def test_matching_if_none_match_gets_304(monkeypatch):
+    monkeypatch.setattr(encoding, "RESPONSE_COMPRESS_MIN_BYTES", 10_000)
+    first = negotiated(_request(), DOC, etag=True)
+    tag = first.headers["etag"]
+    assert first.status_code == 200
+
+    again = negotiated(_request(if_none_match=tag), DOC, etag=True)
+    assert again.status_code == 304 and again.body == b""
+    assert again.headers["etag"] == tag
+
+    assert negotiated(_request(if_none_match=f'W/{tag}, "other"'), DOC, etag=True).status_code == 304
+    changed = {**DOC, "ok": False}
+    assert negotiated(_request(if_none_match=tag), changed, etag=True).status_code == 200
+    assert negotiated(_request(if_none_match=tag), DOC).status_code == 200  # no ETag requested
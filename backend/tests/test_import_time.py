@@ -0,0 +1,57 @@
+"""
+Cold-start import of the API.
+
+Imports the app in fresh interpreters and checks the median wall time against
+IMPORT_TIME_BUDGET_MS. Heavy modules (Agents SDK, openai, requests, data
+libraries) are loaded on first use, so importing the app must not pull them in.
+"""
+import json
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+import pytest
+
+from backend.config.settings import IMPORT_TIME_BUDGET_MS
+
+pytest.importorskip("fastapi")  # the app itself needs its runtime dependencies
+
+MODULE = "backend.main"
+RUNS = 5
+
+# Loaded on first use, never by importing the app
+FORBIDDEN = ("agents", "openai", "requests", "pandas", "faiss", "numpy")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": ms, "loaded": [m for m in {forbid!r} if m in sys.modules]}}))
+"""
+
+
+def _probe(module: str, forbid: Tuple[str, ...]) -> Tuple[float, List[str]]:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, forbid=forbid)],
+        capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, f"importing {module} failed:\n{proc.stderr[-2000:]}"
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result["ms"], result["loaded"]
+
+
+@pytest.fixture(scope="module")
+def runs() -> List[Tuple[float, List[str]]]:
+    return [_probe(MODULE, FORBIDDEN) for _ in range(RUNS)]
+
+
+def test_app_import_does_not_load_heavy_modules(runs):
+    loaded = sorted({m for _, lm in runs for m in lm})
+    assert not loaded, f"importing {MODULE} loaded {', '.join(loaded)} (should load on first use)"
+
+
+def test_app_import_within_budget(runs):
+    median = statistics.median(ms for ms, _ in runs)
+    assert median <= IMPORT_TIME_BUDGET_MS, f"cold-start import {median:.0f}ms > {IMPORT_TIME_BUDGET_MS:.0f}ms"
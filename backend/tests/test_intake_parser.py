@@ -0,0 +1,59 @@
+"""Rule-based intake parser: what it takes from a line and what it leaves for the model."""
+from datetime import date
+
+import pytest
+
+from backend.llm.intake_parser import parse_line
+
+TODAY = date(2026, 1, 15)
+
+
+def test_full_line_is_parsed_without_the_model():
+    r = parse_line("from NYC to Paris June 3-10 for 2 adults, budget $3000", today=TODAY)
+    assert r.fields == {
+        "start_date": "2026-06-03", "end_date": "2026-06-10", "origin": "JFK", "destination": "CDG",
+        "adults": 2, "budget_usd": 3000, "currency": "USD",
+    }
+    assert r.complete
+
+
+def test_unkeyed_place_before_destination_is_the_origin():
+    r = parse_line("SFO to ROM", today=TODAY)
+    assert r.fields == {"origin": "SFO", "destination": "ROM"}
+    assert r.complete
+
+
+@pytest.mark.parametrize("line, fields, left", [
+    ("SFO to LAX to ROM", {"origin": "SFO", "destination": "LAX"}, "ROM"),
+    ("to Rome or to Paris", {"destination": "FCO"}, "Paris"),
+    ("from SFO from LAX to ROM", {"origin": "SFO", "destination": "ROM"}, "LAX"),
+])
+def test_extra_place_for_a_taken_field_stays_in_the_residual(line, fields, left):
+    r = parse_line(line, today=TODAY)
+    assert r.fields == fields
+    assert left in r.residual
+    assert not r.complete
+
+
+def test_excluded_place_is_not_the_origin():
+    r = parse_line("to ROM, not LAX", today=TODAY)
+    assert r.fields.get("destination") == "ROM"
+    assert "origin" not in r.fields
+    assert "LAX" in r.residual
+
+
+@pytest.mark.parametrize("line, non_stop", [
+    ("nonstop please", True),
+    ("flights to ROM, but not nonstop", False),
+    ("no need for direct flights", False),
+])
+def test_nonstop_preference(line, non_stop):
+    assert parse_line(line, today=TODAY).fields["non_stop"] is non_stop
+
+
+def test_currency_only_set_for_explicit_dollars():
+    assert parse_line("budget is 2000", today=TODAY).fields.get("currency") is None
+    assert parse_line("budget $2000", today=TODAY).fields["currency"] == "USD"
+    r = parse_line("budget is 2000 euros", today=TODAY)
+    assert "budget_usd" not in r.fields
+    assert "2000" in r.residual
@@ -0,0 +1,85 @@
+"""
+Per-session intake batching: a lone request is not delayed, a burst shares
+one orchestrator call and a failing request does not fail its batch-mates.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.orchestrator.intake_queue import IntakeBatcher, SessionNotFound
+
+WINDOW_S = 0.3
+
+
+class FakeOrchestrator:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.version = 0
+        self.state = {"lines": []}
+
+    async def apply_lines(self, lines):
+        self.calls.append(list(lines))
+        await asyncio.sleep(self.delay)
+        if any(line == "bad" for line in lines):
+            raise ValueError("cannot apply 'bad'")  # before commit: the state is unchanged
+        self.state = {"lines": self.state["lines"] + list(lines)}
+        self.version += 1
+        return dict(self.state)
+
+
+def _session(orch):
+    saved = []
+    return (lambda: orch), saved.append, saved
+
+
+@pytest.mark.asyncio
+async def test_lone_request_is_applied_without_waiting_for_the_window():
+    orch = FakeOrchestrator()
+    load, save, saved = _session(orch)
+    t0 = time.perf_counter()
+    out = await IntakeBatcher(WINDOW_S).submit("s1", ["to Rome"], load, save)
+    assert time.perf_counter() - t0 < WINDOW_S / 2
+    assert out == {"state": {"lines": ["to Rome"]}, "version": 1, "batched": 1}
+    assert saved == [orch]
+
+
+@pytest.mark.asyncio
+async def test_requests_queued_behind_a_batch_share_one_call():
+    orch = FakeOrchestrator(delay=0.05)
+    load, save, _ = _session(orch)
+    batcher = IntakeBatcher(0.01)
+    first = asyncio.create_task(batcher.submit("s1", ["a"], load, save))
+    await asyncio.sleep(0.01)  # "a" is in flight
+    rest = await asyncio.gather(*(batcher.submit("s1", [line], load, save) for line in ("b", "c", "d")))
+
+    assert orch.calls == [["a"], ["b", "c", "d"]]
+    assert (await first)["version"] == 1
+    assert all(out["version"] == 2 and out["batched"] == 3 for out in rest)
+    assert batcher._drains == {} and batcher._pending == {}
+
+
+@pytest.mark.asyncio
+async def test_only_the_failing_request_gets_the_error():
+    orch = FakeOrchestrator(delay=0.02)
+    load, save, _ = _session(orch)
+    batcher = IntakeBatcher(0.0)
+    first = asyncio.create_task(batcher.submit("s1", ["a"], load, save))
+    await asyncio.sleep(0.005)
+    results = await asyncio.gather(*(batcher.submit("s1", [line], load, save) for line in ("b", "bad", "c")),
+                                   return_exceptions=True)
+    await first
+
+    assert orch.calls == [["a"], ["b", "bad", "c"], ["b"], ["bad"], ["c"]]
+    assert results[0]["state"] == {"lines": ["a", "b"]}
+    assert isinstance(results[1], ValueError)
+    assert results[2]["state"] == {"lines": ["a", "b", "c"]} and results[2]["batched"] == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_session_fails_every_request():
+    batcher = IntakeBatcher(0.0)
+    results = await asyncio.gather(*(batcher.submit("gone", [line], lambda: None, lambda o: None)
+                                     for line in ("a", "b")), return_exceptions=True)
+    assert all(isinstance(r, SessionNotFound) for r in results)
@@ -0,0 +1,148 @@
+"""
+SQLite job queue: claims, leases, retry exhaustion and the long-poll.
+
+Stores use a temporary database file; the queue runs a stand-in pipeline.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.orchestrator.jobs import JobQueue, JobStatus, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = JobStore(str(tmp_path / "jobs.db"), lease_s=30, max_attempts=2)
+    yield s
+    s.close()
+
+
+def test_claims_oldest_first(store):
+    first = store.enqueue("s1", {"n": 1})
+    second = store.enqueue("s2", {"n": 2}, {"mode": "direct"})
+
+    job = store.claim_next()
+    assert job["job_id"] == first
+    assert job["status"] == JobStatus.RUNNING.value
+    assert job["attempts"] == 1
+    assert job["lease_owner"]
+
+    job = store.claim_next()
+    assert job["job_id"] == second and job["options"] == {"mode": "direct"}
+    assert store.claim_next() is None
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_owner_is_ignored(store):
+    job_id = store.enqueue("s1", {})
+    stale = store.claim_next()
+    assert store.claim_next() is None  # lease still held
+
+    store.lease_s = -1  # the next claim's lease is already expired
+    assert store.renew(job_id, stale["lease_owner"])
+    fresh = store.claim_next()
+    assert fresh["job_id"] == job_id and fresh["attempts"] == 2
+    assert fresh["lease_owner"] != stale["lease_owner"]
+
+    store.lease_s = 30
+    assert not store.renew(job_id, stale["lease_owner"])
+    assert not store.record_stage(job_id, stale["lease_owner"], "flights", {"n": 1})
+    assert not store.finish(job_id, stale["lease_owner"], {"from": "stale"})
+    assert not store.fail(job_id, stale["lease_owner"], "stale")
+    assert store.get(job_id)["status"] == JobStatus.RUNNING.value
+
+    assert store.record_stage(job_id, fresh["lease_owner"], "flights", {"n": 2})
+    assert store.finish(job_id, fresh["lease_owner"], {"from": "fresh"})
+    done = store.get(job_id)
+    assert done["status"] == JobStatus.SUCCEEDED.value
+    assert done["result"] == {"from": "fresh"} and done["partial"] == {"flights": {"n": 2}}
+    assert not store.renew(job_id, fresh["lease_owner"])
+
+
+def test_exhausted_job_is_failed_and_the_next_one_claimed(store):
+    store.lease_s = -1
+    dead = store.enqueue("s1", {})
+    store.claim_next()
+    store.claim_next()  # second and last attempt
+    live = store.enqueue("s2", {})
+
+    job = store.claim_next()
+    assert job["job_id"] == live
+    failed = store.get(dead)
+    assert failed["status"] == JobStatus.FAILED.value
+    assert failed["error"] == "max attempts exceeded"
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wakes_on_a_stage_and_cleans_up(store):
+    stage_seen = asyncio.Event()
+    release = asyncio.Event()
+
+    async def runner(state, on_stage, **options):
+        await on_stage("flights", {"n": 1})
+        stage_seen.set()
+        await release.wait()
+        return {"ok": True}
+
+    queue = JobQueue(store, runner, workers=1, poll_interval_s=5.0)
+    job_id = await queue.submit("s1", {})
+    queued = await queue.get(job_id)
+    await queue.start()
+    try:
+        t0 = time.monotonic()
+        job = await queue.wait(job_id, timeout_s=5.0)
+        assert time.monotonic() - t0 < 2.0
+        assert job["updated_at"] != queued["updated_at"]
+        await stage_seen.wait()
+        job = await queue.get(job_id)
+        assert job["partial"] == {"flights": {"n": 1}}
+        assert queue._updates == {}
+
+        waiter = asyncio.create_task(queue.wait(job_id, timeout_s=5.0))
+        await asyncio.sleep(0.05)
+        assert job_id in queue._updates
+        release.set()
+        job = await asyncio.wait_for(waiter, 2.0)
+        assert job["status"] == JobStatus.SUCCEEDED.value
+        assert queue._updates == {}
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_long_poll_leaves_no_entry(store):
+    queue = JobQueue(store, None, workers=1, poll_interval_s=0.02)
+    job_id = await queue.submit("s1", {})
+    job = await queue.wait(job_id, timeout_s=0.1)
+    assert job["status"] == JobStatus.QUEUED.value
+    assert queue._updates == {}
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_a_failing_claim(store, monkeypatch):
+    real_claim = store.claim_next
+    calls = []
+
+    def flaky_claim():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return real_claim()
+
+    async def runner(state, on_stage, **options):
+        return {"ok": True}
+
+    monkeypatch.setattr(store, "claim_next", flaky_claim)
+    queue = JobQueue(store, runner, workers=1, poll_interval_s=0.02)
+    job_id = await queue.submit("s1", {})
+    await queue.start()
+    try:
+        for _ in range(100):
+            job = await queue.get(job_id)
+            if job["status"] in (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value):
+                break
+            await asyncio.sleep(0.02)
+        assert job["status"] == JobStatus.SUCCEEDED.value
+        assert len(calls) >= 2
+    finally:
+        await queue.stop()
@@ -0,0 +1,119 @@
+"""
+Columnar line-item store: every query agrees exactly with a plain loop over
+the LineItem objects, and to_line_items round-trips them.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from backend.schemas.line_item_store import LineItemStore  # noqa: E402
+from backend.schemas.trip_schema import LineItem, LineItemType  # noqa: E402
+
+T0 = datetime(2026, 3, 1, 22, 30)
+
+
+def _items():
+    return [
+        LineItem(id="f1", trip_id="t1", type=LineItemType.FLIGHT, vendor="AF", ref="ABC123",
+                 start_ts=T0, end_ts=T0 + timedelta(hours=9), price_usd=Decimal("640.10"),
+                 refundable=True, meta={"cabin": "economy"}),
+        LineItem(id="h1", trip_id="t1", type=LineItemType.HOTEL, vendor="Hotel Roma",
+                 start_ts=T0 + timedelta(days=1), end_ts=T0 + timedelta(days=4),
+                 price_usd=Decimal("899.995"), currency="EUR", terms={"cancel_by": "2026-02-20"}),
+        LineItem(id="a1", trip_id="t1", type="activity", vendor=None, price_usd=Decimal("25")),
+        LineItem(id="f2", trip_id="t2", type=LineItemType.FLIGHT, vendor="AF",
+                 start_ts=datetime(2026, 3, 2, 1, 0, tzinfo=timezone(timedelta(hours=5))),
+                 price_usd=Decimal("300.50")),
+        LineItem(id="r1", trip_id="t2", type=LineItemType.RAIL, vendor="Trenitalia",
+                 start_ts=T0 + timedelta(hours=2), price_usd=Decimal("0.01")),
+    ]
+
+
+def _day(li):
+    ts = li.start_ts
+    if ts is None:
+        return None
+    return (ts.astimezone(timezone.utc) if ts.tzinfo else ts).date()
+
+
+def _key(li, k):
+    return {"type": lambda: LineItemType(li.type).value, "vendor": lambda: li.vendor,
+            "currency": lambda: li.currency, "trip": lambda: li.trip_id, "date": lambda: _day(li)}[k]()
+
+
+def _cents(price):
+    return price.quantize(Decimal("0.01"), rounding="ROUND_HALF_EVEN")
+
+
+@pytest.fixture
+def store():
+    return LineItemStore.from_items(_items())
+
+
+def test_total(store):
+    assert len(store) == 5
+    assert store.total_usd() == sum(_cents(li.price_usd) for li in _items())
+
+
+@pytest.mark.parametrize("keys", [("type",), ("vendor",), ("currency",), ("trip",), ("date",),
+                                  ("type", "vendor"), ("trip", "date", "type")])
+def test_group_totals_match_a_loop(store, keys):
+    expected = defaultdict(lambda: [Decimal("0.00"), 0])
+    for li in _items():
+        row = expected[tuple(_key(li, k) for k in keys)]
+        row[0] += _cents(li.price_usd)
+        row[1] += 1
+
+    rows = store.group_totals(*keys)
+    got = {tuple(r[k] for k in keys): [r["total_usd"], r["items"]] for r in rows}
+    assert got == dict(expected)
+    assert len(rows) == len(expected)
+
+
+def test_dates_use_utc_for_aware_timestamps(store):
+    by_date = store.totals_by("date")
+    # f2 departs 01:00 at UTC+5, i.e. on 2026-03-01 in UTC; r1 (naive) is 2026-03-02 00:30
+    assert by_date[date(2026, 3, 1)] == Decimal("940.60")
+    assert by_date[date(2026, 3, 2)] == Decimal("900.01")
+    assert by_date[None] == Decimal("25.00")
+
+
+def test_totals_by_keys(store):
+    assert store.totals_by("type")["flight"] == Decimal("940.60")
+    assert store.totals_by("trip", "type")[("t2", "rail")] == Decimal("0.01")
+    with pytest.raises(ValueError):
+        store.group_totals("price")
+
+
+def test_filter(store):
+    march_1 = store.filter(start=date(2026, 3, 1), end=date(2026, 3, 1))
+    assert sorted(li.id for li in march_1.to_line_items()) == ["f1", "f2"]
+
+    assert len(store.filter(start=date(2026, 1, 1))) == 4  # a1 has no start_ts
+    assert [li.id for li in store.filter(types=["flight"], trips=["t2"]).to_line_items()] == ["f2"]
+    assert [li.id for li in store.filter(vendors=[None]).to_line_items()] == ["a1"]
+    assert len(store.filter(currencies=["GBP"])) == 0
+    assert store.filter(types=[LineItemType.HOTEL]).total_usd() == Decimal("900.00")
+
+
+def test_to_line_items_round_trips(store):
+    for before, after in zip(_items(), store.to_line_items()):
+        assert after.price_usd == _cents(before.price_usd)
+        assert after.type is LineItemType(before.type)
+        for attr in ("id", "trip_id", "vendor", "ref", "end_ts", "currency", "refundable", "terms", "meta"):
+            assert getattr(after, attr) == getattr(before, attr), attr
+        assert after.start_ts == before.start_ts
+    aware = store.filter(trips=["t2"], types=["flight"]).to_line_items()[0]
+    assert aware.start_ts.tzinfo is timezone.utc
+
+
+def test_empty_store():
+    empty = LineItemStore.from_items([])
+    assert len(empty) == 0
+    assert empty.group_totals("type") == []
+    assert empty.total_usd() == Decimal("0.00")
+    assert empty.to_line_items() == []
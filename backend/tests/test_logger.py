@@ -0,0 +1,69 @@
+"""
+Payload logging: unsampled calls only count items; the payload is
+serialized only for sampled categories.
+"""
+import logging
+
+import pytest
+
+from backend.utils import logger as log_mod
+from backend.utils.logger import log_payload, payload_summary
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def capture(monkeypatch):
+    monkeypatch.setattr(log_mod, "LOG_FORMAT", "json")
+    lg = logging.getLogger("backend.tests.payload")
+    lg.setLevel(logging.INFO)
+    lg.propagate = False
+    handler = Capture()
+    lg.addHandler(handler)
+    yield lg, handler.records
+    lg.removeHandler(handler)
+
+
+def test_payload_summary_counts_items():
+    payload = {"offers": [1, 2, 3], "currency": "USD", "count": 3, "meta": {"a": 1}}
+    assert payload_summary(payload) == {
+        "type": "dict", "items": 4, "sizes": {"offers": 3, "currency": 3, "meta": 1},
+    }
+    assert payload_summary([1, 2]) == {"type": "list", "items": 2}
+    assert payload_summary(None) == {"type": "NoneType"}
+
+
+def test_payload_summary_reports_a_bounded_number_of_keys():
+    big = {f"k{i}": [i] for i in range(100)}
+    assert len(payload_summary(big)["sizes"]) == log_mod.SUMMARY_MAX_KEYS
+
+
+def test_unsampled_payload_is_not_serialized(capture, monkeypatch):
+    lg, records = capture
+    monkeypatch.setattr(log_mod, "SAMPLE_RATES", {})
+
+    def no_dumps(*args, **kwargs):
+        raise AssertionError("payload serialized on the hot path")
+
+    monkeypatch.setattr(log_mod.json, "dumps", no_dumps)
+    log_payload(lg, "stage_output", "FLIGHT output", {"offers": [1, 2]}, stage="flights")
+    (record,) = records
+    assert record.payload == {"type": "dict", "items": 1, "sizes": {"offers": 2}}
+    assert record.stage == "flights"
+
+
+def test_sampled_payload_carries_the_capped_body(capture, monkeypatch):
+    lg, records = capture
+    monkeypatch.setattr(log_mod, "SAMPLE_RATES", {"tool_payload": 1.0})
+    monkeypatch.setattr(log_mod, "LOG_PAYLOAD_MAX_CHARS", 10)
+    log_payload(lg, "tool_payload", "hotels", {"hotels": ["a" * 50]})
+    (record,) = records
+    assert record.payload["body"].endswith("...(truncated)")
+    assert len(record.payload["body"]) == 10 + len("...(truncated)")
@@ -0,0 +1,81 @@
+"""
+Event-loop lag of the tool layer.
+
+Concurrent "sessions" run a flight, hotel and activity search against local
+stand-ins for Amadeus (a blocking sleep) while a ticker measures how late
+the loop wakes it up. The blocking work must stay in the tool pool.
+"""
+import asyncio
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from backend.tools import async_tools
+from backend.tools.search_cache import SEARCH_CACHE
+
+SESSIONS = 20
+LATENCY_S = 0.2
+MAX_LAG_MS = 50.0
+
+
+def _stand_in(kind: str, latency: float):
+    def search(**kwargs):
+        time.sleep(latency)  # blocking, like requests
+        return [{"kind": kind, "i": i} for i in range(int(kwargs.get("max_results") or 3))]
+    return search
+
+
+async def _ticker(stop: asyncio.Event, interval: float, lags: list) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - t0 - interval))
+
+
+async def _session(i: int) -> None:
+    day = (date.today() + timedelta(days=30 + i)).isoformat()
+    end = (date.today() + timedelta(days=35 + i)).isoformat()
+    await asyncio.gather(
+        async_tools.search_flights_async(origin="JFK", destination="PAR", depart_date=day, return_date=end),
+        async_tools.search_hotels_async(city="PAR", check_in=day, check_out=end),
+        async_tools.search_activities_async(city_code="PAR", for_date=day),
+    )
+
+
+@pytest.fixture
+def stand_ins(monkeypatch):
+    monkeypatch.setattr(async_tools, "search_flights", _stand_in("flight", LATENCY_S))
+    monkeypatch.setattr(async_tools, "search_hotels", _stand_in("hotel", LATENCY_S))
+    monkeypatch.setattr(async_tools, "search_activities", _stand_in("activity", LATENCY_S))
+    SEARCH_CACHE.clear()
+    yield
+    SEARCH_CACHE.clear()
+
+
+@pytest.mark.asyncio
+async def test_tool_searches_do_not_block_the_loop(stand_ins):
+    lags: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(stop, 0.005, lags))
+    await asyncio.gather(*(_session(i) for i in range(SESSIONS)))
+    stop.set()
+    await ticker
+
+    assert lags
+    assert max(lags) * 1000 <= MAX_LAG_MS
+
+
+@pytest.mark.asyncio
+async def test_timed_out_call_keeps_its_slot_until_the_thread_ends(monkeypatch):
+    monkeypatch.setitem(async_tools.TOOL_LIMITS, "lag_test_tool", 1)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(async_tools.run_blocking("lag_test_tool", time.sleep, 0.3), 0.05)
+
+    sem = async_tools._semaphore("lag_test_tool")
+    assert sem.locked()  # the thread is still sleeping
+    t0 = time.perf_counter()
+    assert await async_tools.run_blocking("lag_test_tool", lambda: "next") == "next"
+    assert time.perf_counter() - t0 >= 0.15
+    assert not sem.locked()
@@ -0,0 +1,59 @@
+"""
+LLM cost metrics: usage is priced per model, so routed and downgraded
+stages are costed at the model that actually ran.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from backend.utils import metrics
+from backend.utils.metrics import STAGE_COST, STAGE_TOKENS, _parse_prices, model_price, record_usage
+
+
+def _run(model, tin, tout, tool_calls=0):
+    usage = SimpleNamespace(input_tokens=tin, output_tokens=tout)
+    return SimpleNamespace(
+        context_wrapper=SimpleNamespace(usage=usage),
+        last_agent=SimpleNamespace(model=model),
+        new_items=[SimpleNamespace(type="tool_call_item")] * tool_calls,
+    )
+
+
+@pytest.fixture
+def prices(monkeypatch):
+    monkeypatch.setattr(metrics, "MODEL_PRICES", _parse_prices("big=10/20, big-mini=1/2, broken=x/1"))
+    monkeypatch.setattr(metrics, "OPENAI_PRICE_INPUT_PER_1M", 0.5)
+    monkeypatch.setattr(metrics, "OPENAI_PRICE_OUTPUT_PER_1M", 0.5)
+
+
+def test_parse_prices_skips_bad_entries():
+    assert _parse_prices("a=1/2,b=oops,c=3,d=0.5/0.25,") == {"a": (1.0, 2.0), "d": (0.5, 0.25)}
+
+
+def test_model_price_lookup(prices):
+    assert model_price("big") == (10.0, 20.0)
+    assert model_price("BIG-mini") == (1.0, 2.0)
+    assert model_price("big-mini-2025-08-07") == (1.0, 2.0)  # longest prefix wins
+    assert model_price("openai/big-2025") == (10.0, 20.0)
+    assert model_price("other") == (0.5, 0.5)
+    assert model_price(None) == (0.5, 0.5)
+
+
+def test_record_usage_costs_each_model_at_its_own_price(prices):
+    def cost(model):
+        return STAGE_COST.value(stage="t_route", model=model)
+
+    before_big, before_mini = cost("big"), cost("big-mini")
+    record_usage("t_route", _run("big", 1_000_000, 100_000))
+    record_usage("t_route", _run("big-mini", 1_000_000, 100_000))  # downgraded call
+    assert cost("big") - before_big == pytest.approx(12.0)
+    assert cost("big-mini") - before_mini == pytest.approx(1.2)
+
+    assert STAGE_TOKENS.value(stage="t_route", model="big", direction="output") >= 100_000
+
+
+def test_model_objects_and_missing_models(prices):
+    record_usage("t_obj", _run(SimpleNamespace(model="big-mini"), 1_000_000, 0))
+    assert STAGE_COST.value(stage="t_obj", model="big-mini") == pytest.approx(1.0)
+    record_usage("t_none", _run(None, 1_000_000, 0))
+    assert STAGE_COST.value(stage="t_none", model="unknown") == pytest.approx(0.5)
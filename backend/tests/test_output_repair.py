@@ -0,0 +1,115 @@
+"""
+Agent replies: JSON repair, parsing against the stage models and the
+pipeline's re-ask of a stage whose reply still does not fit.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from backend.orchestrator import pipeline
+from backend.schemas.agent_schema import InvalidOutput, StageOutputError, parse_output, validate_output
+from backend.utils.json_repair import loads_tolerant, repair_json
+
+BUDGET = {"budget": {"cap_usd": 1000, "total_usd": 900, "status": "under", "delta_usd": 100}}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Here you go:\n```json\n{"a": 1}\n```\nAnything else?', {"a": 1}),
+    ('{"a": 1, // count\n "b": /* list */ [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ("{'a': 'it\\'s \"quoted\"'}", {"a": 'it\'s "quoted"'}),
+    ('{"a": True, "b": None, "c": False, "d": NaN}', {"a": True, "b": None, "c": False, "d": None}),
+    ('{"note": "line one\nline two"}', {"note": "line one\nline two"}),
+    ('[{"a": 1}, {"b": 2},]', [{"a": 1}, {"b": 2}]),
+    ('{"url": "http://x.test/a"}', {"url": "http://x.test/a"}),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": "unterminated', {"a": "unterminated"}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1, "b"', {"a": 1, "b": None}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"a": "x\\', {"a": "x"}),
+])
+def test_repair_json_closes_a_truncated_tail(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_loads_tolerant():
+    assert loads_tolerant('{"a": 1}') == {"a": 1}
+    assert loads_tolerant("```\n{'a': 1,}\n```") == {"a": 1}
+    assert repair_json("no json here") == "no json here"
+    with pytest.raises(ValueError):
+        loads_tolerant("no json here")
+
+
+def test_parse_output_accepts_the_usual_reply_shapes():
+    model = parse_output("budget", BUDGET)
+    assert model.budget.status == "under"
+    assert parse_output("budget", model) is model
+    assert validate_output("budget", {"text": json.dumps(BUDGET)}) == BUDGET
+    assert validate_output("budget", "```json\n" + json.dumps(BUDGET)[:-2]) == BUDGET
+
+    extra = {"budget": {**BUDGET["budget"], "note": "kept"}}
+    assert validate_output("budget", extra)["budget"]["note"] == "kept"
+
+
+def test_parse_output_errors_name_the_missing_field():
+    with pytest.raises(StageOutputError) as info:
+        parse_output("budget", {"budget": {"cap_usd": 1000}})
+    assert info.value.stage == "budget"
+    assert "budget.total_usd" in info.value.errors
+
+    with pytest.raises(StageOutputError) as info:
+        parse_output("budget", InvalidOutput(raw="{bad", errors="not JSON"))
+    assert (info.value.raw, info.value.errors) == ("{bad", "not JSON")
+
+
+# ---- Re-ask ------------------------------------------------------------------------
+
+@pytest.fixture
+def replies(monkeypatch):
+    """Queue of budget-agent replies; each run_routed call pops one and records its input."""
+    queue, inputs = [], []
+
+    async def run_routed(agent, stage, *, input, **kwargs):
+        inputs.append(input)
+        return SimpleNamespace(final_output=queue.pop(0))
+
+    monkeypatch.setattr(pipeline, "get_agent", lambda name: object())
+    monkeypatch.setattr(pipeline, "run_routed", run_routed)
+    monkeypatch.setattr(pipeline, "record_usage", lambda *a, **k: None)
+    monkeypatch.setattr(pipeline, "log_payload", lambda *a, **k: None)
+    monkeypatch.setattr(pipeline, "STAGE_REASK_MAX", 1)
+    return queue, inputs
+
+
+@pytest.mark.asyncio
+async def test_invalid_reply_is_reasked_with_the_errors(replies):
+    queue, inputs = replies
+    queue += ['{"budget": {"cap_usd": 1000}}', json.dumps(BUDGET)]
+    degraded = []
+    out = await pipeline._agent_stage("budget", {"budget_usd": 1000}, None, ["budget"], degraded)
+
+    assert out == BUDGET
+    assert degraded == []
+    assert len(inputs) == 2
+    assert "did not match the output schema" in inputs[1] and "budget.total_usd" in inputs[1]
+    assert '{"budget": {"cap_usd": 1000}}' in inputs[1]
+
+
+@pytest.mark.asyncio
+async def test_still_invalid_reply_degrades_to_the_computed_stage(replies):
+    queue, inputs = replies
+    queue += ["not json", '{"budget": "nope"}']
+    degraded = []
+    merged = {"budget_usd": 1000, "lodging_options": [{"total": "400", "currency": "USD"}]}
+    out = await pipeline._agent_stage("budget", merged, None, ["budget"], degraded)
+
+    assert len(inputs) == 2
+    assert degraded == ["budget"]
+    assert out["budget"]["total_usd"] == 400.0 and out["budget"]["status"] == "under"
@@ -0,0 +1,142 @@
+"""
+Run cache: canonical state hashing, idempotency keys, in-flight joins and
+deadlines of shared runs.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.orchestrator.run_cache import IdempotencyConflict, RunCache, state_hash
+from backend.utils.deadline import remaining, within
+
+FULL_RUN_S = 0.5
+
+
+class FakePipeline:
+    """Takes FULL_RUN_S, or returns a degraded result when the deadline is shorter."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        left = remaining()
+        if left is not None and left < FULL_RUN_S:
+            await asyncio.sleep(max(0.0, left - 0.01))
+            return {"plan": "partial", "degraded": ["flights"]}
+        await asyncio.sleep(FULL_RUN_S)
+        return {"plan": "full"}
+
+
+@pytest.mark.asyncio
+async def test_short_deadline_gets_degraded_result_in_time():
+    cache, pipeline = RunCache(), FakePipeline()
+    t0 = time.monotonic()
+    with within(0.1):
+        result, how = await cache.run("k", pipeline)
+    assert result["degraded"] == ["flights"]
+    assert how == "miss"
+    assert time.monotonic() - t0 < 0.3
+    assert cache.get("k") is None  # degraded results are not cached
+
+
+@pytest.mark.asyncio
+async def test_short_deadline_does_not_wait_on_a_longer_run():
+    cache, pipeline = RunCache(), FakePipeline()
+    long_run = asyncio.create_task(cache.run("k", pipeline))
+    await asyncio.sleep(0.01)
+    t0 = time.monotonic()
+    with within(0.1):
+        result, _ = await cache.run("k", pipeline)
+    assert result.get("degraded")
+    assert time.monotonic() - t0 < 0.3
+    assert (await long_run)[0] == {"plan": "full"}
+    assert cache.get("k") == {"plan": "full"}
+
+
+@pytest.mark.asyncio
+async def test_longer_deadline_starts_a_full_run_instead_of_joining_a_short_one():
+    cache, pipeline = RunCache(), FakePipeline()
+
+    async def short():
+        with within(0.1):
+            return await cache.run("k", pipeline)
+
+    first = asyncio.create_task(short())
+    await asyncio.sleep(0.01)
+    result, how = await cache.run("k", pipeline)
+    assert (result, how) == ({"plan": "full"}, "miss")
+    assert (await first)[0].get("degraded")
+    assert pipeline.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_duplicates_join_the_run_in_flight_and_later_ones_hit():
+    cache, pipeline = RunCache(), FakePipeline()
+    (r1, how1), (r2, how2) = await asyncio.gather(cache.run("k", pipeline), cache.run("k", pipeline))
+    assert r1 == r2 == {"plan": "full"}
+    assert sorted([how1, how2]) == ["joined", "miss"]
+    assert await cache.run("k", pipeline) == ({"plan": "full"}, "hit")
+    assert pipeline.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_caller_going_away_does_not_cancel_the_shared_run():
+    cache, pipeline = RunCache(), FakePipeline()
+    first = asyncio.create_task(cache.run("k", pipeline))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(cache.run("k", pipeline))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == ({"plan": "full"}, "joined")
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    cache = RunCache()
+
+    async def boom():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        await cache.run("k", boom)
+    assert cache.get("k") is None
+
+
+def test_state_hash_ignores_formatting_and_bookkeeping():
+    a = {"origin": " sfo", "destination": "Paris", "start_date": "2026/6/3", "budget_usd": 3000.0,
+         "questions": ["when?"], "note": None}
+    b = {"budget_usd": 3000, "start_date": "2026-06-03", "destination": "CDG", "origin": "SFO"}
+    assert state_hash(a, mode="direct") == state_hash(b, mode="direct")
+    assert state_hash(a, mode="direct") != state_hash(a, mode="agents")
+    assert state_hash(a) != state_hash({**b, "adults": 2})
+
+
+def test_idempotency_key_is_bound_to_its_first_run():
+    cache = RunCache()
+    assert cache.bind("idem-1", "hash-a") == "hash-a"
+    assert cache.bind("idem-1", "hash-a") == "hash-a"
+    assert cache.bind(None, "hash-b") == "hash-b"
+    with pytest.raises(IdempotencyConflict):
+        cache.bind("idem-1", "hash-b")
+
+
+def test_short_deadline_run_endpoint_returns_degraded_not_504(monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    from backend import main
+
+    async def fake_run_pipeline(state, **kwargs):
+        return await FakePipeline()()
+
+    monkeypatch.setattr(main, "_run_pipeline", fake_run_pipeline)
+    monkeypatch.setattr(main, "_RUNS", RunCache())
+    client = TestClient(main.app)
+    assert client.post("/session", json={"session_id": "deadline-test"}).status_code == 200
+    client.post("/session/deadline-test/set", json={"key": "destination", "value": "PAR"})
+
+    res = client.post("/session/deadline-test/run?mode=direct", headers={"X-Deadline-Ms": "100"})
+    assert res.status_code == 200
+    assert res.json()["result"]["degraded"] == ["flights"]
@@ -0,0 +1,220 @@
+"""
+Session stores: compare-and-set puts, version conflicts and conversation
+reuse for the memory, SQLite and (fake) Redis backends.
+"""
+import time
+
+import pytest
+
+from backend.llm.state_patch import VersionConflict
+from backend.orchestrator.session_store import (
+    InMemorySessionStore, RedisSessionStore, SQLiteSessionStore,
+)
+
+
+class FakeWatchError(Exception):
+    pass
+
+
+class FakePipeline:
+    """WATCH/MULTI/EXEC over FakeRedis: EXEC fails if a watched key changed."""
+
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.watched = {}
+        self.queued = []
+        self.buffering = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, *keys):
+        self.watched = {k: self.redis.revisions.get(k, 0) for k in keys}
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def multi(self):
+        self.buffering = True
+
+    def set(self, key, value, ex=None):
+        self.queued.append((key, value, ex))
+
+    def execute(self):
+        if any(self.redis.revisions.get(k, 0) != rev for k, rev in self.watched.items()):
+            raise FakeWatchError()
+        for key, value, ex in self.queued:
+            self.redis.set(key, value, ex=ex)
+        return [True] * len(self.queued)
+
+
+class FakeRedis:
+    """The subset of redis-py the store uses, without the redis package."""
+
+    WatchError = FakeWatchError
+
+    def __init__(self):
+        self.data = {}
+        self.zsets = {}
+        self.revisions = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.revisions[key] = self.revisions.get(key, 0) + 1
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def delete(self, *keys):
+        for k in keys:
+            if self.data.pop(k, None) is not None:
+                self.revisions[k] = self.revisions.get(k, 0) + 1
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, *members):
+        for m in members:
+            self.zsets.get(name, {}).pop(m, None)
+
+    def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    def zrange(self, name, start, end):
+        members = sorted(self.zsets.get(name, {}).items(), key=lambda kv: kv[1])
+        return [m for m, _ in members[start:end + 1]]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+def sqlite_pair(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    return SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+
+def redis_pair(tmp_path):
+    client = FakeRedis()
+    return RedisSessionStore(client), RedisSessionStore(client)
+
+
+@pytest.fixture(params=[sqlite_pair, redis_pair], ids=["sqlite", "redis"])
+def stores(request, tmp_path):
+    """Two store instances over the same backend, like two workers."""
+    return request.param(tmp_path)
+
+
+def test_put_after_get_round_trips(stores):
+    a, _ = stores
+    a.create("s1")
+    orch = a.get("s1")
+    orch.set("destination", "PAR")
+    a.put("s1", orch)
+    again = a.get("s1")
+    assert again.state == {"destination": "PAR"}
+    assert again.version == again.stored_version == 1
+
+
+def test_concurrent_put_raises_version_conflict(stores):
+    a, b = stores
+    a.create("s1")
+    first, second = a.get("s1"), b.get("s1")
+    first.set("origin", "SFO")
+    a.put("s1", first)
+    second.set("destination", "ROM")
+    with pytest.raises(VersionConflict):
+        b.put("s1", second)
+    assert b.get("s1").state == {"origin": "SFO"}
+
+
+def test_reload_after_conflict_then_put_succeeds(stores):
+    a, b = stores
+    a.create("s1")
+    first, second = a.get("s1"), b.get("s1")
+    first.set("origin", "SFO")
+    a.put("s1", first)
+    second.set("destination", "ROM")
+    with pytest.raises(VersionConflict):
+        b.put("s1", second)
+    fresh = b.get("s1")
+    fresh.set("destination", "ROM")
+    b.put("s1", fresh)
+    assert a.get("s1").state == {"origin": "SFO", "destination": "ROM"}
+
+
+def test_create_resets_an_existing_session(stores):
+    a, b = stores
+    a.create("s1")
+    orch = a.get("s1")
+    orch.set("origin", "SFO")
+    a.put("s1", orch)
+    b.create("s1")
+    assert a.get("s1").state == {}
+
+
+def test_delete(stores):
+    a, b = stores
+    a.create("s1")
+    b.delete("s1")
+    assert a.get("s1") is None
+    assert "s1" not in a
+
+
+def test_memory_store_rejects_a_stale_copy():
+    store = InMemorySessionStore()
+    live = store.create("s1")
+    stale = type(live).from_snapshot(live.snapshot())
+    stale.stored_version = live.version
+    live.set("origin", "SFO")
+    store.put("s1", live)
+    stale.set("destination", "ROM")
+    with pytest.raises(VersionConflict):
+        store.put("s1", stale)
+    assert store.get("s1") is live
+
+
+def test_memory_store_ttl_and_lru():
+    store = InMemorySessionStore(ttl_s=0.05, max_entries=2)
+    for sid in ("a", "b", "c"):
+        store.create(sid)
+    assert store.get("a") is None  # evicted
+    time.sleep(0.06)
+    assert store.get("b") is None  # expired
+
+
+def test_sqlite_reuses_one_conversation_per_session(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store.create("s1")
+    assert store.get("s1").session.inner is store.get("s1").session.inner
+    store.delete("s1")
+    store.create("s1")
+    assert store.conversation("s1") is store.get("s1").session.inner
+
+
+def test_sqlite_memory_path_keeps_conversation_in_process():
+    store = SQLiteSessionStore(":memory:")
+    store.create("s1")
+    assert store.conversation("s1") is None
+
+
+def test_redis_write_between_watch_and_exec_is_a_conflict(monkeypatch):
+    client = FakeRedis()
+    store = RedisSessionStore(client)
+    store.create("s1")
+    orch = store.get("s1")
+    orch.set("origin", "SFO")
+    multi = FakePipeline.multi
+
+    def racing_multi(self):
+        client.set(store._key("s1"), client.get(store._key("s1")))  # another worker's write
+        multi(self)
+
+    monkeypatch.setattr(FakePipeline, "multi", racing_multi)
+    with pytest.raises(VersionConflict):
+        store.put("s1", orch)
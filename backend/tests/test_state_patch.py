@@ -0,0 +1,94 @@
+"""JSON-Patch application, versioned commits (rebase / conflict) and op filtering."""
+import pytest
+
+from backend.llm.orchestrator_input import OrchestratorInputs
+from backend.llm.state_patch import (
+    PatchError, VersionConflict, VersionedState, applicable_ops, apply_ops,
+)
+
+
+def test_apply_ops_nested_lists_and_move():
+    doc = {"state": {"legs": [{"city": "ROM"}]}}
+    out = apply_ops(doc, [
+        {"op": "add", "path": "/state/fx_rates/EUR", "value": 1.1},
+        {"op": "add", "path": "/state/legs/-", "value": {"city": "FLR"}},
+        {"op": "replace", "path": "/state/legs/0/city", "value": "VCE"},
+        {"op": "move", "from": "/state/fx_rates", "path": "/fx"},
+        {"op": "test", "path": "/fx/EUR", "value": 1.1},
+    ])
+    assert out == {"state": {"legs": [{"city": "VCE"}, {"city": "FLR"}]}, "fx": {"EUR": 1.1}}
+    assert doc == {"state": {"legs": [{"city": "ROM"}]}}  # input untouched
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "remove", "path": "/missing"},
+    {"op": "add", "path": "relative", "value": 1},
+    {"op": "add", "path": "/x"},
+    {"op": "replace", "path": "/list/9", "value": 1},
+    {"op": "move", "path": "/y"},
+    {"op": "test", "path": "/a", "value": 2},
+    {"op": "frobnicate", "path": "/a"},
+    {"op": "add", "path": "", "value": {}},
+])
+def test_invalid_ops_raise_patch_error(op):
+    with pytest.raises(PatchError):
+        apply_ops({"a": 1, "list": []}, [op])
+
+
+def test_applicable_ops_keeps_the_ops_that_apply():
+    doc = {"a": 1, "list": []}
+    ops = [
+        {"op": "add", "path": "/b", "value": 2},
+        {"op": "remove", "path": "/missing"},
+        "not an op",
+        {"op": "move", "from": "/a", "path": "/list/5"},  # fails after removing /a
+        {"op": "test", "path": "/a", "value": 1},  # the failed move left /a in place
+        {"op": "remove", "path": "/b"},
+    ]
+    kept, errors = applicable_ops(doc, ops)
+    assert kept == [ops[0], ops[4], ops[5]]
+    assert len(errors) == 3
+    assert apply_ops(doc, kept) == {"a": 1, "list": []}
+    assert doc == {"a": 1, "list": []}
+
+
+def test_stale_patch_on_other_paths_is_rebased():
+    vs = VersionedState({"origin": "SFO"})
+    vs.commit([{"op": "add", "path": "/destination", "value": "ROM"}])
+    vs.commit([{"op": "add", "path": "/adults", "value": 2}], base_version=0)
+    assert vs.doc == {"origin": "SFO", "destination": "ROM", "adults": 2}
+    assert vs.version == 2
+
+
+def test_stale_patch_on_changed_path_conflicts():
+    vs = VersionedState({"state": {}})
+    vs.commit([{"op": "add", "path": "/state/destination", "value": "ROM"}])
+    with pytest.raises(VersionConflict) as e:
+        vs.commit([{"op": "add", "path": "/state", "value": {}}], base_version=0)
+    assert e.value.paths == ["/state"]
+    assert vs.version == 1
+
+
+def test_future_base_version_conflicts():
+    vs = VersionedState({})
+    with pytest.raises(VersionConflict):
+        vs.commit([{"op": "add", "path": "/a", "value": 1}], base_version=3)
+
+
+def test_version_older_than_the_log_conflicts_on_everything():
+    vs = VersionedState({}, log_size=2)
+    for i in range(4):
+        vs.commit([{"op": "add", "path": f"/k{i}", "value": i}])
+    with pytest.raises(VersionConflict) as e:
+        vs.commit([{"op": "add", "path": "/other", "value": 1}], base_version=0)
+    assert e.value.paths == ["/other"]
+
+
+def test_rebase_survives_a_snapshot_reload():
+    orch = OrchestratorInputs(session_id="s", seed={"origin": "SFO"})
+    orch.patch([{"op": "add", "path": "/destination", "value": "ROM"}])
+    reloaded = OrchestratorInputs.from_snapshot(orch.snapshot())
+    reloaded.patch([{"op": "add", "path": "/adults", "value": 2}], base_version=0)
+    assert reloaded.state == {"origin": "SFO", "destination": "ROM", "adults": 2}
+    with pytest.raises(VersionConflict):
+        reloaded.patch([{"op": "add", "path": "/destination", "value": "PAR"}], base_version=0)
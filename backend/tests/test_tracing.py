@@ -0,0 +1,53 @@
+"""
+JSON-lines span export: spans are written by the exporter's thread, never
+by the code that finished them, and none are lost on close.
+"""
+import json
+import threading
+
+from backend.utils import tracing
+from backend.utils.tracing import JsonlExporter, Span
+
+
+def _spans(n):
+    return [Span(trace_id="t1", span_id=f"s{i}", name=f"span-{i}", attrs={"i": i}) for i in range(n)]
+
+
+def test_spans_are_written_in_order_on_close(tmp_path):
+    exporter = JsonlExporter(str(tmp_path / "traces.jsonl"))
+    for s in _spans(200):
+        s.end = s.start
+        exporter.export(s)
+    exporter.close()
+
+    rows = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [r["name"] for r in rows] == [f"span-{i}" for i in range(200)]
+    assert rows[0]["attrs"] == {"i": 0} and rows[0]["duration_ms"] == 0.0
+
+
+def test_export_does_not_touch_the_file_on_the_calling_thread(tmp_path, monkeypatch):
+    writers = set()
+    real_open = open
+
+    def recording_open(*args, **kwargs):
+        writers.add(threading.get_ident())
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(tracing, "open", recording_open, raising=False)
+    exporter = JsonlExporter(str(tmp_path / "traces.jsonl"))
+    for s in _spans(5):
+        exporter.export(s)
+    exporter.close()
+
+    assert writers and threading.get_ident() not in writers
+
+
+def test_write_errors_are_swallowed_and_close_restarts_cleanly(tmp_path):
+    exporter = JsonlExporter(str(tmp_path))  # a directory: every append fails
+    exporter.export(_spans(1)[0])
+    exporter.close()
+
+    exporter.path = str(tmp_path / "traces.jsonl")
+    exporter.export(_spans(1)[0])  # starts a new writer after close
+    exporter.close()
+    assert len((tmp_path / "traces.jsonl").read_text().splitlines()) == 1
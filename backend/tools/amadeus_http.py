@@ -0,0 +1,44 @@
+from __future__ import annotations
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+from backend.utils.deadline import timeout_for
+from backend.utils.metrics import AMADEUS_ERRORS, AMADEUS_LATENCY, add_server_timing
+from backend.utils.tracing import span
+
+
+def endpoint_of(url: str) -> str:
+    """Metric label for an Amadeus URL: its path (e.g. /v3/shopping/hotel-offers)."""
+    return urlsplit(url).path or "/"
+
+
+class AmadeusSession(requests.Session):
+    """
+    requests.Session shared by the Amadeus adapters. Every call is timed and
+    traced per endpoint so the tools get metrics/spans without touching call sites.
+    The per-call timeout is capped by the request deadline (backend.utils.deadline).
+    """
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        endpoint = endpoint_of(url)
+        timeout = kwargs.get("timeout")
+        if not isinstance(timeout, tuple):
+            kwargs["timeout"] = timeout_for(timeout)
+        t0 = time.perf_counter()
+        with span(f"amadeus {method} {endpoint}", method=method, endpoint=endpoint) as sp:
+            try:
+                resp = super().request(method, url, *args, **kwargs)
+            except requests.RequestException:
+                AMADEUS_ERRORS.inc(endpoint=endpoint)
+                raise
+            finally:
+                dt = time.perf_counter() - t0
+                AMADEUS_LATENCY.observe(dt, endpoint=endpoint)
+                add_server_timing("amadeus", dt)
+            sp.set(status_code=resp.status_code)
+            if resp.status_code >= 400:
+                AMADEUS_ERRORS.inc(endpoint=endpoint)
+                sp.status = "error"
+        return resp
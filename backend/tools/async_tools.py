@@ -0,0 +1,190 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from backend.config.settings import (
+    TOOL_CONCURRENCY_ACTIVITIES, TOOL_CONCURRENCY_FLIGHTS, TOOL_CONCURRENCY_HOTELS, TOOL_MAX_RETRIES,
+    TOOL_THREADS,
+)
+from backend.schemas.tool_schema import ToolCall, ToolName
+from backend.tools.search_cache import SEARCH_CACHE, activity_params, flight_params, hotel_params
+from backend.utils.deadline import DeadlineExceeded, timeout_for
+from backend.utils.logger import get_logger
+
+logger = get_logger("backend.tools.async_tools")
+
+T = TypeVar("T")
+
+# The Amadeus adapters use blocking `requests`; they run here instead of on the event loop.
+EXECUTOR = ThreadPoolExecutor(max_workers=max(1, TOOL_THREADS), thread_name_prefix="tool")
+
+TOOL_NAMES = {
+    "search_flights": ToolName.FLIGHT_SEARCH,
+    "search_hotels": ToolName.HOTEL_SEARCH,
+    "search_activities": ToolName.EVENTS_SEARCH,
+}
+
+# Per-attempt cap for ToolCall.max_latency_ms (hotel search makes several Amadeus calls)
+TOOL_MAX_LATENCY_MS = {"search_flights": 45_000, "search_hotels": 60_000, "search_activities": 30_000}
+
+
+@functools.lru_cache(maxsize=None)
+def transient_errors() -> Tuple[Type[BaseException], ...]:
+    """Worth another attempt if time remains; anything else fails the call at once."""
+    import requests
+
+    return asyncio.TimeoutError, requests.Timeout, requests.ConnectionError
+
+
+TOOL_LIMITS = {
+    "search_flights": TOOL_CONCURRENCY_FLIGHTS,
+    "search_hotels": TOOL_CONCURRENCY_HOTELS,
+    "search_activities": TOOL_CONCURRENCY_ACTIVITIES,
+}
+
+# asyncio semaphores belong to one loop; keep a set per running loop
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _semaphore(tool: str) -> asyncio.Semaphore:
+    per_loop = _SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    sem = per_loop.get(tool)
+    if sem is None:
+        sem = per_loop[tool] = asyncio.Semaphore(max(1, TOOL_LIMITS.get(tool, TOOL_THREADS)))
+    return sem
+
+
+async def run_blocking(tool: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking call in the tool pool, at most TOOL_LIMITS[tool] at a time.
+    The caller's contextvars (trace span, Server-Timing) are carried into the thread.
+    A caller that times out or is cancelled stops waiting, but the slot stays
+    taken until the thread finishes, so the limit counts running calls.
+    """
+    sem = _semaphore(tool)
+    await sem.acquire()
+    try:
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+        fut = asyncio.get_running_loop().run_in_executor(EXECUTOR, call)
+    except BaseException:
+        sem.release()
+        raise
+
+    def _done(f: asyncio.Future) -> None:
+        sem.release()
+        if not f.cancelled():
+            f.exception()  # retrieved here when the caller has gone
+
+    fut.add_done_callback(_done)
+    return await asyncio.shield(fut)
+
+
+def new_call(tool: str, input: Dict[str, Any], correlation_id: Optional[str] = None) -> ToolCall:
+    return ToolCall(name=TOOL_NAMES[tool], input=input, correlation_id=correlation_id,
+                    max_latency_ms=TOOL_MAX_LATENCY_MS.get(tool))
+
+
+async def _guarded(tool: str, params: Dict[str, Any], limit: int,
+                   compute: Callable[[int], List[Dict[str, Any]]], call: Optional[ToolCall]) -> List[Dict[str, Any]]:
+    """
+    Cached search bounded by `call.max_latency_ms` and the request deadline,
+    retried on transient errors up to TOOL_MAX_RETRIES (counted in call.retry_count).
+    Out of time or retries, a stale cached result is returned if there is one.
+    """
+    call = call or new_call(tool, params)
+    while True:
+        try:
+            budget = timeout_for(call.max_latency_ms / 1000 if call.max_latency_ms else None)
+            return await asyncio.wait_for(
+                run_blocking(tool, SEARCH_CACHE.fetch, tool, params, limit, compute), budget)
+        except (DeadlineExceeded, *transient_errors()) as e:
+            retry = not isinstance(e, DeadlineExceeded) and call.retry_count < TOOL_MAX_RETRIES
+            if retry:
+                try:
+                    timeout_for(None)
+                except DeadlineExceeded:
+                    retry = False
+            if retry:
+                call.retry_count += 1
+                logger.warning("%s attempt %d failed (%s); retrying", tool, call.retry_count, e.__class__.__name__)
+                continue
+            stale = SEARCH_CACHE.stale(tool, params, limit)
+            if stale is not None:
+                logger.warning("%s out of time (%s); serving stale cached result", tool, e.__class__.__name__)
+                return stale
+            if isinstance(e, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded(f"{tool} timed out after {call.retry_count + 1} attempt(s)") from e
+
+
+# ---- Blocking adapters ---------------------------------------------------------------
+# The Amadeus modules (requests + their HTTP sessions) load on the first search, not at import.
+
+def search_flights(**kwargs: Any) -> List[Dict[str, Any]]:
+    from backend.tools.flights_api import search_flights
+    return search_flights(**kwargs)
+
+
+def search_hotels(**kwargs: Any) -> List[Dict[str, Any]]:
+    from backend.tools.hotels_api import search_hotels
+    return search_hotels(**kwargs)
+
+
+def search_activities(**kwargs: Any) -> List[Dict[str, Any]]:
+    from backend.tools.events_api import search_activities
+    return search_activities(**kwargs)
+
+
+# ---- Async search variants (cached, deadline-bounded) -------------------------------
+
+async def search_flights_async(*, origin: str, destination: str, depart_date: str,
+                               return_date: Optional[str] = None, adults: int = 1, currency: str = "USD",
+                               non_stop: Optional[bool] = None, max_results: int = 12,
+                               call: Optional[ToolCall] = None) -> List[Dict[str, Any]]:
+    params = flight_params(origin, destination, depart_date, return_date, adults, currency, non_stop)
+    return await _guarded("search_flights", params, int(max_results),
+                          lambda n: search_flights(
+                              origin_code=origin,
+                              dest_code=destination,
+                              depart=date.fromisoformat(depart_date),
+                              ret=date.fromisoformat(return_date) if return_date else None,
+                              adults=int(adults),
+                              currency=currency,
+                              non_stop=non_stop,
+                              max_results=n,
+                          ), call)
+
+
+async def search_hotels_async(*, city: str, check_in: str, check_out: str, guests: int = 1,
+                              currency: str = "USD", refundable_only: bool = False,
+                              max_results: int = 10, call: Optional[ToolCall] = None) -> List[Dict[str, Any]]:
+    params = hotel_params(city, check_in, check_out, guests, currency, refundable_only)
+    return await _guarded("search_hotels", params, int(max_results),
+                          lambda n: search_hotels(
+                              city=city,
+                              check_in=date.fromisoformat(check_in),
+                              check_out=date.fromisoformat(check_out),
+                              guests=int(guests),
+                              currency=currency,
+                              refundable_only=bool(refundable_only),
+                              max_results=n,
+                          ), call)
+
+
+async def search_activities_async(*, city_code: str, for_date: str, max_results: int = 6,
+                                  call: Optional[ToolCall] = None) -> List[Dict[str, Any]]:
+    params = activity_params(city_code, for_date)
+    return await _guarded("search_activities", params, int(max_results),
+                          lambda n: search_activities(
+                              city_code=city_code,
+                              for_date=date.fromisoformat(for_date),
+                              max_results=n,
+                          ), call)
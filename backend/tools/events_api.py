@@ -3,8 +3,9 @@ import time, requests
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import date, datetime, time as dtime, timezone
 from backend.config.settings import AMADEUS_BASE, AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET
+from backend.tools.amadeus_http import AmadeusSession
 
-_ama_session = requests.Session()
+_ama_session = AmadeusSession()
 _ama_token: Optional[str] = None
 _ama_exp   = 0.0
 
@@ -3,8 +3,12 @@ import time, requests
 from typing import Dict, Any, List, Optional
 from datetime import date
 from backend.config.settings import AMADEUS_BASE, AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET
+from backend.tools.amadeus_http import AmadeusSession
+from backend.utils.logger import get_logger, log_payload
 
-_session = requests.Session()
+logger = get_logger("backend.tools.flights_api")
+
+_session = AmadeusSession()
 _token: Optional[str] = None
 _exp   = 0.0
 
@@ -77,7 +81,7 @@ def search_flights(*, origin_code: str, dest_code: str, depart: date, ret: Optio
     origins = _city_to_airports(origin_code)
     dests   = _city_to_airports(dest_code)
     
-    print("[Adapter] Amadeus params:", {
+    logger.debug("amadeus flight search", extra={"params": {
         "originLocationCode": origin_code,
         "destinationLocationCode": dest_code,
         "departureDate": str(depart),
@@ -86,7 +90,7 @@ def search_flights(*, origin_code: str, dest_code: str, depart: date, ret: Optio
         "nonStop": bool(non_stop) if non_stop is not None else None,
         "currencyCode": currency,
         "max": max_results
-    })
+    }})
     body_base = {
         "currencyCode": currency,
         "travelers": [{"id": str(i+1), "travelerType": "ADULT"} for i in range(max(1, adults))],
@@ -117,7 +121,7 @@ def search_flights(*, origin_code: str, dest_code: str, depart: date, ret: Optio
 
             j = _post_offers(body)
             data = (j or {}).get("data") or []
-            print("API FLIGHTS &&&&&&",data) 
+            log_payload(logger, "amadeus_payload", "flight offers", data, origin=o, destination=d)
             if data:
                 return [_normalize_offer(x) for x in data]
     return []
@@ -1,10 +1,15 @@
 from __future__ import annotations
+import logging
 import time, requests, re
 from typing import List, Dict, Any, Optional
 from datetime import date, timedelta
 from backend.config.settings import AMADEUS_BASE, AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET
+from backend.tools.amadeus_http import AmadeusSession
+from backend.utils.logger import get_logger, log_payload
 
-_session = requests.Session()
+logger = get_logger("backend.tools.hotels_api")
+
+_session = AmadeusSession()
 _token: Optional[str] = None
 _exp = 0.0
 
@@ -84,7 +89,7 @@ def _hotel_list_by_geocode(city: str, radius_km: float = 12.0, limit: int = 60)
         return data[:limit]
     except requests.HTTPError as e:
         # Log for visibility and let caller fall back to by-city
-        print("by-geocode failed; falling back to by-city:", str(e))
+        logger.warning("by-geocode failed; falling back to by-city: %s", e)
         return []
 
 
@@ -273,9 +278,10 @@ def search_hotels(
                 return normalized[:max_results]
     except requests.HTTPError as e:
         txt = (e.response.text if getattr(e, "response", None) else str(e))
-        # Only swallow the classic 477 path; otherwise print and continue to IDs
+        # Only swallow the classic 477 path; otherwise log and continue to IDs
         if '"code":477' not in txt and "Required parameter: hotelIds" not in txt:
-            print("cityCode offers failed (non-477):", txt)
+            log_payload(logger, "amadeus_payload", "cityCode offers failed (non-477)", txt,
+                        level=logging.WARNING, city=city)
 
     # 2) hotelIds path — prefer geocode, then by-city
     seeded = _hotel_list_by_geocode(city, radius_km=max_km_from_center, limit=80)
@@ -305,7 +311,7 @@ def search_hotels(
                         if n:
                             results.append(n)
                 except requests.HTTPError as ee:
-                    print("skipped hotelId:", hid, str(ee))
+                    logger.warning("skipped hotelId %s: %s", hid, ee)
             continue
 
         # Parse warnings to remove bad IDs from subsequent logic (informational here)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.config.settings import SEARCH_CACHE_MAX, SEARCH_CACHE_STALE_S, SEARCH_CACHE_TTL_S
+from backend.utils.deadline import timeout_for
+from backend.utils.metrics import record_cache
+
+Compute = Callable[[int], List[Dict[str, Any]]]
+
+
+class _Entry:
+    __slots__ = ("limit", "value", "expires_at", "ready", "stale")
+
+    def __init__(self, limit: int, stale: Optional[List[Dict[str, Any]]] = None):
+        self.limit = limit
+        self.value: Optional[List[Dict[str, Any]]] = None
+        self.expires_at = 0.0
+        self.ready = threading.Event()
+        self.stale = stale  # previous (expired) value, kept as a fallback while refetching
+
+
+class SearchCache:
+    """
+    TTL + LRU cache for tool search results, keyed by tool and normalized params
+    (everything except the result limit). An entry fetched with a larger limit
+    serves smaller requests. A lookup that finds the same search in flight (e.g.
+    a prefetch) waits for it instead of calling Amadeus again. Expired results
+    are kept for `stale_s` more so a caller out of time can fall back to them.
+    """
+
+    def __init__(self, ttl_s: float = SEARCH_CACHE_TTL_S, max_entries: int = SEARCH_CACHE_MAX,
+                 wait_s: float = 60.0, stale_s: float = SEARCH_CACHE_STALE_S):
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max(1, max_entries)
+        self.wait_s = wait_s
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool: str, params: Dict[str, Any]) -> str:
+        return tool + ":" + json.dumps(params, sort_keys=True, default=str)
+
+    def peek(self, tool: str, params: Dict[str, Any], limit: int) -> bool:
+        """True if a fresh or in-flight entry would serve this lookup."""
+        with self._lock:
+            entry = self._entries.get(self.key(tool, params))
+            return entry is not None and entry.limit >= limit and (
+                not entry.ready.is_set() or entry.expires_at > time.time())
+
+    def fetch(self, tool: str, params: Dict[str, Any], limit: int, compute: Compute) -> List[Dict[str, Any]]:
+        k = self.key(tool, params)
+        while True:
+            with self._lock:
+                entry = self._entries.get(k)
+                stale = None
+                if entry is not None:
+                    stale = entry.value if entry.value is not None else entry.stale
+                if entry is not None and entry.ready.is_set() and entry.expires_at <= time.time():
+                    del self._entries[k]
+                    entry = None
+                if entry is None or entry.limit < limit:
+                    mine = _Entry(limit, stale)
+                    self._entries[k] = mine
+                    self._entries.move_to_end(k)
+                    self._evict()
+                    break
+                self._entries.move_to_end(k)
+            if entry.ready.wait(timeout_for(self.wait_s)) and entry.value is not None:
+                record_cache(tool, hit=True)
+                return entry.value[:limit]
+            # in-flight fetch failed or stalled -> fetch ourselves
+            with self._lock:
+                if self._entries.get(k) is entry:
+                    del self._entries[k]
+
+        record_cache(tool, hit=False)
+        try:
+            value = list(compute(limit) or [])
+        except BaseException:
+            with self._lock:
+                if self._entries.get(k) is mine:
+                    if mine.stale is not None:
+                        # keep the stale value reachable for stale()
+                        mine.value, mine.expires_at = None, time.time()
+                    else:
+                        del self._entries[k]
+            mine.ready.set()
+            raise
+        mine.value = value
+        mine.expires_at = time.time() + self.ttl_s
+        mine.ready.set()
+        return value[:limit]
+
+    def stale(self, tool: str, params: Dict[str, Any], limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Best value on hand (fresh, expired or the one being refreshed), without fetching."""
+        with self._lock:
+            entry = self._entries.get(self.key(tool, params))
+            if entry is None:
+                return None
+            value = entry.value if entry.value is not None else entry.stale
+        if value is not None:
+            record_cache(tool + ":stale", hit=True)
+            return value[:limit]
+        return None
+
+    def _evict(self) -> None:
+        # called with the lock held; oldest first, in-flight entries are kept
+        cutoff = time.time() - self.stale_s
+        for k in [k for k, e in self._entries.items() if e.ready.is_set() and e.expires_at <= cutoff]:
+            del self._entries[k]
+        for k in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[k].ready.is_set():
+                del self._entries[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SEARCH_CACHE = SearchCache()
+
+
+# ---- Normalized params (shared by the agent tools and the prefetcher) -------------
+
+def flight_params(origin: str, destination: str, depart_date: str, return_date: Optional[str],
+                  adults: int, currency: str, non_stop: Optional[bool]) -> Dict[str, Any]:
+    return {
+        "origin": origin.strip().upper(),
+        "destination": destination.strip().upper(),
+        "depart_date": str(depart_date),
+        "return_date": str(return_date) if return_date else None,
+        "adults": int(adults),
+        "currency": (currency or "USD").upper(),
+        "non_stop": bool(non_stop) if non_stop is not None else None,
+    }
+
+
+def hotel_params(city: str, check_in: str, check_out: str, guests: int, currency: str,
+                 refundable_only: bool) -> Dict[str, Any]:
+    return {
+        "city": city.strip().upper(),
+        "check_in": str(check_in),
+        "check_out": str(check_out),
+        "guests": int(guests),
+        "currency": (currency or "USD").upper(),
+        "refundable_only": bool(refundable_only),
+    }
+
+
+def activity_params(city_code: str, for_date: str) -> Dict[str, Any]:
+    return {"city_code": city_code.strip().upper(), "for_date": str(for_date)}
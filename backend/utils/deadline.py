@@ -0,0 +1,88 @@
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Dict, Iterable, Iterator, Optional
+
+# Absolute deadline (time.monotonic()) for the current request/stage, or None
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+# Relative share of the remaining time each pipeline stage gets
+STAGE_WEIGHTS: Dict[str, float] = {
+    "planner": 1.0, "flights": 2.0, "lodging": 2.0, "activities": 2.0, "budget": 1.0, "critic": 1.5,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request (or stage) ran out of time."""
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the active deadline (may be <= 0), or None without one."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+def check(what: str = "request") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"deadline exceeded before {what}")
+
+
+@contextmanager
+def within(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Narrow the deadline to `seconds` from now (never extends an outer one).
+    `None` keeps the current deadline. Yields the effective remaining time.
+    """
+    if seconds is None:
+        yield remaining()
+        return
+    new = time.monotonic() + max(0.0, seconds)
+    outer = _deadline.get()
+    token = _deadline.set(new if outer is None else min(outer, new))
+    try:
+        yield remaining()
+    finally:
+        _deadline.reset(token)
+
+
+def detached(seconds: Optional[float]) -> Context:
+    """
+    Copy of the current context with its own deadline `seconds` from now
+    (None = no deadline) instead of the caller's, for work shared between
+    requests (run it with loop.create_task(..., context=...)).
+    """
+    ctx = copy_context()
+    ctx.run(_deadline.set, None if seconds is None else time.monotonic() + max(0.0, seconds))
+    return ctx
+
+
+def timeout_for(default: Optional[float]) -> Optional[float]:
+    """
+    Timeout for a blocking call: `default` capped by the remaining time.
+    Raises DeadlineExceeded if nothing is left.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return left if default is None else min(default, left)
+
+
+def stage_share(stage: str, pending: Iterable[str]) -> Optional[float]:
+    """
+    Slice of the remaining time for `stage`, given the stages still to run
+    (including it), weighted by STAGE_WEIGHTS. None without a deadline.
+    """
+    left = remaining()
+    if left is None:
+        return None
+    pending = list(pending)
+    total = sum(STAGE_WEIGHTS.get(s, 1.0) for s in pending) or 1.0
+    return max(0.0, left) * STAGE_WEIGHTS.get(stage, 1.0) / total
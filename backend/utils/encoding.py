@@ -0,0 +1,170 @@
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from backend.config.settings import RESPONSE_COMPRESS_MIN_BYTES
+
+try:  # optional: br encoding is offered only when installed
+    import brotli
+except ImportError:
+    brotli = None
+
+try:  # optional: MessagePack bodies are offered only when installed
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+# ---- Sparse fields -------------------------------------------------------------
+
+_MISSING = object()
+
+
+def _pick(node: Any, path: List[str]) -> Any:
+    if not path:
+        return node
+    if isinstance(node, list):
+        return [_pick(item, path) for item in node]
+    if isinstance(node, dict) and path[0] in node:
+        return {path[0]: _pick(node[path[0]], path[1:])}
+    return _MISSING
+
+
+def _merge(into: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for k, v in part.items():
+        if isinstance(v, dict) and isinstance(into.get(k), dict):
+            _merge(into[k], v)
+        elif isinstance(v, list) and isinstance(into.get(k), list):
+            # same source list, so elements line up by index (_MISSING where a path missed)
+            for i, (a, b) in enumerate(zip(into[k], v)):
+                if a is _MISSING:
+                    into[k][i] = b
+                elif isinstance(a, dict) and isinstance(b, dict):
+                    _merge(a, b)
+        else:
+            into[k] = v
+
+
+def select_fields(doc: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    """
+    Keep only the comma-separated dotted paths in `fields` (e.g.
+    "result.budget,result.flight_options.offers.total"). A path through a
+    list applies to every element; unknown paths are ignored.
+    """
+    paths = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    if not paths:
+        return doc
+    out: Dict[str, Any] = {}
+    for p in paths:
+        part = _pick(doc, p.split("."))
+        if part is not _MISSING:
+            _merge(out, _strip(part))
+    return _drop_missing(out)
+
+
+def _strip(node: Any) -> Any:
+    # drop dict keys a path did not match; list elements stay as _MISSING
+    # placeholders so _merge can line up the elements of several paths
+    if isinstance(node, dict):
+        return {k: _strip(v) for k, v in node.items() if v is not _MISSING}
+    if isinstance(node, list):
+        return [_strip(v) for v in node]
+    return node
+
+
+def _drop_missing(node: Any) -> Any:
+    # after merging: list elements no path matched are left out
+    if isinstance(node, dict):
+        return {k: _drop_missing(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_drop_missing(v) for v in node if v is not _MISSING]
+    return node
+
+
+# ---- Negotiation -----------------------------------------------------------------
+
+def _qvalues(header: Optional[str]) -> Dict[str, float]:
+    """{"gzip": 1.0, "br": 0.8, ...} from an Accept / Accept-Encoding header."""
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        out[token.lower()] = q
+    return out
+
+
+def encode_body(payload: Any, accept: Optional[str]) -> Tuple[bytes, str]:
+    """MessagePack when the client prefers it (and msgpack is installed), else compact JSON."""
+    wanted = _qvalues(accept)
+    mp = max((wanted.get(t, 0.0) for t in MSGPACK_TYPES), default=0.0)
+    if msgpack is not None and mp > 0 and mp >= wanted.get(JSON_TYPE, 0.0):
+        return msgpack.packb(payload, default=str, use_bin_type=True), MSGPACK_TYPES[0]
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return body.encode("utf-8"), JSON_TYPE
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """br (if available) > gzip, honouring q=0; None = identity."""
+    q = _qvalues(accept_encoding)
+    star = q.get("*", 0.0)
+    options = (["br"] if brotli is not None else []) + ["gzip"]
+    ranked = sorted(((q.get(o, star), -i, o) for i, o in enumerate(options)), reverse=True)
+    return ranked[0][2] if ranked and ranked[0][0] > 0 else None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def make_etag(body: bytes, encoding: Optional[str] = None) -> str:
+    """Strong ETag of the representation (the content coding is part of it)."""
+    tag = hashlib.sha256(body).hexdigest()[:32]
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def negotiated(request: Request, payload: Dict[str, Any], *, fields: Optional[str] = None,
+               etag: bool = False, status_code: int = 200) -> Response:
+    """
+    Response for `payload` shaped by the request: sparse `fields`, JSON or
+    MessagePack (Accept), br/gzip (Accept-Encoding, bodies >= RESPONSE_COMPRESS_MIN_BYTES)
+    and, with `etag`, a strong ETag answered with 304 on a matching If-None-Match.
+    """
+    body, media_type = encode_body(select_fields(payload, fields), request.headers.get("accept"))
+    encoding = choose_encoding(request.headers.get("accept-encoding")) \
+        if len(body) >= RESPONSE_COMPRESS_MIN_BYTES else None
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if etag:
+        headers["ETag"] = make_etag(body, encoding)
+        if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import json
+from typing import Any, List
+
+# Python / JS literals models sometimes emit instead of JSON's
+_LITERALS = {"True": "true", "False": "false", "None": "null", "undefined": "null", "NaN": "null"}
+_CLOSE = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort fix of near-valid model JSON in one pass: prose and code
+    fences around the document, // and /* */ comments, single-quoted
+    strings, raw newlines in strings, Python literals, trailing commas and
+    a truncated tail (open string, dangling key or comma, unclosed brackets).
+    """
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    out: List[str] = []
+    stack: List[str] = []
+    # per open object: "key" (expecting a key), "colon" (key read), "value" (after ':') or "next"
+    states: List[str] = []
+    quote = ""
+    esc = False
+    i, n = start, len(text)
+
+    def value_started() -> None:
+        if stack and stack[-1] == "{" and states[-1] == "value":
+            states[-1] = "next"
+
+    while i < n:
+        c = text[i]
+        if quote:
+            if esc:
+                esc = False
+                if c == "'":
+                    out.pop()  # \' is not a JSON escape
+                out.append(c)
+            elif c == "\\":
+                esc = True
+                out.append(c)
+            elif c == quote:
+                quote = ""
+                out.append('"')
+            elif c == '"':
+                out.append('\\"')  # inside a single-quoted string
+            elif c == "\n":
+                out.append("\\n")
+            elif c in "\r\t":
+                out.append("\\r" if c == "\r" else "\\t")
+            else:
+                out.append(c)
+            i += 1
+            continue
+        if c in "\"'":
+            quote = c
+            out.append('"')
+            if stack and stack[-1] == "{" and states[-1] == "key":
+                states[-1] = "colon"
+            else:
+                value_started()
+        elif c == "/" and text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j < 0 else j
+            continue
+        elif c == "/" and text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            continue
+        elif c in "{[":
+            value_started()
+            stack.append(c)
+            states.append("key")
+            out.append(c)
+        elif c in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(_CLOSE[stack.pop()])
+            states.pop()
+            if not stack:
+                break  # anything after the document (prose, a closing fence) is ignored
+        elif c == ",":
+            if stack and stack[-1] == "{":
+                states[-1] = "key"
+            out.append(c)
+        elif c == ":":
+            if stack and stack[-1] == "{":
+                states[-1] = "value"
+            out.append(c)
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            value_started()
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            if not c.isspace():
+                value_started()
+            out.append(c)
+        i += 1
+
+    # Truncated output: finish the open string / key and close what is open
+    if quote:
+        if esc:
+            out.pop()
+        out.append('"')
+    if stack:
+        tail = "".join(out).rstrip()
+        out = [tail]
+        if tail.endswith(","):
+            out = [tail[:-1]]
+        elif stack[-1] == "{" and states[-1] == "colon":
+            out.append(":null")
+        elif tail.endswith(":"):
+            out.append("null")
+        while stack:
+            out.append(_CLOSE[stack.pop()])
+    return "".join(out)
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def loads_tolerant(text: str) -> Any:
+    """json.loads, falling back to repair_json for near-valid text. Raises ValueError if still invalid."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(repair_json(text))
@@ -1,17 +1,153 @@
 from __future__ import annotations
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import threading
+from typing import Any, Dict, Optional
+
+from backend.config.settings import (
+    LOG_ASYNC, LOG_FORMAT, LOG_PAYLOAD_MAX_CHARS, LOG_SAMPLE_RATES,
+)
+
+# Attributes every LogRecord has; anything else came in via `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def _formatter() -> logging.Formatter:
+    if LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+# ---- Background writer -------------------------------------------------------------
+# Loggers only enqueue records; a listener thread formats and writes them, so
+# logging from the event loop never blocks on stdout/stderr.
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_QUEUE_HANDLER: Optional[logging.Handler] = None
+_LOCK = threading.Lock()
+
+
+def _handler() -> logging.Handler:
+    global _LISTENER, _QUEUE_HANDLER
+    if not LOG_ASYNC:
+        handler = logging.StreamHandler()
+        handler.setFormatter(_formatter())
+        return handler
+    with _LOCK:
+        if _QUEUE_HANDLER is None:
+            q: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+            stream = logging.StreamHandler()
+            stream.setFormatter(_formatter())
+            _LISTENER = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+            _LISTENER.start()
+            atexit.register(_LISTENER.stop)  # flush what is still queued
+            _QUEUE_HANDLER = logging.handlers.QueueHandler(q)
+        return _QUEUE_HANDLER
+
 
 def get_logger(name: str) -> logging.Logger:
     level = os.getenv("LOG_LEVEL", "INFO").upper()
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        fmt = logging.Formatter(
-            "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        handler.setFormatter(fmt)
-        logger.addHandler(handler)
+        logger.addHandler(_handler())
     logger.setLevel(level)
     return logger
+
+
+# ---- Payload logging with sampling -------------------------------------------------
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            try:
+                rates[name.strip()] = max(0.0, min(1.0, float(value)))
+            except ValueError:
+                pass
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(LOG_SAMPLE_RATES)
+
+
+def sampled(category: str) -> bool:
+    rate = SAMPLE_RATES.get(category, SAMPLE_RATES.get("*", 0.0))
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+# Top-level keys of a dict payload whose sizes are reported
+SUMMARY_MAX_KEYS = 20
+
+
+def _size(value: Any) -> Optional[int]:
+    return len(value) if isinstance(value, (str, bytes, list, tuple, dict)) else None
+
+
+def payload_summary(payload: Any) -> Dict[str, Any]:
+    """
+    Type and item counts of a payload: its length, and for a dict the lengths
+    of its first SUMMARY_MAX_KEYS container/string values. O(keys), without
+    serializing the payload, since it runs on the event loop for every call.
+    """
+    out: Dict[str, Any] = {"type": type(payload).__name__}
+    size = _size(payload)
+    if size is not None:
+        out["items"] = size
+    if isinstance(payload, dict):
+        sizes = {}
+        for i, (k, v) in enumerate(payload.items()):
+            if i >= SUMMARY_MAX_KEYS:
+                break
+            n = _size(v)
+            if n is not None:
+                sizes[str(k)] = n
+        if sizes:
+            out["sizes"] = sizes
+    return out
+
+
+def log_payload(logger: logging.Logger, category: str, msg: str, payload: Any,
+                level: int = logging.INFO, **fields: Any) -> None:
+    """
+    Log `msg` with the payload's item counts (payload_summary). The payload
+    itself (capped at LOG_PAYLOAD_MAX_CHARS) is serialized and included only
+    when `category` is sampled.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    extra: Dict[str, Any] = {"category": category, **fields, "payload": payload_summary(payload)}
+    if sampled(category):
+        text = json.dumps(payload, ensure_ascii=False, default=str)
+        if len(text) > LOG_PAYLOAD_MAX_CHARS:
+            text = text[:LOG_PAYLOAD_MAX_CHARS] + "...(truncated)"
+        extra["payload"]["body"] = text
+    if LOG_FORMAT.lower() != "json":
+        msg = f"{msg} {json.dumps(extra, ensure_ascii=False, default=str)}"
+    logger.log(level, msg, extra=extra)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.config.settings import OPENAI_MODEL_PRICES, OPENAI_PRICE_INPUT_PER_1M, OPENAI_PRICE_OUTPUT_PER_1M
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+HTTP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 45.0)
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(
+        '%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for k, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(k)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        # per label set: ([count per bucket], sum, count)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        k = _key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(k) or ([0] * len(self.buckets), 0.0, 0)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+            self._values[k] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for k, (counts, total, n) in sorted(self._values.items()):
+                for b, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_fmt_labels(k, ('le', f'{b:g}'))} {c}")
+                lines.append(f"{self.name}_bucket{_fmt_labels(k, ('le', '+Inf'))} {n}")
+                lines.append(f"{self.name}_sum{_fmt_labels(k)} {total:g}")
+                lines.append(f"{self.name}_count{_fmt_labels(k)} {n}")
+        return lines
+
+
+# ---- Registry ----------------------------------------------------------------
+
+STAGE_LATENCY = Histogram("trip_stage_latency_seconds", "Agent stage latency", STAGE_BUCKETS)
+STAGE_ERRORS = Counter("trip_stage_errors_total", "Agent stage failures")
+STAGE_TOKENS = Counter("trip_stage_tokens_total", "LLM tokens per stage and model (direction=input|output)")
+STAGE_COST = Counter("trip_stage_cost_usd_total", "Estimated LLM cost per stage and model in USD")
+STAGE_TOOL_CALLS = Counter("trip_stage_tool_calls_total", "Tool calls made by each agent stage")
+AMADEUS_LATENCY = Histogram("amadeus_request_seconds", "Amadeus HTTP latency per endpoint", HTTP_BUCKETS)
+AMADEUS_ERRORS = Counter("amadeus_errors_total", "Amadeus HTTP errors per endpoint")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups (result=hit|miss)")
+HTTP_LATENCY = Histogram("api_request_seconds", "API request latency per route", STAGE_BUCKETS)
+INTAKE_PARSES = Counter("intake_parses_total", "Intake lines by path (rules|mixed|llm)")
+MODEL_DOWNGRADES = Counter("model_downgrades_total", "Stages switched to their fallback model")
+CRITIC_PATHS = Counter("critic_reviews_total", "Critic reviews by path (rules|llm)")
+OPENAI_RETRIES = Counter("openai_retries_total", "OpenAI calls retried after a transient error")
+OUTPUT_REPAIRS = Counter("agent_output_repairs_total", "Malformed agent replies (result=repaired|reasked|failed)")
+
+REGISTRY = [
+    STAGE_LATENCY, STAGE_ERRORS, STAGE_TOKENS, STAGE_COST, STAGE_TOOL_CALLS,
+    AMADEUS_LATENCY, AMADEUS_ERRORS, CACHE_REQUESTS, HTTP_LATENCY, INTAKE_PARSES, MODEL_DOWNGRADES,
+    CRITIC_PATHS, OPENAI_RETRIES, OUTPUT_REPAIRS,
+]
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ---- Server-Timing (per request) ----------------------------------------------
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timings", default=None)
+
+
+def start_server_timing() -> Dict[str, float]:
+    """Bind a fresh timing dict to the current request context."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def add_server_timing(name: str, seconds: float) -> None:
+    # Same name accumulates (e.g. many Amadeus calls -> one "amadeus" entry)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def format_server_timing(timings: Dict[str, float], total_s: Optional[float] = None) -> str:
+    parts = [f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items()]
+    if total_s is not None:
+        parts.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# ---- Stage helpers ---------------------------------------------------------------
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Record latency (histogram + Server-Timing) and failures for one agent stage."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_LATENCY.observe(dt, stage=stage)
+        add_server_timing(stage, dt)
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """{"gpt-5-nano": (0.05, 0.40), ...} from "model=input/output,..."; bad entries are skipped."""
+    prices: Dict[str, Tuple[float, float]] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        tin, _, tout = value.partition("/")
+        try:
+            prices[name.strip().lower()] = (float(tin), float(tout))
+        except ValueError:
+            pass
+    return prices
+
+
+MODEL_PRICES = _parse_prices(OPENAI_MODEL_PRICES)
+
+
+def model_price(model: Optional[str]) -> Tuple[float, float]:
+    """
+    (input, output) USD per 1M tokens for a model: an exact entry, else the
+    longest listed prefix ("gpt-5-nano-2025-08-07" -> "gpt-5-nano"), else
+    the OPENAI_PRICE_* default.
+    """
+    name = (model or "").lower().rsplit("/", 1)[-1]
+    if name in MODEL_PRICES:
+        return MODEL_PRICES[name]
+    matches = [k for k in MODEL_PRICES if name.startswith(k)]
+    if matches:
+        return MODEL_PRICES[max(matches, key=len)]
+    return OPENAI_PRICE_INPUT_PER_1M, OPENAI_PRICE_OUTPUT_PER_1M
+
+
+def _run_model(run_result: Any) -> Optional[str]:
+    # the routed agent (a clone carrying the stage's model, downgraded or not) ran last
+    model = getattr(getattr(run_result, "last_agent", None), "model", None)
+    if model is None or isinstance(model, str):
+        return model
+    return getattr(model, "model", None)  # an SDK Model object
+
+
+def record_usage(stage: str, run_result: Any) -> None:
+    """
+    Pull token usage and tool-call counts off an Agents SDK RunResult. Cost
+    uses the price of the model that actually ran (routing and latency
+    downgrades change it per call).
+    """
+    usage = getattr(getattr(run_result, "context_wrapper", None), "usage", None)
+    if usage is not None:
+        tin = int(getattr(usage, "input_tokens", 0) or 0)
+        tout = int(getattr(usage, "output_tokens", 0) or 0)
+        model = _run_model(run_result) or "unknown"
+        price_in, price_out = model_price(model)
+        STAGE_TOKENS.inc(tin, stage=stage, model=model, direction="input")
+        STAGE_TOKENS.inc(tout, stage=stage, model=model, direction="output")
+        STAGE_COST.inc((tin * price_in + tout * price_out) / 1_000_000, stage=stage, model=model)
+    calls = sum(
+        1 for item in (getattr(run_result, "new_items", None) or [])
+        if getattr(item, "type", None) == "tool_call_item"
+    )
+    if calls:
+        STAGE_TOOL_CALLS.inc(calls, stage=stage)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from backend.config.settings import TRACE_BUFFER_SIZE, TRACE_FILE
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    name: str
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+
+    @property
+    def correlation_id(self) -> str:
+        """Stable id for this unit of work (fills ToolCall/ToolResult.correlation_id)."""
+        return f"{self.trace_id}:{self.span_id}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else round((self.end - self.start) * 1000, 2)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["duration_ms"] = self.duration_ms
+        return d
+
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory for /debug/traces."""
+
+    def __init__(self, maxlen: int = TRACE_BUFFER_SIZE):
+        self._spans: Deque[Span] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return [s for s in self._spans if s.trace_id == trace_id]
+
+    def recent_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Root spans of the newest traces, newest first."""
+        with self._lock:
+            roots = [s for s in self._spans if s.parent_id is None]
+        return [
+            {"trace_id": s.trace_id, "name": s.name, "start": s.start, "duration_ms": s.duration_ms}
+            for s in reversed(roots[-limit:])
+        ]
+
+
+class JsonlExporter:
+    """
+    Appends finished spans to a local JSON-lines file. export() only enqueues
+    the span; a writer thread serializes and appends whatever is queued in one
+    write, so spans finishing on the event loop never wait on the file.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        self._queue.put(span)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue()  # one queue per writer, so a closing writer never takes new spans
+                self._thread = threading.Thread(target=self._write_loop, args=(self._queue,),
+                                                name="trace-jsonl", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)  # write what is still queued
+
+    def _write_loop(self, q: "queue.Queue[Any]") -> None:
+        while True:
+            batch = [q.get()]
+            while True:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in batch:
+                if item is self._STOP:
+                    continue
+                try:
+                    lines.append(json.dumps(item.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except Exception:
+                    pass  # tracing must never break a request
+            if lines:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as fh:
+                        fh.write("".join(lines))
+                except OSError:
+                    pass
+            if any(item is self._STOP for item in batch):
+                return
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write the queued spans and stop the writer (a later export starts a new one)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(self._STOP)
+        if thread is not None:
+            thread.join(timeout)
+
+
+BUFFER = RingBufferExporter()
+EXPORTERS: List[Any] = [BUFFER] + ([JsonlExporter(TRACE_FILE)] if TRACE_FILE else [])
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    s = _current.get()
+    return s.trace_id if s else None
+
+
+@contextmanager
+def span(name: str, *, trace_id: Optional[str] = None, **attrs: Any) -> Iterator[Span]:
+    """
+    Open a span as a child of the current one (or a new trace when there is none).
+    Context flows through asyncio tasks and to_thread calls via contextvars.
+    """
+    parent = _current.get()
+    s = Span(
+        trace_id=(parent.trace_id if parent else None) or trace_id or uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        name=name,
+        parent_id=parent.span_id if parent else None,
+        attrs=dict(attrs),
+    )
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        s.end = time.time()
+        _current.reset(token)
+        for exporter in EXPORTERS:
+            try:
+                exporter.export(s)
+            except Exception:
+                pass  # tracing must never break a request
+
+
+def trace_view(trace_id: str) -> Optional[Dict[str, Any]]:
+    """Spans of one trace ordered by start, with offsets for a waterfall view."""
+    spans = sorted(BUFFER.trace(trace_id), key=lambda s: s.start)
+    if not spans:
+        return None
+    t0 = spans[0].start
+    depth: Dict[str, int] = {}
+    out = []
+    for s in spans:
+        d = depth.get(s.parent_id, -1) + 1 if s.parent_id else 0
+        depth[s.span_id] = d
+        out.append({**s.to_dict(), "depth": d, "offset_ms": round((s.start - t0) * 1000, 2)})
+    end = max((s.end or s.start) for s in spans)
+    return {"trace_id": trace_id, "duration_ms": round((end - t0) * 1000, 2), "spans": out}
@@ -24,6 +24,15 @@ def as_prompt(payload: dict) -> str:
     return "Payload JSON:\n" + json.dumps(payload, ensure_ascii=False) + "\n\nReturn ONLY valid JSON per your output schema. No prose."
 
 
+def as_reask_prompt(payload: dict, previous: str, errors: str, limit: int = 2000) -> str:
+    """as_prompt plus the stage's invalid reply and the schema errors, for a targeted retry."""
+    return (
+        as_prompt(payload)
+        + f"\n\nYour previous reply did not match the output schema: {errors}\n"
+        + f"Previous reply (truncated):\n{previous[:limit]}\n\nReturn the corrected JSON only."
+    )
+
+
 def safe_to_dict(obj: Any) -> dict:
     """Best-effort conversion to dict from LLM returns (string JSON or dict)."""
     if isinstance(obj, dict):